@@ -1,51 +1,369 @@
 import os
 import json
+import time
+import uuid
 import boto3
 
-from chalice import Chalice
+from botocore.config import Config
+from collections import OrderedDict
+from typing import Dict, Tuple
 
-from machine_generator_app import MachineGeneratorApp
+from bedrock_scheduler import BedrockScheduler
+from job_queue import JobDispatcher, SQSJobQueue
+from machine_index import MachineIndex, S3IndexStore, create_directory_string
+from slim_generator import SlimMachineGenerator
+
+# Client setup of a cold start, imports are part of the Lambda Init Duration
+init_start = time.perf_counter()
 
 # Write list to DynamoDB table
 table_name = os.getenv("table_name")
 column_name = os.getenv("column_name")
 pipeline_name = os.getenv("pipeline_name")
 model_id = os.getenv("model_id")
+handler_mode = os.getenv("handler_mode", "slim")
+streaming = os.getenv("streaming", "True") == "True"
+queue_url = os.getenv("queue_url")
+listing_queue_url = os.getenv("listing_queue_url")
+code_bucket = os.getenv("code_bucket")
 cp_client = boto3.client("codepipeline")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(table_name)
+sqs_client = boto3.client("sqs")
+job_queue = SQSJobQueue(sqs_client=sqs_client, queue_url=queue_url)
+listing_queue = SQSJobQueue(sqs_client=sqs_client, queue_url=listing_queue_url)
+dispatcher = JobDispatcher(
+    start_build=lambda jobs: cp_client.start_pipeline_execution(
+        name=pipeline_name
+    ),
+    max_batch_size=int(os.getenv("max_batch_size", 100)),
+)
 
-app = Chalice(app_name="MachineGeneratorApp")
-
+# Generators survive across invocations of a warm container
+# The scheduler owns retries, so botocore must not retry throttled requests on its own
+bedrock_client = boto3.client(
+    "bedrock-runtime", config=Config(retries={"total_max_attempts": 1})
+)
+scheduler = BedrockScheduler(
+    requests_per_minute=float(os.getenv("requests_per_minute", 60)),
+    tokens_per_minute=float(os.getenv("tokens_per_minute", 200000)),
+    max_concurrency=1,
+    max_retries=int(os.getenv("max_retries", 4)),
+)
+max_generators = int(os.getenv("max_generators", 8))
+generators = OrderedDict()
 
-@app.route("/", content_types=["application/json"])
-def index(event, context):
-    number = event["number"]
-    industry = event["industry"]
-    user_id = event["user_id"]
-    model_kwargs = (
-        event["model_kwargs"]
-        if "model_kwargs" in event
-        else {
-            "max_tokens_to_sample": 1000,
-            "temperature": 0.0,
-            "top_p": 0.0,
-        }
+# The index of known machine names survives across invocations and is shared through the code bucket
+machine_index = MachineIndex(
+    threshold=float(os.getenv("machine_similarity", 0.85))
+)
+index_store = (
+    S3IndexStore(
+        s3_client=boto3.client("s3"),
+        bucket=code_bucket,
+        key=os.getenv("machine_index_key", "machine_index.json"),
     )
-    generator = MachineGeneratorApp(
+    if code_bucket
+    else None
+)
+
+init_duration = time.perf_counter() - init_start
+cold_start = True
+
+
+def create_generator(model_kwargs: Dict):
+    """
+    Create a machine list generator for the configured handler mode.
+
+    The "slim" mode calls Bedrock directly, the "langchain" mode imports LangChain on first use only.
+
+    Args:
+        model_kwargs: The keyword arguments for the Bedrock model.
+
+    Returns:
+        The SlimMachineGenerator or MachineGeneratorApp.
+    """
+    if handler_mode == "slim":
+        return SlimMachineGenerator(
+            model_id=model_id,
+            model_kwargs=model_kwargs,
+            client=bedrock_client,
+            streaming=streaming,
+            scheduler=scheduler,
+        )
+    from machine_generator_app import MachineGeneratorApp
+
+    return MachineGeneratorApp(
         model_id=model_id,
         streaming=False,
         callbacks=[],
         model_kwargs=model_kwargs,
+        client=bedrock_client,
+        scheduler=scheduler,
     )
-    machines = generator.predict_list(number=number, industry=industry)
 
+
+def get_generator(model_kwargs: Dict) -> Tuple[object, bool]:
+    """
+    Get a cached generator for the model kwargs or create one, evicting the least recently used.
+
+    Args:
+        model_kwargs: The keyword arguments for the Bedrock model.
+
+    Returns:
+        Tuple[object, bool]: The generator and whether it was cached.
+    """
+    key = json.dumps([model_id, model_kwargs], sort_keys=True)
+    if key in generators:
+        generators.move_to_end(key)
+        return generators[key], True
+    generators[key] = create_generator(model_kwargs)
+    while len(generators) > max_generators:
+        generators.popitem(last=False)
+    return generators[key], False
+
+
+def index(event, context):
+    """
+    Accept a request and return its job ID without waiting for Amazon Bedrock.
+
+    Every request is a new job item keyed by user_id and job_id, written in a single put, so requests of the same
+    user never overwrite each other. Its machine list is generated asynchronously by list_machines.
+    """
+    global cold_start
+    latency = {"cold_start": cold_start}
+    if cold_start:
+        latency["init_ms"] = init_duration * 1000
+        cold_start = False
+    start = time.perf_counter()
+
+    number = int(event["number"])
+    user_id = event["user_id"]
+    interval_seconds = int(event.get("interval_seconds", 60))
+    span_days = int(event.get("span_days", 365))
+    if number < 1 or interval_seconds < 1 or span_days < 1:
+        raise ValueError(
+            "number, interval_seconds and span_days must be positive integers"
+        )
+    job_id = uuid.uuid4().hex
+
+    step = time.perf_counter()
     table.put_item(
-        Item={"user_id": user_id, "machines": machines, column_name: "yes"}
+        Item={
+            "user_id": user_id,
+            "job_id": job_id,
+            "job_status": "submitted",
+            "interval_seconds": interval_seconds,
+            "span_days": span_days,
+        }
     )
+    latency["put_item_ms"] = (time.perf_counter() - step) * 1000
 
-    cp_client.start_pipeline_execution(
-        name=pipeline_name,
+    # The listing queue carries the prompt inputs, so they never enter the table
+    step = time.perf_counter()
+    listing_queue.put(
+        {
+            "user_id": user_id,
+            "job_id": job_id,
+            "number": number,
+            "industry": event["industry"],
+            "model_kwargs": event.get("model_kwargs"),
+        }
     )
+    latency["enqueue_ms"] = (time.perf_counter() - step) * 1000
 
-    return json.dumps({"statusCode": 200, "body": {"messag": "success"}})
+    latency["total_ms"] = (time.perf_counter() - start) * 1000
+    print(json.dumps({"latency": latency}))
+
+    return json.dumps(
+        {
+            "statusCode": 202,
+            "body": {"job_id": job_id, "status": "submitted"},
+        }
+    )
+
+
+def update_submitted_job(
+    key: Dict, update_expression: str, values: Dict, names: Dict = None
+) -> bool:
+    """
+    Update a job item only while it exists and is submitted.
+
+    Args:
+        key: The user_id and job_id of the job.
+        update_expression: The update expression.
+        values: The expression attribute values.
+        names: The expression attribute names.
+
+    Returns:
+        bool: Whether the job was updated, False if it was deleted, listed or failed meanwhile.
+    """
+    kwargs = {"ExpressionAttributeNames": names} if names else {}
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(job_id) AND job_status = :submitted",
+            ExpressionAttributeValues={**values, ":submitted": "submitted"},
+            **kwargs,
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def list_job(job: Dict) -> None:
+    """
+    Generate the machine list of a submitted job and hand it to the build.
+
+    SQS delivers a message at least once, so a job that is no longer submitted is skipped.
+
+    Args:
+        job: The listing message written by index.
+    """
+    key = {"user_id": job["user_id"], "job_id": job["job_id"]}
+    item = table.get_item(Key=key, ProjectionExpression="job_status").get(
+        "Item"
+    )
+    if item is None or item.get("job_status") != "submitted":
+        print(f"Skipping job {job['job_id']}, it is not submitted")
+        return
+
+    latency = {}
+    model_kwargs = job.get("model_kwargs") or {
+        "max_tokens_to_sample": 1000,
+        "temperature": 0.0,
+        "top_p": 0.0,
+    }
+    step = time.perf_counter()
+    generator, latency["generator_cached"] = get_generator(model_kwargs)
+    latency["generator_ms"] = (time.perf_counter() - step) * 1000
+
+    step = time.perf_counter()
+    try:
+        names = generator.predict_list(
+            number=int(job["number"]), industry=job["industry"]
+        )
+    except Exception as e:
+        update_submitted_job(
+            key,
+            "SET job_status = :status, job_error = :error",
+            {":status": "failed", ":error": str(e)},
+        )
+        print(f"Listing job {job['job_id']} failed: {e}")
+        return
+    latency["predict_ms"] = (time.perf_counter() - step) * 1000
+
+    # Collapse near-duplicate names before the build generates and runs a script for each of them
+    # A failing index store only costs the names other Lambdas learned, not the job
+    step = time.perf_counter()
+    try:
+        if index_store is not None:
+            machine_index.merge(index_store.load())
+    except Exception as e:
+        print(f"Loading the machine index failed: {e}")
+    machines = machine_index.deduplicate(names)
+    latency["duplicates"] = len(names) - len(machines)
+    machines = machines[: int(job["number"])]
+    try:
+        if index_store is not None and machine_index.changed:
+            index_store.save(machine_index)
+    except Exception as e:
+        print(f"Saving the machine index failed: {e}")
+    latency["canonicalize_ms"] = (time.perf_counter() - step) * 1000
+
+    # One child item per machine, written 25 at a time, machines sharing a directory collapse into one
+    step = time.perf_counter()
+    children = {
+        f"{job['job_id']}/{create_directory_string(machine)}": machine
+        for machine in machines
+    }
+    with table.batch_writer() as batch:
+        for child_id, machine in children.items():
+            batch.put_item(
+                Item={
+                    "user_id": job["user_id"],
+                    "job_id": child_id,
+                    "machine": machine,
+                }
+            )
+    latency["batch_write_ms"] = (time.perf_counter() - step) * 1000
+
+    step = time.perf_counter()
+    listed = update_submitted_job(
+        key,
+        "SET machine_count = :count, job_status = :status, #column_name = :yes",
+        {":count": len(children), ":status": "listed", ":yes": "yes"},
+        names={"#column_name": column_name},
+    )
+    latency["update_item_ms"] = (time.perf_counter() - step) * 1000
+    if not listed:
+        print(f"Job {job['job_id']} changed while it was listed")
+        return
+
+    # The dispatcher batches queued jobs into a single pipeline execution
+    step = time.perf_counter()
+    job_queue.put({"user_id": job["user_id"], "job_id": job["job_id"]})
+    latency["enqueue_ms"] = (time.perf_counter() - step) * 1000
+    print(
+        json.dumps(
+            {
+                "job_id": job["job_id"],
+                "latency": latency,
+                "bedrock": scheduler.metrics(),
+            }
+        )
+    )
+
+
+def list_machines(event, context):
+    """
+    Generate the machine lists of the submitted jobs delivered by SQS.
+
+    A failing message does not fail the others, SQS delivers only the reported batch item failures again.
+    """
+    failures = []
+    for record in event["Records"]:
+        try:
+            list_job(json.loads(record["body"]))
+        except Exception as e:
+            print(f"Listing message {record.get('messageId')} failed: {e}")
+            failures.append({"itemIdentifier": record.get("messageId")})
+    return {"batchItemFailures": failures}
+
+
+def status(event, context):
+    """
+    Report the progress of a job from its compact status record.
+
+    The build counts the machines whose script was generated and whose dataset was uploaded, so the status is a
+    single projected read however many machines the job has.
+    """
+    item = table.get_item(
+        Key={"user_id": event["user_id"], "job_id": event["job_id"]},
+        ProjectionExpression="job_id, job_status, job_error, machine_count, scripts_generated, datasets_uploaded, builds",
+    ).get("Item")
+    if item is None or "job_status" not in item:
+        return json.dumps(
+            {"statusCode": 404, "body": {"message": "job not found"}}
+        )
+    body = {
+        "job_id": item["job_id"],
+        "status": item["job_status"],
+        "machines_listed": int(item.get("machine_count", 0)),
+        "scripts_generated": int(item.get("scripts_generated", 0)),
+        "datasets_uploaded": int(item.get("datasets_uploaded", 0)),
+        "builds": int(item.get("builds", 0)),
+    }
+    if "job_error" in item:
+        body["error"] = item["job_error"]
+    return json.dumps({"statusCode": 200, "body": body})
+
+
+def dispatch(event, context):
+    """Start one pipeline execution for a batch of queued jobs delivered by SQS."""
+    jobs = [json.loads(record["body"]) for record in event["Records"]]
+    builds = dispatcher.dispatch(jobs)
+    return json.dumps(
+        {"statusCode": 200, "body": {"jobs": len(jobs), "builds": builds}}
+    )
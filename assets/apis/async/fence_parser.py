@@ -0,0 +1,128 @@
+import re
+
+from typing import List, Optional
+
+FENCE = re.compile(r"^\s*```+\s*([\w+#.-]*)\s*$")
+ERROR_OPEN = "<error>"
+ERROR_CLOSE = "</error>"
+NO_ERRORS = "NO ERRORS"
+
+
+class StreamingFenceParser:
+    """
+    An incremental parser extracting the fenced blocks of an LLM response while it is streamed.
+
+    Fences inside `<error>` sections are ignored. The parser tracks whether the self-check after the most recent
+    block reported no errors, so the remainder of a streamed response can be cancelled.
+    """
+
+    def __init__(self):
+        """Initialize the StreamingFenceParser."""
+        self.blocks: List[str] = []
+        self.errors: List[str] = []
+        self.checked = False
+        self._buffer = ""
+        self._block: Optional[List[str]] = None
+        self._error: Optional[List[str]] = None
+
+    def _close_error(self, content: str) -> None:
+        self.errors.append(content)
+        self.checked = bool(self.blocks) and NO_ERRORS in content
+
+    def _parse_line(self, line: str) -> None:
+        if self._block is not None:
+            match = FENCE.match(line)
+            if match and not match.group(1):
+                self.blocks.append("\n".join(self._block) + "\n")
+                self._block = None
+            else:
+                self._block.append(line)
+            return
+        if self._error is not None:
+            if ERROR_CLOSE in line:
+                self._error.append(line.split(ERROR_CLOSE, 1)[0])
+                self._close_error("\n".join(self._error))
+                self._error = None
+            else:
+                self._error.append(line)
+            return
+        if ERROR_OPEN in line:
+            content = line.split(ERROR_OPEN, 1)[1]
+            if ERROR_CLOSE in content:
+                self._close_error(content.split(ERROR_CLOSE, 1)[0])
+            else:
+                self._error = [content]
+            return
+        if FENCE.match(line):
+            self._block = []
+            self.checked = False
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Parse the next chunk of the response.
+
+        Args:
+            text: The next chunk of the response.
+
+        Returns:
+            List[str]: The blocks completed by this chunk.
+        """
+        completed = len(self.blocks)
+        lines = (self._buffer + text).split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line.rstrip("\r"))
+        return self.blocks[completed:]
+
+    def close(self) -> List[str]:
+        """
+        Parse the rest of the response and treat an unterminated fence as closed.
+
+        Returns:
+            List[str]: The blocks completed by closing the parser.
+        """
+        completed = len(self.blocks)
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ""
+        if self._block:
+            self.blocks.append("\n".join(self._block) + "\n")
+        self._block = None
+        return self.blocks[completed:]
+
+
+def extract_blocks(text: str) -> List[str]:
+    """
+    Extract all fenced blocks of an LLM response in a single pass over its lines.
+
+    Fences inside `<error>` sections are ignored and an unterminated fence at the end of the response is treated as
+    closed.
+
+    Args:
+        text: The LLM response.
+
+    Returns:
+        List[str]: The content of all fenced blocks in order of appearance.
+    """
+    parser = StreamingFenceParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+def extract_code(text: str) -> str:
+    """
+    Extract the code of an LLM response.
+
+    If the response lists errors and generates corrected versions, the last version is returned.
+
+    Args:
+        text: The LLM response.
+
+    Returns:
+        str: The content of the last fenced block.
+    """
+    blocks = extract_blocks(text)
+    if not blocks:
+        raise ValueError("No fenced code block found in the response")
+    return blocks[-1]
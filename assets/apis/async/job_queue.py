@@ -0,0 +1,140 @@
+import json
+import uuid
+
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+
+class InMemoryJobQueue:
+    """A local, in-memory job queue with the same interface as SQSJobQueue, e.g. for tests."""
+
+    def __init__(self):
+        """Initialize the InMemoryJobQueue."""
+        self.messages = deque()
+        self.in_flight = {}
+
+    def put(self, job: Dict) -> None:
+        """Enqueue a job."""
+        self.messages.append(json.dumps(job))
+
+    def receive(self, max_messages: int = 10) -> List[Tuple[str, Dict]]:
+        """Receive up to max_messages jobs as (receipt, job) tuples."""
+        received = []
+        while self.messages and len(received) < max_messages:
+            receipt = str(uuid.uuid4())
+            self.in_flight[receipt] = self.messages.popleft()
+            received.append((receipt, json.loads(self.in_flight[receipt])))
+        return received
+
+    def delete(self, receipts: List[str]) -> None:
+        """Acknowledge received jobs."""
+        for receipt in receipts:
+            self.in_flight.pop(receipt, None)
+
+
+class SQSJobQueue:
+    """A job queue backed by Amazon SQS."""
+
+    def __init__(self, sqs_client, queue_url: str):
+        """
+        Initialize the SQSJobQueue.
+
+        Args:
+            sqs_client: The boto3 SQS client.
+            queue_url (str): The URL of the job queue.
+        """
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def put(self, job: Dict) -> None:
+        """Enqueue a job."""
+        self.sqs_client.send_message(
+            QueueUrl=self.queue_url, MessageBody=json.dumps(job)
+        )
+
+    def receive(self, max_messages: int = 10) -> List[Tuple[str, Dict]]:
+        """Receive up to max_messages (at most 10) jobs as (receipt, job) tuples."""
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=1,
+        )
+        return [
+            (message["ReceiptHandle"], json.loads(message["Body"]))
+            for message in response.get("Messages", [])
+        ]
+
+    def delete(self, receipts: List[str]) -> None:
+        """Acknowledge received jobs."""
+        for i in range(0, len(receipts), 10):
+            self.sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(j), "ReceiptHandle": receipt}
+                    for j, receipt in enumerate(receipts[i : i + 10])
+                ],
+            )
+
+
+class JobDispatcher:
+    """
+    A class batching queued jobs into as few build runs as possible.
+
+    The build drains all pending requests from DynamoDB, so a single build run serves every job of a batch.
+    """
+
+    def __init__(
+        self,
+        start_build: Callable[[List[Dict]], None],
+        max_batch_size: int = 100,
+    ):
+        """
+        Initialize the JobDispatcher.
+
+        Args:
+            start_build (Callable): Starts one build run for a batch of jobs.
+            max_batch_size (int): The maximum number of jobs served by one build run.
+        """
+        self.start_build = start_build
+        self.max_batch_size = max_batch_size
+
+    def dispatch(self, jobs: List[Dict]) -> int:
+        """
+        Start one build run per batch of jobs.
+
+        Args:
+            jobs: The jobs to dispatch.
+
+        Returns:
+            int: The number of started build runs.
+        """
+        builds = 0
+        for i in range(0, len(jobs), self.max_batch_size):
+            self.start_build(jobs[i : i + self.max_batch_size])
+            builds += 1
+        return builds
+
+    def drain(self, queue) -> int:
+        """
+        Receive all queued jobs, dispatch them in batches and acknowledge them.
+
+        Args:
+            queue: The job queue (InMemoryJobQueue or SQSJobQueue).
+
+        Returns:
+            int: The number of started build runs.
+        """
+        builds = 0
+        while True:
+            received = []
+            while len(received) < self.max_batch_size:
+                messages = queue.receive(
+                    max_messages=self.max_batch_size - len(received)
+                )
+                if not messages:
+                    break
+                received.extend(messages)
+            if not received:
+                return builds
+            builds += self.dispatch([job for _, job in received])
+            queue.delete([receipt for receipt, _ in received])
@@ -1,13 +1,30 @@
 import boto3
-import markdown
 
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import Callable, List, Dict
 from langchain.llms.bedrock import Bedrock
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import (
+    ConversationSummaryBufferMemory,
+    ConversationTokenBufferMemory,
+)
 from langchain.prompts import PromptTemplate
 
+from bedrock_scheduler import BedrockScheduler, estimate_tokens
+from slim_generator import DEFAULT_PROMPT, parse_machine_list
+
+
+class TokenEstimatingBedrock(Bedrock):
+    """
+    A Bedrock model counting tokens with the estimate of the scheduler.
+
+    The conversation memory counts the tokens of its turns with the model, which for Anthropic models requires the
+    anthropic package.
+    """
+
+    def get_num_tokens(self, text: str) -> int:
+        """Estimate the tokens of a text."""
+        return estimate_tokens(text)
+
 
 class MachineGeneratorApp:
     def __init__(
@@ -17,9 +34,13 @@ class MachineGeneratorApp:
         callbacks: List,
         model_kwargs: Dict,
         verbose: bool = True,
+        client: boto3.client = None,
+        memory: str = None,
+        max_token_limit: int = 2000,
+        scheduler: BedrockScheduler = None,
     ):
         """
-        Initialize the DataGeneratorApp.
+        Initialize the MachineGeneratorApp.
 
         Args:
             model_id (str): Identifier for the machine learning model.
@@ -27,12 +48,18 @@ class MachineGeneratorApp:
             callbacks (List): List of callbacks for the machine learning model.
             model_kwargs (Dict): Additional keyword arguments for the machine learning model.
             verbose (bool): Flag indicating whether to display verbose information.
+            client (boto3.client): An existing Bedrock runtime client to share, a new one is created if None.
+            memory (str): The conversation memory strategy ("window" or "summary"), stateless if None.
+            max_token_limit (int): The token budget of the conversation memory.
+            scheduler (BedrockScheduler): A scheduler to rate limit and retry requests, requests are sent directly if None.
         """
+        self.scheduler = scheduler
+
         # Initialize Bedrock client
-        self.client = boto3.client("bedrock-runtime")
+        self.client = client or boto3.client("bedrock-runtime")
 
         # Initialize Bedrock model
-        self.llm = Bedrock(
+        self.llm = TokenEstimatingBedrock(
             model_id=model_id,
             streaming=streaming,
             callbacks=callbacks,
@@ -40,18 +67,17 @@ class MachineGeneratorApp:
             client=self.client,
         )
 
-        # Initialize ConversationChain for generating synthetic machine signals
-        self.conversation = ConversationChain(
-            llm=self.llm, verbose=verbose, memory=ConversationBufferMemory()
-        )
+        # Initialize ConversationChain for generating machine lists.
+        # Without memory the instance can be reused safely across requests.
+        self.conversation = None
+        if memory:
+            self.set_conversation(
+                verbose=verbose, memory=memory, max_token_limit=max_token_limit
+            )
 
         # Set the default prompt template for data generation
-        default_prompt = """
-            Generate a NUMBERED list of at least {number} different {industry} manufacturing machines.
-            IMPORTANT: Fence the list with '```'. DO NOT add any explanations, only the machine name.
-        """
         self.prompt = PromptTemplate(
-            template=default_prompt,
+            template=DEFAULT_PROMPT,
             input_variables=["number", "industry"],
         )
 
@@ -64,7 +90,7 @@ class MachineGeneratorApp:
         return self.llm
 
     def get_conversation(self) -> None:
-        """Get the ConversationChain instance."""
+        """Get the ConversationChain instance, None in stateless mode."""
         return self.conversation
 
     def get_prompt(self) -> None:
@@ -91,7 +117,7 @@ class MachineGeneratorApp:
             callbacks (List): List of callbacks for the machine learning model.
             model_kwargs (Dict): Additional keyword arguments for the machine learning model.
         """
-        self.llm = Bedrock(
+        self.llm = TokenEstimatingBedrock(
             model_id=model_id,
             streaming=streaming,
             callbacks=callbacks,
@@ -99,15 +125,32 @@ class MachineGeneratorApp:
             client=self.client,
         )
 
-    def set_conversation(self, verbose: bool) -> None:
+    def set_conversation(
+        self,
+        verbose: bool,
+        memory: str = "window",
+        max_token_limit: int = 2000,
+    ) -> None:
         """
         Set the ConversationChain instance.
 
         Args:
             verbose (bool): Flag indicating whether to display verbose information.
+            memory (str): The memory strategy, "window" keeps the most recent turns and "summary" summarizes older turns.
+            max_token_limit (int): The token budget of the conversation memory.
         """
+        if memory == "window":
+            conversation_memory = ConversationTokenBufferMemory(
+                llm=self.llm, max_token_limit=max_token_limit
+            )
+        elif memory == "summary":
+            conversation_memory = ConversationSummaryBufferMemory(
+                llm=self.llm, max_token_limit=max_token_limit
+            )
+        else:
+            raise ValueError(f"Unknown memory strategy: {memory}")
         self.conversation = ConversationChain(
-            llm=self.llm, verbose=verbose, memory=ConversationBufferMemory()
+            llm=self.llm, verbose=verbose, memory=conversation_memory
         )
 
     def set_prompt(self, prompt_template: str, input_vars: List) -> None:
@@ -133,9 +176,23 @@ class MachineGeneratorApp:
         Returns:
             str: The generated prediction.
         """
-        output = self.conversation.predict(input=self.prompt.format(**kwargs))
+        prompt = self.prompt.format(**kwargs)
+        if self.conversation is None:
+            return self._schedule(lambda: self.llm.predict(prompt), prompt)
+        output = self._schedule(
+            lambda: self.conversation.predict(input=prompt), prompt
+        )
         return output
 
+    def _schedule(self, request: Callable[[], str], prompt: str) -> str:
+        """Run a request through the scheduler, if there is one."""
+        if self.scheduler is None:
+            return request()
+        estimated_tokens = estimate_tokens(prompt) + (
+            self.llm.model_kwargs or {}
+        ).get("max_tokens_to_sample", 0)
+        return self.scheduler.call(request, estimated_tokens=estimated_tokens)
+
     def predict_list(self, **kwargs) -> str:
         """
         Generate and extract an array from the prediction.
@@ -146,16 +203,4 @@ class MachineGeneratorApp:
         Returns:
             str: The generated array.
         """
-        the_list = self._predict(**kwargs)
-        html = markdown.markdown(the_list, extensions=["fenced_code"])
-        soup = BeautifulSoup(html, features="lxml")
-        the_list = soup.find("code").get_text()
-        items = []
-        for line in the_list.splitlines():
-            items.append(
-                line.replace("- ", "")
-                .split(". ")[-1]
-                .split(": ")[0]
-                .split(" - ")[0]
-            )
-        return items
+        return parse_machine_list(self._predict(**kwargs))
@@ -0,0 +1,368 @@
+import re
+import json
+import logging
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# The numbering, bullets and emphasis an LLM puts around the items of a list
+LIST_MARKER = re.compile(r"^\s*(?:[-*•]\s*|\d+\s*[.)]\s*)+")
+EMPHASIS = re.compile(r"[*_`\"]+")
+# The description an LLM appends to a machine name, e.g. `Lathe: turns metal parts`
+DESCRIPTION = re.compile(r"\s*(?::\s|\s[-–—]\s).*$")
+PARENTHESES = re.compile(r"\(([^()]*)\)")
+WORD = re.compile(r"[a-z0-9]+")
+# Words that do not tell two machines apart
+GENERIC_WORDS = {
+    "a",
+    "an",
+    "and",
+    "the",
+    "of",
+    "for",
+    "machine",
+    "machines",
+    "system",
+    "systems",
+    "equipment",
+    "unit",
+    "units",
+}
+
+
+def clean_machine_name(line: str) -> str:
+    """
+    Extract the machine name from a line of a generated list.
+
+    Args:
+        line: A line of the list, e.g. `3. **Lathe**: turns metal parts`.
+
+    Returns:
+        str: The machine name, e.g. `Lathe`, empty if the line holds none.
+    """
+    name = EMPHASIS.sub("", LIST_MARKER.sub("", line))
+    name = DESCRIPTION.sub("", name)
+    return " ".join(name.split()).strip(" .,;")
+
+
+def create_directory_string(machine: str) -> str:
+    """Create the directory of a machine, the same as create_directory_string of the build."""
+    return (
+        re.sub("[^a-zA-Z \n\.]", "", machine.lower()).strip().replace(" ", "-")
+    )
+
+
+def find_acronyms(name: str) -> Dict[str, str]:
+    """
+    Find the acronyms a machine name defines in parentheses.
+
+    Both `Chemical Vapor Deposition (CVD) Machine` and `CVD (Chemical Vapor Deposition) Machine` define `cvd` as
+    `chemical vapor deposition`, if the letters of the acronym are the initials of the words it stands for.
+
+    Args:
+        name: The machine name.
+
+    Returns:
+        Dict[str, str]: The expansion per lowercase acronym.
+    """
+    acronyms = {}
+    lower = name.lower()
+    for match in PARENTHESES.finditer(lower):
+        inner = WORD.findall(match.group(1))
+        before = WORD.findall(lower[: match.start()])
+        if len(inner) == 1 and len(inner[0]) > 1:
+            acronym, words = inner[0], before[-len(inner[0]) :]
+        elif len(inner) > 1 and before:
+            acronym, words = before[-1], inner
+        else:
+            continue
+        if len(words) == len(acronym) and acronym == "".join(
+            word[0] for word in words
+        ):
+            acronyms[acronym] = " ".join(words)
+    return acronyms
+
+
+def trigrams(key: str) -> Set[str]:
+    """Get the character trigrams of a key, padded so that short words still have some."""
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Score the similarity of two keys from 0 to 1.
+
+    The score is the higher of the Jaccard similarity of the token sets, which ignores the order of the words, and
+    the Dice coefficient of the character trigrams, which tolerates spelling variants like `molding` and `moulding`.
+
+    Args:
+        a: A key, see MachineIndex.key.
+        b: Another key.
+
+    Returns:
+        float: The similarity, 1 for equal keys.
+    """
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    token_set = len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+    trigrams_a, trigrams_b = trigrams(a), trigrams(b)
+    dice = (
+        2 * len(trigrams_a & trigrams_b) / (len(trigrams_a) + len(trigrams_b))
+    )
+    return max(token_set, dice)
+
+
+class MachineIndex:
+    """
+    An index of the known machine names, their aliases and slugs, collapsing near-duplicate names into one.
+
+    Every canonical name keeps the list of names that were resolved to it. A name resolves to a known machine if it
+    has the same key, the order-insensitive set of its significant words with acronyms expanded, the same slug, or
+    a key at least `threshold` similar to the key of a known name. Names that resolve to no machine become the
+    canonical name of a new one.
+    """
+
+    def __init__(
+        self,
+        machines: Dict[str, List[str]] = None,
+        acronyms: Dict[str, str] = None,
+        threshold: float = 0.85,
+    ):
+        """
+        Initialize the MachineIndex.
+
+        Args:
+            machines (Dict[str, List[str]]): The aliases per canonical name.
+            acronyms (Dict[str, str]): The expansion per lowercase acronym.
+            threshold (float): The similarity from which two names are the same machine, 1 disables fuzzy matching.
+        """
+        self.threshold = threshold
+        self.acronyms = dict(acronyms or {})
+        self.machines: Dict[str, List[str]] = {}
+        self.changed = False
+        self._reindex(machines or {})
+
+    @classmethod
+    def from_dict(cls, data: Dict, threshold: float = 0.85) -> "MachineIndex":
+        """Create an index from its dict, see to_dict."""
+        return cls(
+            machines=data.get("machines"),
+            acronyms=data.get("acronyms"),
+            threshold=threshold,
+        )
+
+    def to_dict(self) -> Dict:
+        """Get the canonical names with their aliases and the acronyms as a JSON serializable dict."""
+        return {"machines": self.machines, "acronyms": self.acronyms}
+
+    def key(self, name: str) -> str:
+        """
+        Get the key of a machine name, its sorted significant words with acronyms expanded.
+
+        Args:
+            name: The machine name.
+
+        Returns:
+            str: The key, e.g. `chemical deposition vapor` for `CVD Machine` once `cvd` is a known acronym.
+        """
+        acronyms = {**self.acronyms, **find_acronyms(name)}
+        expansions = set(acronyms) | set(acronyms.values())
+        # Drop the parentheses that define an acronym, the rest of the name holds the acronym or its expansion
+        text = PARENTHESES.sub(
+            lambda match: (
+                " "
+                if " ".join(WORD.findall(match.group(1))) in expansions
+                else f" {match.group(1)} "
+            ),
+            name.lower(),
+        )
+        words = []
+        for word in WORD.findall(text):
+            words.extend(acronyms.get(word, word).split())
+        significant = [word for word in words if word not in GENERIC_WORDS]
+        return " ".join(sorted(set(significant or words)))
+
+    def _reindex(self, machines: Dict[str, List[str]]) -> None:
+        """Rebuild the lookup tables, e.g. once a new acronym changes the keys of known names."""
+        self.machines = {}
+        self._keys: Dict[str, str] = {}
+        self._slugs: Dict[str, str] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        for canonical, aliases in machines.items():
+            resolved = self._resolve(canonical) or canonical
+            for name in [canonical] + list(aliases):
+                self._add(name, resolved)
+
+    def _add(self, name: str, canonical: str) -> None:
+        """Record a name as an alias of a canonical name."""
+        aliases = self.machines.setdefault(canonical, [])
+        if name != canonical and name not in aliases:
+            aliases.append(name)
+        key = self.key(name)
+        if key and key not in self._keys:
+            self._keys[key] = canonical
+            for trigram in trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+        self._slugs.setdefault(create_directory_string(name), canonical)
+
+    def _match(self, key: str) -> Optional[str]:
+        """Find the canonical name of the most similar known key, only scoring keys that share a trigram."""
+        if self.threshold >= 1:
+            return None
+        candidates = Counter(
+            candidate
+            for trigram in trigrams(key)
+            for candidate in self._trigrams.get(trigram, ())
+        )
+        best, best_score = None, self.threshold
+        for candidate, _ in candidates.most_common(20):
+            score = similarity(key, candidate)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return self._keys[best] if best is not None else None
+
+    def _resolve(self, name: str) -> Optional[str]:
+        """Find the canonical name of a known machine by key, slug or similarity."""
+        key = self.key(name)
+        if not key:
+            return None
+        return (
+            self._keys.get(key)
+            or self._slugs.get(create_directory_string(name))
+            or self._match(key)
+        )
+
+    def learn_acronyms(self, names: Iterable[str]) -> None:
+        """
+        Learn the acronyms a list of names defines, re-keying the known names if there is a new one.
+
+        Args:
+            names: The machine names.
+        """
+        acronyms = {}
+        for name in names:
+            acronyms.update(find_acronyms(name))
+        new = {
+            acronym: expansion
+            for acronym, expansion in acronyms.items()
+            if self.acronyms.get(acronym) != expansion
+        }
+        if new:
+            self.acronyms.update(new)
+            self.changed = True
+            self._reindex(self.machines)
+
+    def canonicalize(self, name: str) -> str:
+        """
+        Resolve a machine name to its canonical name, adding it to the index.
+
+        Args:
+            name: The machine name.
+
+        Returns:
+            str: The canonical name, the cleaned name itself if it is a new machine.
+        """
+        name = clean_machine_name(name)
+        canonical = self._resolve(name)
+        if canonical is None:
+            canonical = name
+        known = canonical in self.machines and (
+            name == canonical or name in self.machines[canonical]
+        )
+        if not known:
+            self._add(name, canonical)
+            self.changed = True
+        return canonical
+
+    def deduplicate(self, names: Iterable[str]) -> List[str]:
+        """
+        Canonicalize a list of machine names and drop the duplicates, keeping the order of first appearance.
+
+        Acronyms are learned from the whole list first, so `CVD Machine` collapses with a later
+        `Chemical Vapor Deposition (CVD) Machine`.
+
+        Args:
+            names: The machine names.
+
+        Returns:
+            List[str]: The distinct canonical names.
+        """
+        names = [name for name in map(clean_machine_name, names) if name]
+        self.learn_acronyms(names)
+        machines = []
+        for name in names:
+            canonical = self.canonicalize(name)
+            if canonical not in machines:
+                machines.append(canonical)
+        if len(machines) < len(names):
+            logger.info(
+                f"Collapsed {len(names)} machine names into {len(machines)}"
+            )
+        return machines
+
+    def merge(self, data: Dict) -> None:
+        """
+        Merge another index, e.g. the stored index another Lambda updated, into this index.
+
+        Args:
+            data: The dict of the other index, see to_dict.
+        """
+        self.learn_acronyms(
+            name
+            for canonical, aliases in data.get("machines", {}).items()
+            for name in [canonical] + list(aliases)
+        )
+        self.acronyms.update(data.get("acronyms", {}))
+        changed = self.changed
+        for canonical, aliases in data.get("machines", {}).items():
+            resolved = self._resolve(canonical) or canonical
+            for name in [canonical] + list(aliases):
+                self._add(name, resolved)
+        self.changed = changed
+
+
+class S3IndexStore:
+    """A store keeping a MachineIndex as a single JSON object in Amazon S3, usually in the code bucket."""
+
+    def __init__(
+        self, s3_client, bucket: str, key: str = "machine_index.json"
+    ):
+        """
+        Initialize the S3IndexStore.
+
+        Args:
+            s3_client: The boto3 S3 client.
+            bucket (str): The Amazon S3 bucket.
+            key (str): The key of the index object.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+
+    def load(self) -> Dict:
+        """Load the dict of the stored index, empty if there is none yet."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self.key
+            )
+        except self.s3_client.exceptions.NoSuchKey:
+            return {}
+        return json.loads(response["Body"].read())
+
+    def save(self, index: MachineIndex) -> None:
+        """
+        Merge the stored index into an index and store the result.
+
+        Args:
+            index: The index to store.
+        """
+        index.merge(self.load())
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(index.to_dict()).encode("utf-8"),
+            ContentType="application/json",
+        )
+        index.changed = False
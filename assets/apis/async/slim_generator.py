@@ -0,0 +1,168 @@
+import json
+import boto3
+
+from typing import Callable, Dict, List
+
+from bedrock_scheduler import BedrockScheduler
+from fence_parser import StreamingFenceParser, extract_code
+from machine_index import clean_machine_name
+
+DEFAULT_PROMPT = """
+            Generate a NUMBERED list of at least {number} different {industry} manufacturing machines.
+            IMPORTANT: Fence the list with '```'. DO NOT add any explanations, only the machine name.
+        """
+
+
+def parse_machine_list(text: str) -> List[str]:
+    """
+    Extract the machine names from a fenced, numbered list.
+
+    Args:
+        text: The LLM response.
+
+    Returns:
+        List[str]: The machine names.
+    """
+    return split_machine_list(extract_code(text))
+
+
+def split_machine_list(the_list: str) -> List[str]:
+    """
+    Split a numbered list into machine names, dropping the numbering, emphasis and descriptions.
+
+    Args:
+        the_list: The content of the fenced list.
+
+    Returns:
+        List[str]: The machine names.
+    """
+    names = [clean_machine_name(line) for line in the_list.splitlines()]
+    return [name for name in names if name]
+
+
+class SlimMachineGenerator:
+    """
+    A lightweight machine list generator calling `bedrock-runtime.invoke_model` directly.
+
+    It only depends on boto3, so the Lambda does not import LangChain on its startup path.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        model_kwargs: Dict,
+        client: boto3.client = None,
+        prompt: str = DEFAULT_PROMPT,
+        streaming: bool = False,
+        scheduler: BedrockScheduler = None,
+    ):
+        """
+        Initialize the SlimMachineGenerator.
+
+        Args:
+            model_id (str): Identifier of an Anthropic Claude text completion model.
+            model_kwargs (Dict): Additional keyword arguments for the model.
+            client (boto3.client): An existing Bedrock runtime client to share, a new one is created if None.
+            prompt (str): The prompt template with `number` and `industry` placeholders.
+            streaming (bool): Flag indicating whether to stream the response and stop after the fenced list.
+            scheduler (BedrockScheduler): A scheduler to rate limit and retry requests, requests are sent directly if None.
+        """
+        if not model_id.startswith("anthropic."):
+            raise ValueError(
+                f"{model_id} is not supported without LangChain, use the langchain handler mode"
+            )
+        self.model_id = model_id
+        self.model_kwargs = model_kwargs
+        self.client = client or boto3.client("bedrock-runtime")
+        self.prompt = prompt
+        self.streaming = streaming
+        self.scheduler = scheduler
+
+    def _body(self, prompt: str) -> str:
+        """Create the request body of an Anthropic Claude text completion."""
+        return json.dumps(
+            {
+                "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
+                **self.model_kwargs,
+            }
+        )
+
+    def _schedule(self, request: Callable[[], str], prompt: str) -> str:
+        """Run a request through the scheduler, if there is one."""
+        if self.scheduler is None:
+            return request()
+        estimated_tokens = len(prompt) // 4 + self.model_kwargs.get(
+            "max_tokens_to_sample", 0
+        )
+        return self.scheduler.call(request, estimated_tokens=estimated_tokens)
+
+    def _predict(self, **kwargs) -> str:
+        """
+        Generate a prediction using the current prompt.
+
+        Args:
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            str: The generated prediction.
+        """
+        prompt = self.prompt.format(**kwargs)
+        return self._schedule(lambda: self._invoke(prompt), prompt)
+
+    def _invoke(self, prompt: str) -> str:
+        """Send a text completion request and return the completion."""
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=self._body(prompt),
+        )
+        return json.loads(response["body"].read())["completion"]
+
+    def _predict_streaming(self, **kwargs) -> str:
+        """
+        Stream a prediction and stop as soon as the fenced list is complete.
+
+        Args:
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            str: The content of the fenced list.
+        """
+        prompt = self.prompt.format(**kwargs)
+        return self._schedule(lambda: self._stream(prompt), prompt)
+
+    def _stream(self, prompt: str) -> str:
+        """Stream a text completion and return the content of the first fenced block."""
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=self._body(prompt),
+        )
+        parser = StreamingFenceParser()
+        stream = response["body"]
+        for event in stream:
+            chunk = json.loads(event["chunk"]["bytes"])
+            if parser.feed(chunk.get("completion", "")):
+                stream.close()
+                break
+        else:
+            parser.close()
+        if not parser.blocks:
+            raise ValueError("No fenced code block found in the response")
+        return parser.blocks[0]
+
+    def predict_list(self, **kwargs) -> List[str]:
+        """
+        Generate and extract an array from the prediction.
+
+        Args:
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            List[str]: The generated array.
+        """
+        if self.streaming:
+            return split_machine_list(self._predict_streaming(**kwargs))
+        return parse_machine_list(self._predict(**kwargs))
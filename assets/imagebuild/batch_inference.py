@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import logging
+import tempfile
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Final states of a Bedrock model invocation job
+COMPLETED_STATES = {"Completed", "PartiallyCompleted"}
+FAILED_STATES = {"Failed", "Stopped", "Expired"}
+# The minimum number of records of a Bedrock model invocation job
+MIN_RECORDS = 100
+
+
+class BatchBackend(ABC):
+    """
+    The base class of the batch inference backends.
+
+    A batch is a dict of record IDs and model inputs. It is written as a JSON-lines file of
+    `{"recordId": ..., "modelInput": ...}` records and its results are read from a JSON-lines file of
+    `{"recordId": ..., "modelOutput": ...}` or `{"recordId": ..., "error": ...}` records, the format of Amazon Bedrock
+    batch inference.
+    """
+
+    # The minimum number of records of a batch, smaller batches are requested on-demand
+    min_records = 1
+
+    @abstractmethod
+    def _process(self, input_path: str, directory: str) -> str:
+        """Process the input file and return the path of the output file."""
+
+    def run(self, model_inputs: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Run a batch and wait for its results.
+
+        Args:
+            model_inputs: The request body per record ID.
+
+        Returns:
+            Dict[str, Dict]: The response body per record ID, records without a response are left out.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, "records.jsonl")
+            with open(input_path, "w") as f:
+                for record_id, model_input in model_inputs.items():
+                    record = {"recordId": record_id, "modelInput": model_input}
+                    f.write(json.dumps(record) + "\n")
+            output_path = self._process(input_path, directory)
+
+            outputs = {}
+            with open(output_path, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "modelOutput" in record:
+                        outputs[record["recordId"]] = record["modelOutput"]
+                    else:
+                        logger.warning(
+                            f"Record {record['recordId']} failed: {record.get('error')}"
+                        )
+        return outputs
+
+
+class BedrockBatchBackend(BatchBackend):
+    """
+    A batch backend submitting a single Amazon Bedrock model invocation job per batch.
+
+    Jobs take at least MIN_RECORDS records. The input and output files are stored below a prefix of an Amazon S3
+    bucket, which the service role of the job reads from and writes to.
+
+    A submitted job is reported to on_submit, e.g. to record it with the requests, and a job submitted by an earlier
+    build is resumed with job_arn instead of paying for a new one. Its output holds the records of the earlier batch,
+    records of the current batch it lacks are left out of the results.
+    """
+
+    def __init__(
+        self,
+        bedrock_client,
+        s3_client,
+        bucket: str,
+        role_arn: str,
+        model_id: str,
+        prefix: str = "batch/",
+        poll_interval: float = 60,
+        timeout: float = 60 * 60,
+        job_arn: str = None,
+        on_submit: Callable[[str], None] = None,
+    ):
+        """
+        Initialize the BedrockBatchBackend.
+
+        Args:
+            bedrock_client: The boto3 `bedrock` (control plane) client.
+            s3_client: The boto3 Amazon S3 client.
+            bucket (str): The bucket of the input and output files.
+            role_arn (str): The service role Amazon Bedrock assumes to read and write the files.
+            model_id (str): The model of the job.
+            prefix (str): The key prefix of the input and output files.
+            poll_interval (float): The seconds between two status checks of the job.
+            timeout (float): The seconds after which the job is stopped and the batch fails, below the remaining
+                time of the build.
+            job_arn (str): The job of an earlier build to resume, a new job is submitted if None.
+            on_submit (Callable[[str], None]): Called with the ARN of a submitted job.
+        """
+        self.bedrock_client = bedrock_client
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.role_arn = role_arn
+        self.model_id = model_id
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.job_arn = job_arn
+        self.on_submit = on_submit
+        # A resumed job is already paid for, whatever the size of the batch
+        self.min_records = 1 if job_arn else MIN_RECORDS
+
+    def _submit(self, input_path: str) -> str:
+        """Upload the input file and submit a job."""
+        job_name = f"synthetic-data-{int(time.time())}"
+        input_key = f"{self.prefix}{job_name}/records.jsonl"
+        self.s3_client.upload_file(
+            Filename=input_path, Bucket=self.bucket, Key=input_key
+        )
+        job_arn = self.bedrock_client.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=self.model_id,
+            inputDataConfig={
+                "s3InputDataConfig": {
+                    "s3Uri": f"s3://{self.bucket}/{input_key}"
+                }
+            },
+            outputDataConfig={
+                "s3OutputDataConfig": {
+                    "s3Uri": f"s3://{self.bucket}/{self.prefix}{job_name}/output/"
+                }
+            },
+        )["jobArn"]
+        logger.info(f"Submitted batch inference job {job_arn}")
+        if self.on_submit is not None:
+            self.on_submit(job_arn)
+        return job_arn
+
+    def _process(self, input_path: str, directory: str) -> str:
+        """Submit or resume the job, wait for it and download its output file."""
+        if self.job_arn is None:
+            self.job_arn = self._submit(input_path)
+        else:
+            logger.info(f"Resuming batch inference job {self.job_arn}")
+        job_arn = self.job_arn
+
+        start = time.perf_counter()
+        while True:
+            job = self.bedrock_client.get_model_invocation_job(
+                jobIdentifier=job_arn
+            )
+            status = job["status"]
+            if status in COMPLETED_STATES:
+                break
+            if status in FAILED_STATES:
+                raise RuntimeError(f"Batch inference job {job_arn} {status}")
+            if time.perf_counter() - start > self.timeout:
+                self.bedrock_client.stop_model_invocation_job(
+                    jobIdentifier=job_arn
+                )
+                raise TimeoutError(f"Batch inference job {job_arn} timed out")
+            time.sleep(self.poll_interval)
+        logger.info(f"Batch inference job {job_arn} {status}")
+
+        # The output file is named after the input file below a folder of the job ID
+        output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+        bucket, output_prefix = output_uri[len("s3://") :].split("/", 1)
+        output_path = os.path.join(directory, "records.jsonl.out")
+        self.s3_client.download_file(
+            Bucket=bucket,
+            Key=f"{output_prefix}{job_arn.split('/')[-1]}/records.jsonl.out",
+            Filename=output_path,
+        )
+        return output_path
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    A file-based stand-in for Amazon Bedrock batch inference, e.g. for tests and benchmarks.
+
+    The records are sent one by one with `invoke_model` of a bedrock-runtime client, e.g. a fake client replaying
+    recorded responses, and written in the output format of a model invocation job.
+    """
+
+    def __init__(self, runtime_client, model_id: str):
+        """
+        Initialize the LocalBatchBackend.
+
+        Args:
+            runtime_client: The bedrock-runtime client processing the records.
+            model_id (str): The model of the records.
+        """
+        self.runtime_client = runtime_client
+        self.model_id = model_id
+
+    def _process(self, input_path: str, directory: str) -> str:
+        """Invoke the model for every record of the input file."""
+        output_path = os.path.join(directory, "records.jsonl.out")
+        with open(input_path, "r") as f, open(output_path, "w") as out:
+            for line in f:
+                record = json.loads(line)
+                try:
+                    response = self.runtime_client.invoke_model(
+                        modelId=self.model_id,
+                        contentType="application/json",
+                        accept="application/json",
+                        body=json.dumps(record["modelInput"]),
+                    )
+                    record["modelOutput"] = json.loads(response["body"].read())
+                except Exception as e:
+                    record["error"] = {"errorMessage": str(e)}
+                out.write(json.dumps(record) + "\n")
+        return output_path
@@ -0,0 +1,225 @@
+import time
+import random
+import logging
+import threading
+
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# The error codes are compared case-insensitively, the event stream of invoke_model_with_response_stream reports
+# them in camel case, e.g. `throttlingException`
+THROTTLING_ERRORS = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of a text at about four characters per token, without a model-specific tokenizer."""
+    return len(text) // 4
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Check whether a botocore error signals throttling or a transient overload.
+
+    LangChain re-raises botocore errors as a ValueError, so the chain of causes is checked as well.
+    """
+    codes = {code.lower() for code in THROTTLING_ERRORS}
+    while error is not None:
+        response = getattr(error, "response", None) or {}
+        code = response.get("Error", {}).get("Code") or ""
+        if code.lower() in codes:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TokenBucket:
+    """A thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        """
+        Initialize the TokenBucket.
+
+        Args:
+            per_minute (float): The refill rate per minute.
+            capacity (float): The burst capacity, defaults to one minute of refill.
+        """
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Take tokens from the bucket and block until they are available.
+
+        Args:
+            amount: The number of tokens, capped at the capacity.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class BedrockScheduler:
+    """
+    A shared scheduler for Bedrock requests that maximizes sustained throughput within the account quotas.
+
+    Requests pass a requests-per-minute and a tokens-per-minute token bucket and a concurrency limit. The limit
+    grows additively with every success and is halved on throttling (AIMD). Throttled requests are retried with
+    jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        tokens_per_minute: float = 200000,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        """
+        Initialize the BedrockScheduler.
+
+        Args:
+            requests_per_minute (float): The requests per minute quota.
+            tokens_per_minute (float): The tokens per minute quota.
+            max_concurrency (int): The upper bound of the adaptive concurrency limit.
+            min_concurrency (int): The lower bound of the adaptive concurrency limit.
+            max_retries (int): The number of retries of a throttled request.
+            base_delay (float): The base of the exponential backoff in seconds.
+            max_delay (float): The maximum backoff in seconds.
+        """
+        self.requests = TokenBucket(per_minute=requests_per_minute)
+        self.tokens = TokenBucket(per_minute=tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._metrics = {
+            "requests": 0,
+            "throttles": 0,
+            "retries": 0,
+            "failures": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def _enter(self) -> float:
+        """Wait for a free concurrency slot and return the seconds spent waiting."""
+        start = time.monotonic()
+        with self._condition:
+            self._metrics["queue_depth"] += 1
+            self._metrics["max_queue_depth"] = max(
+                self._metrics["max_queue_depth"], self._metrics["queue_depth"]
+            )
+            while self._in_flight >= int(self.concurrency):
+                self._condition.wait()
+            self._metrics["queue_depth"] -= 1
+            self._in_flight += 1
+        return time.monotonic() - start
+
+    def _exit(self, throttled: bool) -> None:
+        """Release a concurrency slot and adapt the concurrency limit."""
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.concurrency = max(
+                    self.min_concurrency, self.concurrency / 2
+                )
+                self._metrics["throttles"] += 1
+            else:
+                self.concurrency = min(
+                    self.max_concurrency,
+                    self.concurrency + 1 / self.concurrency,
+                )
+            self._condition.notify_all()
+
+    def _record_wait(self, waited: float) -> None:
+        with self._condition:
+            self._metrics["wait_seconds"] += waited
+            self._metrics["max_wait_seconds"] = max(
+                self._metrics["max_wait_seconds"], waited
+            )
+
+    def _backoff(self, attempt: int) -> float:
+        """Get the full-jitter exponential backoff of an attempt."""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2**attempt)
+        )
+
+    def call(self, request: Callable, estimated_tokens: int = 0):
+        """
+        Run a Bedrock request within the quotas and retry it on throttling.
+
+        Args:
+            request: The function sending the request.
+            estimated_tokens: The estimated input and output tokens of the request.
+
+        Returns:
+            The result of the request.
+        """
+        for attempt in range(self.max_retries + 1):
+            waited = self._enter()
+            waited += self.requests.acquire()
+            waited += self.tokens.acquire(estimated_tokens)
+            self._record_wait(waited)
+            throttled = False
+            try:
+                with self._condition:
+                    self._metrics["requests"] += 1
+                return request()
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if not throttled or attempt == self.max_retries:
+                    with self._condition:
+                        self._metrics["failures"] += 1
+                    raise
+            finally:
+                self._exit(throttled=throttled)
+            delay = self._backoff(attempt)
+            logger.warning(
+                f"Bedrock throttled, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+            )
+            with self._condition:
+                self._metrics["retries"] += 1
+            time.sleep(delay)
+
+    def metrics(self) -> Dict:
+        """Get the queue depth, wait time, throttling and retry metrics."""
+        with self._condition:
+            return {
+                **self._metrics,
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+            }
@@ -1,19 +1,74 @@
 import re
 import os
+import json
 import boto3
 import shutil
-import markdown
 import logging
 
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from langchain.llms.bedrock import Bedrock
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import (
+    ConversationSummaryBufferMemory,
+    ConversationTokenBufferMemory,
+)
 from langchain.prompts import PromptTemplate
 
+from batch_inference import BatchBackend
+from bedrock_scheduler import BedrockScheduler, estimate_tokens
+from fence_parser import StreamingFenceParser, extract_code
+from generation_cache import GenerationCache, create_cache_key
+from job_intake import is_done
+from metrics import Metrics
+from signal_engine import load_spec
+
 logger = logging.getLogger(__name__)
 
+# The file written per machine and executed by the runner in each generation mode
+OUTPUT_FILES = {"script": "main.py", "spec": "spec.json"}
+
+SPEC_PROMPT = """
+Write a high-quality {language} signal specification for the following task, something a {context} reliability engineer would write.
+
+NEVER write anything before the ```{language}``` block. After you are done generating the specification and after the ```{language}``` block, check your work VERY CAREFULLY to make sure there are no mistakes, errors, or inconsistencies. It's IMPORTANT that if there are ERRORS, LIST THOSE ERRORS in <error> tags, then GENERATE a new version with those ERRORS FIXED. If there are no errors, write "CHECKED: NO ERRORS" in <error> tags.
+
+Here is the task:
+<task>
+* Specify the signals of a synthetic {question} dataset using ACTUAL and REALISTIC physical signal names, units and values
+* Add some occasional anomalies to the signals
+* The signals are sampled every {interval} over {span}, choose noise, drift and seasonality accordingly
+* Use exactly this structure and only these keys:
+{{"signals": [{{"name": "<signal name with unit>", "mean": <typical value>, "min": <physical minimum>, "max": <physical maximum>, "noise": <standard deviation>, "drift": <change over one year>, "seasonality": [{{"period_hours": <period>, "amplitude": <amplitude>}}], "anomaly_rate": <fraction of anomalous samples>, "anomaly_magnitude": <size of an anomaly>}}]}}
+* `min` <= `mean` <= `max` for every signal
+</task>
+"""
+
+
+REPAIR_PROMPT = """
+The following {language} script failed with the error below. Fix the error and return the complete corrected script in a single ```{language}``` block. DO NOT add any explanations.
+
+<traceback>
+{error}
+</traceback>
+
+```{language}
+{code}
+```
+"""
+
+
+class TokenEstimatingBedrock(Bedrock):
+    """
+    A Bedrock model counting tokens with the estimate of the scheduler.
+
+    The conversation memory counts the tokens of its turns with the model, which for Anthropic models requires the
+    anthropic package.
+    """
+
+    def get_num_tokens(self, text: str) -> int:
+        """Estimate the tokens of a text."""
+        return estimate_tokens(text)
+
 
 class DataGeneratorApp:
     """
@@ -29,6 +84,14 @@ class DataGeneratorApp:
         callbacks: List,
         model_kwargs: Dict,
         verbose: bool = True,
+        client: boto3.client = None,
+        memory: str = None,
+        max_token_limit: int = 2000,
+        cache: GenerationCache = None,
+        cancel_when_checked: bool = True,
+        scheduler: BedrockScheduler = None,
+        generation_mode: str = "script",
+        metrics: Metrics = None,
     ):
         """
         Initialize the DataGeneratorApp.
@@ -39,12 +102,31 @@ class DataGeneratorApp:
             callbacks (List): List of callbacks for the machine learning model.
             model_kwargs (Dict): Additional keyword arguments for the machine learning model.
             verbose (bool): Flag indicating whether to display verbose information.
+            client (boto3.client): An existing Bedrock runtime client to share, a new one is created if None.
+            memory (str): The conversation memory strategy ("window" or "summary"), stateless if None.
+            max_token_limit (int): The token budget of the conversation memory.
+            cache (GenerationCache): A cache for generated code, only used in stateless mode.
+            cancel_when_checked (bool): Flag indicating whether to stop streaming once the self-check reports no errors.
+            scheduler (BedrockScheduler): A scheduler shared by all generators to rate limit and retry requests.
+            generation_mode (str): Generate a "script" executed as is or a JSON "spec" executed by the signal engine.
+            metrics (Metrics): Records the generation and parsing stages, kept in memory only if None.
         """
+        if generation_mode not in OUTPUT_FILES:
+            raise ValueError(f"Unknown generation mode {generation_mode}")
+        self.model_id = model_id
+        self.model_kwargs = model_kwargs
+        self.streaming = streaming
+        self.cache = cache
+        self.cancel_when_checked = cancel_when_checked
+        self.scheduler = scheduler
+        self.generation_mode = generation_mode
+        self.metrics = metrics or Metrics()
+
         # Initialize Bedrock client
-        self.client = boto3.client("bedrock-runtime")
+        self.client = client or boto3.client("bedrock-runtime")
 
         # Initialize Bedrock model
-        self.llm = Bedrock(
+        self.llm = TokenEstimatingBedrock(
             model_id=model_id,
             streaming=streaming,
             callbacks=callbacks,
@@ -52,10 +134,13 @@ class DataGeneratorApp:
             client=self.client,
         )
 
-        # Initialize ConversationChain for generating synthetic machine signals
-        self.conversation = ConversationChain(
-            llm=self.llm, verbose=verbose, memory=ConversationBufferMemory()
-        )
+        # Initialize ConversationChain for generating synthetic machine signals.
+        # Without memory every prompt is sent on its own with a fixed size.
+        self.conversation = None
+        if memory:
+            self.set_conversation(
+                verbose=verbose, memory=memory, max_token_limit=max_token_limit
+            )
 
         # Set the default prompt template for data generation
         default_prompt = """
@@ -68,14 +153,24 @@ Here is the task:
 * Write code to generate synthetic {question} data using ACTUAL and REALISTIC physical signal names and values
 * Add some occasional anomalies to the signals that are created
 * The first column is `Timestamp` in the format `yyyy-MM-dd HH:mm:ss`
-* The `Timestamp` is collected every minute and the dataset should span an entire year
+* The `Timestamp` is collected every {interval} and the dataset should span {span}
+* Generate and append the data in chunks of at most one month or 100000 rows, NEVER hold the entire dataset in memory
+* If the environment variable `SPAN_DAYS` is set, it overrides the span in days, e.g. for a short test run
 * Write a `main` function that executes the data generation and saves the entire data to local disk. Make sure the file contains the headers!
 * Use object-oriented programming for all code and add docstrings
 </task>
 """
         self.prompt = PromptTemplate(
-            template=default_prompt,
-            input_variables=["context", "question", "language"],
+            template=SPEC_PROMPT
+            if generation_mode == "spec"
+            else default_prompt,
+            input_variables=[
+                "context",
+                "question",
+                "language",
+                "interval",
+                "span",
+            ],
         )
 
     def get_client(self) -> None:
@@ -87,7 +182,7 @@ Here is the task:
         return self.llm
 
     def get_conversation(self) -> None:
-        """Get the ConversationChain instance."""
+        """Get the ConversationChain instance, None in stateless mode."""
         return self.conversation
 
     def get_prompt(self) -> None:
@@ -114,7 +209,10 @@ Here is the task:
             callbacks (List): List of callbacks for the machine learning model.
             model_kwargs (Dict): Additional keyword arguments for the machine learning model.
         """
-        self.llm = Bedrock(
+        self.model_id = model_id
+        self.model_kwargs = model_kwargs
+        self.streaming = streaming
+        self.llm = TokenEstimatingBedrock(
             model_id=model_id,
             streaming=streaming,
             callbacks=callbacks,
@@ -122,15 +220,32 @@ Here is the task:
             client=self.client,
         )
 
-    def set_conversation(self, verbose: bool) -> None:
+    def set_conversation(
+        self,
+        verbose: bool,
+        memory: str = "window",
+        max_token_limit: int = 2000,
+    ) -> None:
         """
         Set the ConversationChain instance.
 
         Args:
             verbose (bool): Flag indicating whether to display verbose information.
+            memory (str): The memory strategy, "window" keeps the most recent turns and "summary" summarizes older turns.
+            max_token_limit (int): The token budget of the conversation memory.
         """
+        if memory == "window":
+            conversation_memory = ConversationTokenBufferMemory(
+                llm=self.llm, max_token_limit=max_token_limit
+            )
+        elif memory == "summary":
+            conversation_memory = ConversationSummaryBufferMemory(
+                llm=self.llm, max_token_limit=max_token_limit
+            )
+        else:
+            raise ValueError(f"Unknown memory strategy: {memory}")
         self.conversation = ConversationChain(
-            llm=self.llm, verbose=verbose, memory=ConversationBufferMemory()
+            llm=self.llm, verbose=verbose, memory=conversation_memory
         )
 
     def set_prompt(self, prompt_template: str, input_vars: List) -> None:
@@ -156,29 +271,241 @@ Here is the task:
         Returns:
             str: The generated prediction.
         """
-        output = self.conversation.predict(input=self.prompt.format(**kwargs))
+        prompt = self.prompt.format(**kwargs)
+        if self.conversation is None:
+            return self._schedule(lambda: self.llm.predict(prompt), prompt)
+        output = self._schedule(
+            lambda: self.conversation.predict(input=prompt), prompt
+        )
         return output
 
-    def predict_code(self, **kwargs) -> str:
+    def _schedule(self, request: Callable[[], str], prompt: str) -> str:
+        """
+        Run a Bedrock request through the scheduler, if there is one.
+
+        Args:
+            request: The function sending the request.
+            prompt: The rendered prompt, used to estimate the tokens of the request.
+
+        Returns:
+            str: The result of the request.
+        """
+        if self.scheduler is None:
+            return request()
+        estimated_tokens = estimate_tokens(prompt) + self.model_kwargs.get(
+            "max_tokens_to_sample", 0
+        )
+        return self.scheduler.call(request, estimated_tokens=estimated_tokens)
+
+    def get_cache_key(self, **kwargs) -> str:
+        """
+        Get the cache key of a prediction.
+
+        The prompt is rendered with the normalized machine name so that spelling variants share one entry.
+
+        Args:
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            str: The cache key.
+        """
+        machine = create_directory_string(machine=kwargs["question"])
+        prompt = self.prompt.format(**{**kwargs, "question": machine})
+        return create_cache_key(
+            model_id=self.model_id,
+            model_kwargs=self.model_kwargs,
+            prompt=prompt,
+            machine=machine,
+        )
+
+    def _predict_streaming(
+        self, on_block: Callable[[str], None] = None, **kwargs
+    ) -> str:
+        """
+        Generate a prediction with `invoke_model_with_response_stream` and extract its code while it is streamed.
+
+        Args:
+            on_block: Called with the code of every fenced block as soon as it is complete.
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            str: The code of the last complete block.
+        """
+        prompt = self.prompt.format(**kwargs)
+        return self._schedule(lambda: self._stream(prompt, on_block), prompt)
+
+    def _stream(self, prompt: str, on_block: Callable[[str], None]) -> str:
+        """
+        Stream a completion and hand over every fenced block as soon as it is complete.
+
+        Args:
+            prompt: The rendered prompt.
+            on_block: Called with the code of every complete block.
+
+        Returns:
+            str: The code of the last complete block.
+        """
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(self.create_model_input(prompt)),
+        )
+        parser = StreamingFenceParser()
+        stream = response["body"]
+        for event in stream:
+            chunk = json.loads(event["chunk"]["bytes"])
+            if "amazon-bedrock-invocationMetrics" in chunk:
+                # Only the last chunk of a complete response has the token counts
+                invocation = chunk["amazon-bedrock-invocationMetrics"]
+                self.metrics.record(
+                    "bedrock",
+                    operation="InvokeModelWithResponseStream",
+                    input_tokens=invocation["inputTokenCount"],
+                    output_tokens=invocation["outputTokenCount"],
+                )
+            for block in parser.feed(chunk.get("completion", "")):
+                if on_block is not None:
+                    on_block(block)
+            if self.cancel_when_checked and parser.checked:
+                # The self-check found no errors, skip the rest of the response
+                stream.close()
+                break
+        else:
+            for block in parser.close():
+                if on_block is not None:
+                    on_block(block)
+        if not parser.blocks:
+            raise ValueError("No fenced code block found in the response")
+        return parser.blocks[-1]
+
+    def create_model_input(self, prompt: str) -> Dict:
+        """Create the request body of a text completion for a rendered prompt."""
+        return {
+            "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
+            **self.model_kwargs,
+        }
+
+    def predict_batch(
+        self, requests: List[Dict], backend: BatchBackend, min_records: int = 1
+    ) -> List[Optional[str]]:
+        """
+        Generate the completions of many prompts with a single batch inference job.
+
+        Prompts with a cached result are not sent, predict_code reads them from the cache. Prompts sharing a cache key
+        are sent once, under a record ID derived from the key, so the job of an earlier build maps its records to the
+        same prompts. No job is run if fewer records than min_records or the minimum of the backend remain, the
+        prompts are then generated on-demand.
+
+        Args:
+            requests: The keyword arguments to fill in the prompt template per prompt.
+            backend: The batch inference backend.
+            min_records: The minimum number of records sent in a job.
+
+        Returns:
+            List[Optional[str]]: The completion per prompt, None if it is cached or failed.
+        """
+        if self.conversation is not None:
+            raise ValueError("Batch inference requires the stateless mode")
+        model_inputs, record_ids = {}, []
+        for kwargs in requests:
+            key = self.get_cache_key(**kwargs)
+            if self.cache is not None and self.cache.contains(key):
+                record_ids.append(None)
+                continue
+            # Bedrock expects record IDs of 11 alphanumeric characters, the same in every build to resume a job
+            record_id = key[:11]
+            record_ids.append(record_id)
+            if record_id not in model_inputs:
+                model_inputs[record_id] = self.create_model_input(
+                    self.prompt.format(**kwargs)
+                )
+        if len(model_inputs) < max(min_records, backend.min_records, 1):
+            logger.info(
+                f"Generating {len(model_inputs)} uncached prompts on-demand"
+            )
+            return [None] * len(requests)
+        outputs = backend.run(model_inputs)
+        return [
+            outputs.get(record_id, {}).get("completion")
+            for record_id in record_ids
+        ]
+
+    def predict_code(
+        self,
+        on_block: Callable[[str], None] = None,
+        validate: Callable[[str], None] = None,
+        use_cache: bool = True,
+        completion: str = None,
+        **kwargs,
+    ) -> str:
         """
         Generate and extract code from the prediction.
 
         Args:
+            on_block: Called with the code of every complete block while streaming, e.g. to write it early.
+            validate: Called with the generated code before it is cached, raises a ValueError to reject it.
+            use_cache: Flag indicating whether to look up the cache, e.g. False to regenerate rejected code.
+            completion: A completion generated beforehand, e.g. by predict_batch, the model is not called if set.
             kwargs: Keyword arguments to fill in the prompt template.
 
         Returns:
             str: The generated code.
         """
-        code = self._predict(**kwargs)
-        html = markdown.markdown(code, extensions=["fenced_code"])
-        soup = BeautifulSoup(html, features="lxml")
-        soup.error.decompose()
-        code = soup.find("code").get_text()
+        key = None
+        if self.cache is not None and self.conversation is None:
+            key = self.get_cache_key(**kwargs)
+            code = self.cache.get(key) if use_cache else None
+            if code is not None:
+                return code
+        machine = kwargs.get("question")
+        if completion is not None:
+            with self.metrics.span("parsing", machine=machine):
+                code = extract_code(completion)
+        elif self.streaming and self.conversation is None:
+            # The code is parsed while it is streamed
+            with self.metrics.span("generation", machine=machine):
+                code = self._predict_streaming(on_block=on_block, **kwargs)
+        else:
+            with self.metrics.span("generation", machine=machine):
+                output = self._predict(**kwargs)
+            with self.metrics.span("parsing", machine=machine):
+                code = extract_code(output)
+        if self.generation_mode == "spec":
+            # Reject a malformed spec before it is cached or handed to the runner
+            load_spec(code)
+        if validate is not None:
+            validate(code)
+        if key is not None:
+            self.cache.put(key, code)
         return code
 
+    def repair_code(self, code: str, error: str, language: str) -> Dict:
+        """
+        Repair a failed script with a compact prompt holding only the script and its error.
+
+        The repair is always stateless, so it does not grow or depend on the conversation memory.
+
+        Args:
+            code: The failed script.
+            error: The tail of the traceback.
+            language: The programming language of the script.
+
+        Returns:
+            Dict: The repaired `code` and the estimated `tokens` of the request and response.
+        """
+        prompt = REPAIR_PROMPT.format(
+            language=language, error=error, code=code
+        )
+        output = self._schedule(lambda: self.llm.predict(prompt), prompt)
+        return {
+            "code": extract_code(output),
+            "tokens": (len(prompt) + len(output)) // 4,
+        }
+
     def write_parsed_code(self, code: str, dir: str) -> None:
         """
-        Write the parsed code to a folder.
+        Write the parsed code to a folder, as main.py or spec.json depending on the generation mode.
 
         Args:
             code: The generated code.
@@ -187,10 +514,29 @@ Here is the task:
         if os.path.exists(dir):
             shutil.rmtree(dir)
         os.makedirs(dir)
-        with open(f"{dir}/main.py", "w") as f:
+        with open(f"{dir}/{OUTPUT_FILES[self.generation_mode]}", "w") as f:
             f.write(code)
 
 
+def describe_duration(seconds: float) -> str:
+    """
+    Describe a duration for the prompt, e.g. "1 minute", "5 seconds" or "365 days".
+
+    Args:
+        seconds: The duration in seconds.
+
+    Return:
+        str: The duration in the largest unit dividing it.
+    """
+    for unit, size in [("day", 86400), ("hour", 3600), ("minute", 60)]:
+        if seconds >= size and seconds % size == 0:
+            break
+    else:
+        unit, size = "second", 1
+    count = seconds / size
+    return f"{count:g} {unit}" + ("" if count == 1 else "s")
+
+
 def create_directory_string(machine: str):
     """
     Create a repository string
@@ -206,86 +552,51 @@ def create_directory_string(machine: str):
     )
 
 
-def create_bash_script(machines: List, s3_bucket: str, user_id: str) -> None:
+def create_run_manifest(
+    jobs: Dict[str, Dict], s3_bucket: str, path: str = "run_manifest.json"
+) -> None:
     """
-    Create a bash script to be executed by CodeBuild.
+    Create the manifest the script runner executes in CodeBuild.
+
+    Every machine directory is stored below the `<user_id>/<job_id>` prefix of its job, which doubles as the Amazon S3
+    key prefix. The time axis of each directory is passed on to the signal engine and its cache key to the repair of
+    its script. Machines whose data an earlier build uploaded are left out, the runner completes a job once all of its
+    listed machines succeeded.
 
     Args:
-        machines: A list of generated machine dataset codes.
-        s3_bucket: The Amazon S3 bucket data will be sent to
+        jobs: The jobs per prefix with their user_id, job_id, machines, interval_seconds, span_days, checkpoints,
+            builds and cache_keys.
+        s3_bucket: The Amazon S3 bucket data will be sent to.
+        path: The path of the manifest file.
     """
-    script = """
-#!/bin/bash
-
-export AnException=100
-export AnotherException=101
-
-execute_python() {
-    echo "Starting the script at " `date`
-    cd $1
-    python main.py
-    aws s3 cp . $2 --recursive --exclude "*" --include="*.csv"
-    cd ../
-}
-
-function try()
-{
-    [[ $- = *e* ]]; SAVED_OPT_E=$?
-    set +e
-}
-
-function throw()
-{
-    exit $1
-}
-
-function catch()
-{
-    export ex_code=$?
-    (( $SAVED_OPT_E )) && set +e
-    return $ex_code
-}
-
-function throwErrors()
-{
-    set -e
-}
-
-function ignoreErrors()
-{
-    set +e
-}
-
-"""
-    for machine in machines:
-        directory = create_directory_string(machine=machine)
-        script += """
-# start with a try
-try
-(
-    echo "Start the try statement"
-    execute_python %s %s || true # ignore a single failing command
-    echo "finished"
-)
-# directly after closing the subshell you need to connect a group to the catch using ||
-catch || {
-    # now you can handle
-    case $ex_code in
-        $AnException)
-            echo "AnException was thrown"
-        ;;
-        $AnotherException)
-            echo "AnotherException was thrown"
-        ;;
-        *)
-            echo "An unexpected exception was thrown"
-            throw $ex_code # you can rethrow the "exception" causing the script to exit if not caught
-        ;;
-    esac
-}""" % (
-            directory,
-            f"s3://{s3_bucket}/{user_id}/{directory}/",
-        )
-
-    with open("deploy.sh", "w") as f:
-        f.write(script)
+    directories, time_axis, cache_keys, requests = [], {}, {}, {}
+    for prefix, job in jobs.items():
+        requests[prefix] = {
+            "user_id": job["user_id"],
+            "job_id": job["job_id"],
+            "directories": [],
+            "builds": job.get("builds", 1),
+        }
+        for machine in job["machines"]:
+            directory = f"{prefix}/{create_directory_string(machine=machine)}"
+            if is_done(
+                job.get("checkpoints", {}).get(directory), "data_uploaded"
+            ):
+                continue
+            directories.append(directory)
+            requests[prefix]["directories"].append(directory)
+            time_axis[directory] = {
+                "interval_seconds": job["interval_seconds"],
+                "span_days": job["span_days"],
+            }
+            if job.get("cache_keys", {}).get(directory):
+                cache_keys[directory] = job["cache_keys"][directory]
+    manifest = {
+        "data_bucket": s3_bucket,
+        "directories": directories,
+        "time_axis": time_axis,
+        "cache_keys": cache_keys,
+        "jobs": requests,
+    }
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=4)
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from typing import Dict, Optional
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def create_cache_key(
+    model_id: str, model_kwargs: Dict, prompt: str, machine: str
+) -> str:
+    """
+    Create a content-addressed cache key for a generated script.
+
+    Args:
+        model_id: The Bedrock model ID.
+        model_kwargs: The model keyword arguments.
+        prompt: The rendered prompt.
+        machine: The normalized machine name.
+
+    Returns:
+        str: The SHA-256 hex digest of the inputs.
+    """
+    payload = json.dumps(
+        {
+            "model_id": model_id,
+            "model_kwargs": model_kwargs,
+            "prompt": prompt,
+            "machine": machine,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LocalCacheBackend:
+    """A cache backend storing generated scripts in a local directory."""
+
+    def __init__(self, directory: str):
+        """
+        Initialize the LocalCacheBackend.
+
+        Args:
+            directory (str): The directory the cached scripts are stored in.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.py")
+
+    def list(self) -> Dict[str, float]:
+        """List all cached keys with their creation timestamp."""
+        return {
+            name[:-3]: os.path.getmtime(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory)
+            if name.endswith(".py")
+        }
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached script or None if it does not exist."""
+        try:
+            with open(self._path(key), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, code: str) -> None:
+        """Store a script."""
+        with open(self._path(key), "w") as f:
+            f.write(code)
+
+    def delete(self, key: str) -> None:
+        """Delete a cached script."""
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+
+class S3CacheBackend:
+    """A cache backend storing generated scripts under an Amazon S3 prefix."""
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "cache/"):
+        """
+        Initialize the S3CacheBackend.
+
+        Args:
+            s3_client: The boto3 S3 client.
+            bucket (str): The Amazon S3 bucket, usually the code bucket.
+            prefix (str): The key prefix the cached scripts are stored under.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}.py"
+
+    def list(self) -> Dict[str, float]:
+        """List all cached keys with their creation timestamp."""
+        entries = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(self.prefix) :]
+                if name.endswith(".py"):
+                    entries[name[:-3]] = obj["LastModified"].timestamp()
+        return entries
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached script or None if it does not exist."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self._key(key)
+            )
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read().decode("utf-8")
+
+    def put(self, key: str, code: str) -> None:
+        """Store a script."""
+        self.s3_client.put_object(
+            Bucket=self.bucket, Key=self._key(key), Body=code.encode("utf-8")
+        )
+
+    def delete(self, key: str) -> None:
+        """Delete a cached script."""
+        self.s3_client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+class GenerationCache:
+    """
+    A thread-safe cache for generated machine scripts with TTL and LRU eviction.
+
+    Entries expire `ttl` seconds after they were stored. Once more than `max_entries` are stored, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(
+        self, backend, ttl: Optional[float] = None, max_entries: int = None
+    ):
+        """
+        Initialize the GenerationCache.
+
+        Args:
+            backend: The storage backend (LocalCacheBackend or S3CacheBackend).
+            ttl (float): The time to live of an entry in seconds, no expiry if None.
+            max_entries (int): The maximum number of entries, unbounded if None.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict(
+            sorted(backend.list().items(), key=lambda entry: entry[1])
+        )
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a cached script.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            Optional[str]: The cached script or None on a miss.
+        """
+        with self._lock:
+            created = self._entries.get(key)
+            expired = created is not None and self._is_expired(created)
+            if created is None or expired:
+                self._entries.pop(key, None)
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+        if created is None:
+            return None
+        if expired:
+            self.backend.delete(key)
+            return None
+        code = self.backend.get(key)
+        if code is None:
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return code
+
+    def contains(self, key: str) -> bool:
+        """Check whether a script is cached and not expired, without reading it or counting a hit."""
+        with self._lock:
+            created = self._entries.get(key)
+        return created is not None and not self._is_expired(created)
+
+    def put(self, key: str, code: str) -> None:
+        """
+        Store a script and evict the least recently used entries if necessary.
+
+        Args:
+            key: The cache key.
+            code: The generated script.
+        """
+        self.backend.put(key, code)
+        with self._lock:
+            self._entries[key] = time.time()
+            self._entries.move_to_end(key)
+            evicted = []
+            while (
+                self.max_entries is not None
+                and len(self._entries) > self.max_entries
+            ):
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.evictions += len(evicted)
+        for evicted_key in evicted:
+            self.backend.delete(evicted_key)
+
+    def stats(self) -> Dict:
+        """Get the hit, miss and eviction counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
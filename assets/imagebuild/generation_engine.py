@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from batch_inference import BatchBackend
+from data_generator_app import DataGeneratorApp, create_directory_string
+from script_validator import ScriptValidator
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationEngine:
+    """
+    A bounded-concurrency engine that generates the data generation code for many machines in parallel.
+
+    Every worker thread owns its own DataGeneratorApp so that no prompt state is shared between threads. The worker
+    pool is shared by all concurrent generate calls, so max_concurrency bounds the Bedrock requests of all jobs.
+    """
+
+    def __init__(
+        self,
+        app_factory: Callable[[], DataGeneratorApp],
+        on_result: Callable[[str, str], None],
+        max_concurrency: int = 4,
+        validator: ScriptValidator = None,
+        max_attempts: int = 3,
+    ):
+        """
+        Initialize the GenerationEngine.
+
+        Args:
+            app_factory (Callable): Returns a new DataGeneratorApp for a worker thread.
+            on_result (Callable): Called with (machine, directory) as soon as a machine's main.py is written.
+            max_concurrency (int): The maximum number of parallel Bedrock requests.
+            validator (ScriptValidator): Validates generated scripts before they are written, no validation if None.
+            max_attempts (int): The number of generations of a machine whose scripts fail the validation.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.app_factory = app_factory
+        self.on_result = on_result
+        self.max_concurrency = max_concurrency
+        self.validator = validator
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self._executor.shutdown()
+
+    def _get_app(self) -> DataGeneratorApp:
+        """Get the DataGeneratorApp of the current worker thread."""
+        if not hasattr(self._local, "app"):
+            self._local.app = self.app_factory()
+        return self._local.app
+
+    def get_cache_key(self, machine: str, **kwargs) -> Optional[str]:
+        """
+        Get the cache key the code of a machine is stored under.
+
+        Args:
+            machine: The machine name.
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            Optional[str]: The cache key, None if the code is not cached.
+        """
+        app = self._get_app()
+        if app.cache is None or app.conversation is not None:
+            return None
+        return app.get_cache_key(question=machine, **kwargs)
+
+    def _validate(self, code: str, result: Dict, time_axis: Dict) -> None:
+        """Validate a script and record the report, raising a ValueError if it fails."""
+        with self._get_app().metrics.span(
+            "validation", machine=result["machine"]
+        ):
+            start = time.perf_counter()
+            report = self.validator.validate(code, **(time_axis or {}))
+            report["latency"] = time.perf_counter() - start
+            result.setdefault("validation", []).append(report)
+            if report["status"] != "passed":
+                raise ValueError(f"Validation failed: {report['error']}")
+
+    def predict_batch(
+        self, requests: List[Dict], backend: BatchBackend, min_records: int = 1
+    ) -> List[Optional[str]]:
+        """
+        Generate the completions of many prompts with a single batch inference job, see DataGeneratorApp.
+
+        Args:
+            requests: The keyword arguments to fill in the prompt template per prompt.
+            backend: The batch inference backend.
+            min_records: The minimum number of records sent in a job.
+
+        Returns:
+            List[Optional[str]]: The completion per prompt, None if it is cached or failed.
+        """
+        return self._get_app().predict_batch(requests, backend, min_records)
+
+    def _generate_machine(
+        self,
+        machine: str,
+        output_dir: str,
+        time_axis: Dict = None,
+        completion: str = None,
+        **kwargs,
+    ) -> Dict:
+        """
+        Generate, validate, write, hand over and time the code for a single machine.
+
+        Scripts failing the validation are regenerated without the cache, at most max_attempts times in total.
+
+        Args:
+            machine: The machine name.
+            output_dir: The directory the machine directory is created in.
+            time_axis: The interval_seconds and span_days the validation extrapolates to.
+            completion: The completion of a batch inference job, used instead of the first request if set.
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            Dict: The per-machine result with status, latency and error.
+        """
+        directory = os.path.normpath(
+            os.path.join(output_dir, create_directory_string(machine=machine))
+        )
+        result = {"machine": machine, "directory": directory}
+        start = time.perf_counter()
+        try:
+            app = self._get_app()
+            validate = None
+            if self.validator is not None and app.generation_mode == "script":
+                validate = lambda code: self._validate(code, result, time_axis)
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    code = app.predict_code(
+                        # Only write early when every block may be executed
+                        on_block=None
+                        if validate
+                        else lambda block: app.write_parsed_code(
+                            code=block, dir=directory
+                        ),
+                        validate=validate,
+                        use_cache=attempt == 1,
+                        completion=completion if attempt == 1 else None,
+                        question=machine,
+                        **kwargs,
+                    )
+                    break
+                except ValueError as e:
+                    if validate is None or attempt == self.max_attempts:
+                        raise
+                    logger.warning(
+                        f"Regenerating {machine}, attempt {attempt} failed: {e}"
+                    )
+            result["attempts"] = attempt
+            result["generation_latency"] = time.perf_counter() - start
+            app.write_parsed_code(code=code, dir=directory)
+            self.on_result(machine, directory)
+            result["status"] = "succeeded"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    def generate(
+        self,
+        machines: List[str],
+        output_dir: str = ".",
+        time_axis: Dict = None,
+        completions: Dict[str, str] = None,
+        **kwargs,
+    ) -> List[Dict]:
+        """
+        Generate the code for all machines with at most max_concurrency requests in flight.
+
+        Args:
+            machines: The list of machine names.
+            output_dir: The directory the machine directories are created in.
+            time_axis: The interval_seconds and span_days of the request.
+            completions: The completions of a batch inference job per machine, machines without one are requested
+                on-demand.
+            kwargs: Keyword arguments to fill in the prompt template.
+
+        Returns:
+            List[Dict]: The per-machine results in order of completion.
+        """
+        results = []
+        futures = [
+            self._executor.submit(
+                self._generate_machine,
+                machine,
+                output_dir,
+                time_axis,
+                (completions or {}).get(machine),
+                **kwargs,
+            )
+            for machine in machines
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result["status"] == "succeeded":
+                logger.info(
+                    f"Generated {result['machine']} in {result['latency']:.2f}s"
+                )
+            else:
+                logger.error(
+                    f"Error: {result['machine']} failed after {result['latency']:.2f}s: {result['error']}"
+                )
+            results.append(result)
+        return results
@@ -0,0 +1,350 @@
+import zlib
+import logging
+
+from typing import Dict, Iterator, List, Optional
+from boto3.dynamodb.types import TypeDeserializer
+
+logger = logging.getLogger(__name__)
+
+# The time axis of requests that do not set one
+DEFAULT_INTERVAL_SECONDS = 60
+DEFAULT_SPAN_DAYS = 365
+# The per-machine checkpoints of a request in order, only the uploaded stages survive a restart of the build
+STAGES = ["code_generated", "code_uploaded", "data_generated", "data_uploaded"]
+# The progress counters of the status record and the stage a machine counts from
+PROGRESS = {
+    "scripts_generated": "code_uploaded",
+    "datasets_uploaded": "data_uploaded",
+}
+# The job item attribute of the batch inference job a shard of a build submitted
+BATCH_JOB_ATTRIBUTE = "batch_job_arn_{shard_index}"
+
+
+def is_done(checkpoint: Optional[str], stage: str) -> bool:
+    """
+    Check whether a machine checkpoint has reached a stage.
+
+    Args:
+        checkpoint: The last recorded stage of the machine, None if nothing was recorded.
+        stage: The stage to check.
+
+    Returns:
+        bool: Whether the stage is completed.
+    """
+    return checkpoint is not None and STAGES.index(checkpoint) >= STAGES.index(
+        stage
+    )
+
+
+def get_job_key(directory: str) -> Dict:
+    """
+    Get the key of the request a machine directory belongs to.
+
+    Args:
+        directory: The machine directory, `<user_id>/<job_id>/<machine>`.
+
+    Returns:
+        Dict: The user_id and job_id of the request.
+    """
+    user_id, job_id, _ = directory.split("/", 2)
+    return {"user_id": user_id, "job_id": job_id}
+
+
+def get_batch_job_arn(job: Dict, shard_index: int = 0) -> Optional[str]:
+    """
+    Get the batch inference job an earlier build of a shard submitted for a job and did not finish.
+
+    Args:
+        job: The pending job.
+        shard_index: The shard of the build.
+
+    Returns:
+        Optional[str]: The ARN of the batch inference job, None if there is none.
+    """
+    return job.get(BATCH_JOB_ATTRIBUTE.format(shard_index=shard_index))
+
+
+def get_shard(directory: str, shard_count: int) -> int:
+    """
+    Get the shard of a machine directory, the same in every process of a sharded build.
+
+    Args:
+        directory: The machine directory, `<user_id>/<job_id>/<machine>`.
+        shard_count: The number of shards.
+
+    Returns:
+        int: The shard index from 0 to shard_count - 1.
+    """
+    return zlib.crc32(directory.encode()) % shard_count
+
+
+class JobIntake:
+    """
+    A class reading the pending user requests from the DynamoDB history table.
+
+    The table is keyed by user_id and job_id. Every request is a job item holding its status, time axis and progress
+    counters, and every machine of a request is a child item whose job_id is `<job_id>/<machine directory>`, so
+    `<user_id>/<child job_id>` is the machine directory. Status updates are small writes to a single item instead of
+    rewrites of a list or map that grows with the machines.
+
+    Pending jobs carry the column_name attribute (default: "active") with the value "yes". The table holds a sparse
+    global secondary index on that attribute, so querying the index only touches pending jobs. Completed jobs drop the
+    attribute and leave the index.
+
+    Every job records the number of builds that worked on it and every machine its last completed stage, so a build
+    that times out or fails is resumed from the uploaded code and data. The `job_status` and the PROGRESS counters of
+    the job item form the compact status record the status API reads. A batch inference job submitted for the
+    machines is recorded in the job item until its results are read, so the next build polls it instead of paying for
+    a new one.
+    """
+
+    def __init__(
+        self,
+        dynamodb_client,
+        table_name: str,
+        column_name: str = "active",
+        index_name: str = None,
+    ):
+        """
+        Initialize the JobIntake.
+
+        Args:
+            dynamodb_client: The boto3 DynamoDB client, e.g. a moto or DynamoDB local client in tests.
+            table_name (str): The name of the history table.
+            column_name (str): The attribute flagging pending jobs.
+            index_name (str): The sparse index on column_name, falls back to a table scan if None.
+        """
+        self.dynamodb_client = dynamodb_client
+        self.table_name = table_name
+        self.column_name = column_name
+        self.index_name = index_name
+        self._deserializer = TypeDeserializer()
+
+    def _deserialize(self, item: Dict) -> Dict:
+        job = {k: self._deserializer.deserialize(v) for k, v in item.items()}
+        job["interval_seconds"] = float(
+            job.get("interval_seconds", DEFAULT_INTERVAL_SECONDS)
+        )
+        job["span_days"] = float(job.get("span_days", DEFAULT_SPAN_DAYS))
+        job["builds"] = int(job.get("builds", 0))
+        job["prefix"] = f"{job['user_id']}/{job['job_id']}"
+        return job
+
+    def _load_machines(self, job: Dict) -> Dict:
+        """Add the machines of a job and the checkpoints per machine directory from its child items."""
+        job["machines"], job["checkpoints"] = [], {}
+        paginator = self.dynamodb_client.get_paginator("query")
+        pages = paginator.paginate(
+            TableName=self.table_name,
+            KeyConditionExpression="user_id = :user_id AND begins_with(job_id, :prefix)",
+            ExpressionAttributeValues={
+                ":user_id": {"S": job["user_id"]},
+                ":prefix": {"S": f"{job['job_id']}/"},
+            },
+            ProjectionExpression="job_id, machine, checkpoint",
+        )
+        for page in pages:
+            for item in page.get("Items", []):
+                job["machines"].append(item["machine"]["S"])
+                if "checkpoint" in item:
+                    directory = f"{job['user_id']}/{item['job_id']['S']}"
+                    job["checkpoints"][directory] = item["checkpoint"]["S"]
+        return job
+
+    def pending_jobs(self) -> Iterator[Dict]:
+        """
+        Iterate over all pending jobs across all result pages.
+
+        Returns:
+            Iterator[Dict]: The pending jobs as plain Python values, with the time axis as floats, their `prefix`
+            `<user_id>/<job_id>`, their machines and the checkpoints per machine directory.
+        """
+        kwargs = {
+            "TableName": self.table_name,
+            "ExpressionAttributeNames": {"#column_name": self.column_name},
+            "ExpressionAttributeValues": {":column_value": {"S": "yes"}},
+        }
+        if self.index_name:
+            paginator = self.dynamodb_client.get_paginator("query")
+            pages = paginator.paginate(
+                IndexName=self.index_name,
+                KeyConditionExpression="#column_name = :column_value",
+                **kwargs,
+            )
+        else:
+            paginator = self.dynamodb_client.get_paginator("scan")
+            pages = paginator.paginate(
+                FilterExpression="#column_name = :column_value", **kwargs
+            )
+        for page in pages:
+            for item in page.get("Items", []):
+                yield self._load_machines(self._deserialize(item))
+
+    def start_build(self, user_id: str, job_id: str) -> int:
+        """
+        Count a build working on a job.
+
+        Args:
+            user_id: The user ID of the job.
+            job_id: The job ID.
+
+        Returns:
+            int: The number of builds that worked on the job, including this one.
+        """
+        response = self.dynamodb_client.update_item(
+            TableName=self.table_name,
+            Key={"user_id": {"S": user_id}, "job_id": {"S": job_id}},
+            UpdateExpression="SET #status = :status ADD #builds :one",
+            ExpressionAttributeNames={
+                "#status": "job_status",
+                "#builds": "builds",
+            },
+            ExpressionAttributeValues={
+                ":status": {"S": "building"},
+                ":one": {"N": "1"},
+            },
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["builds"]["N"])
+
+    def set_batch_job(
+        self,
+        user_id: str,
+        job_id: str,
+        job_arn: Optional[str],
+        shard_index: int = 0,
+    ) -> None:
+        """
+        Record the batch inference job generating the machines of a job, so a build stopped while it runs resumes it.
+
+        Args:
+            user_id: The user ID of the job.
+            job_id: The job ID.
+            job_arn: The ARN of the batch inference job, or None once its results were read.
+            shard_index: The shard of the build that submitted the batch inference job.
+        """
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": {"user_id": {"S": user_id}, "job_id": {"S": job_id}},
+            "ExpressionAttributeNames": {
+                "#batch_job": BATCH_JOB_ATTRIBUTE.format(
+                    shard_index=shard_index
+                )
+            },
+        }
+        if job_arn is None:
+            self.dynamodb_client.update_item(
+                UpdateExpression="REMOVE #batch_job", **kwargs
+            )
+        else:
+            self.dynamodb_client.update_item(
+                UpdateExpression="SET #batch_job = :job_arn",
+                ExpressionAttributeValues={":job_arn": {"S": job_arn}},
+                **kwargs,
+            )
+
+    def set_checkpoint(self, directory: str, stage: Optional[str]) -> None:
+        """
+        Record the last completed stage of a machine in its child item.
+
+        The progress counters of the job are adjusted by the difference between the previous and the new stage, so
+        repeated or restarted stages are counted once.
+
+        Args:
+            directory: The machine directory, `<user_id>/<job_id>/<machine>`.
+            stage: The completed stage, one of STAGES, or None to start the machine over in the next build.
+        """
+        user_id, child_id = directory.split("/", 1)
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": {"user_id": {"S": user_id}, "job_id": {"S": child_id}},
+            # UPDATED_OLD may leave out a checkpoint set to its current stage
+            "ReturnValues": "ALL_OLD",
+        }
+        if stage is None:
+            response = self.dynamodb_client.update_item(
+                UpdateExpression="REMOVE checkpoint", **kwargs
+            )
+        elif stage in STAGES:
+            response = self.dynamodb_client.update_item(
+                UpdateExpression="SET checkpoint = :stage",
+                ExpressionAttributeValues={":stage": {"S": stage}},
+                **kwargs,
+            )
+        else:
+            raise ValueError(f"Unknown stage {stage}")
+
+        previous = (
+            response.get("Attributes", {}).get("checkpoint", {}).get("S")
+        )
+        deltas = {
+            counter: is_done(stage, counted) - is_done(previous, counted)
+            for counter, counted in PROGRESS.items()
+        }
+        deltas = {counter: delta for counter, delta in deltas.items() if delta}
+        if deltas:
+            key = get_job_key(directory)
+            self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key={name: {"S": value} for name, value in key.items()},
+                UpdateExpression="ADD "
+                + ", ".join(f"#{counter} :{counter}" for counter in deltas),
+                ExpressionAttributeNames={
+                    f"#{counter}": counter for counter in deltas
+                },
+                ExpressionAttributeValues={
+                    f":{counter}": {"N": str(delta)}
+                    for counter, delta in deltas.items()
+                },
+            )
+
+    def complete_job(
+        self, user_id: str, job_id: str, status: str = "completed"
+    ) -> None:
+        """
+        Mark a job as processed by removing it from the sparse index.
+
+        Args:
+            user_id: The user ID of the job.
+            job_id: The job ID.
+            status: The final job_status, e.g. "failed" if machines remain after the last build.
+        """
+        self.dynamodb_client.update_item(
+            TableName=self.table_name,
+            Key={"user_id": {"S": user_id}, "job_id": {"S": job_id}},
+            UpdateExpression="SET #status = :status REMOVE #column_name",
+            ExpressionAttributeNames={
+                "#status": "job_status",
+                "#column_name": self.column_name,
+            },
+            ExpressionAttributeValues={":status": {"S": status}},
+        )
+
+    def finish_build(
+        self, jobs: Dict[str, Dict], results: List[Dict], max_builds: int
+    ) -> None:
+        """
+        Complete the jobs of a build whose machines all succeeded or that ran out of builds.
+
+        Args:
+            jobs: The jobs of the run manifest per prefix, with their user_id, job_id, directories and builds.
+            results: The per-machine results of the runner.
+            max_builds: The number of builds after which a job with failed machines is completed as failed.
+        """
+        succeeded = {
+            result["directory"]
+            for result in results
+            if result["status"] == "succeeded"
+        }
+        for prefix, job in jobs.items():
+            remaining = set(job["directories"]) - succeeded
+            if not remaining or job["builds"] >= max_builds:
+                self.complete_job(
+                    user_id=job["user_id"],
+                    job_id=job["job_id"],
+                    status="failed" if remaining else "completed",
+                )
+            else:
+                print(
+                    f"{prefix}: {len(remaining)} machine(s) remain for build {job['builds'] + 1}"
+                )
@@ -1,13 +1,28 @@
 import os
+import time
 import boto3
 import argparse
 import logging
 
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_inference import BedrockBatchBackend, LocalBatchBackend
+from bedrock_scheduler import BedrockScheduler
 from data_generator_app import (
+    OUTPUT_FILES,
     DataGeneratorApp,
-    create_bash_script,
     create_directory_string,
+    create_run_manifest,
+    describe_duration,
 )
+from generation_cache import GenerationCache, S3CacheBackend
+from generation_engine import GenerationEngine
+from job_intake import JobIntake, get_batch_job_arn, get_shard, is_done
+from metrics import METRICS_FILE, create_metrics
+from script_validator import ScriptValidator
 
 logger = logging.getLogger(__name__)
 dynamodb = boto3.client("dynamodb")
@@ -25,12 +40,83 @@ if __name__ == "__main__":
     parser.add_argument("--data-bucket", type=str, required=True)
     parser.add_argument("--table-name", type=str, required=True)
     parser.add_argument("--column-name", type=str, required=True)
+    parser.add_argument("--index-name", type=str, default=None)
     parser.add_argument("--model-id", type=str, required=True)
     parser.add_argument("--context", type=str, default="very skilled")
-    parser.add_argument("--language", type=str, default="python")
+    parser.add_argument("--language", type=str, default=None)
+    parser.add_argument(
+        "--generation-mode",
+        type=str,
+        choices=list(OUTPUT_FILES),
+        default=os.environ.get("GENERATION_MODE", "script"),
+    )
     parser.add_argument("--max-tokens-to-sample", type=int, default=4000)
     parser.add_argument("--temperature", type=float, default=1.0)
     parser.add_argument("--top-p", type=float, default=1.0)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--no-cancel-when-checked", action="store_true")
+    parser.add_argument(
+        "--memory", type=str, choices=["window", "summary"], default=None
+    )
+    parser.add_argument("--memory-max-tokens", type=int, default=2000)
+    parser.add_argument("--cache-prefix", type=str, default="cache/")
+    parser.add_argument("--cache-ttl-days", type=float, default=30)
+    parser.add_argument("--cache-max-entries", type=int, default=10000)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.environ.get("MAX_CONCURRENCY", 4)),
+    )
+    parser.add_argument("--max-jobs", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=float, default=60)
+    parser.add_argument("--tokens-per-minute", type=float, default=200000)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--no-validation", action="store_true")
+    parser.add_argument("--dry-run-days", type=float, default=1.0)
+    parser.add_argument("--max-run-seconds", type=float, default=3600)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument(
+        "--batch-threshold",
+        type=int,
+        default=int(os.environ.get("BATCH_INFERENCE_THRESHOLD", 100)),
+    )
+    parser.add_argument(
+        "--batch-backend",
+        type=str,
+        choices=["bedrock", "local"],
+        default="bedrock",
+    )
+    parser.add_argument(
+        "--batch-role-arn",
+        type=str,
+        default=os.environ.get("BATCH_ROLE_ARN"),
+    )
+    parser.add_argument("--batch-prefix", type=str, default="batch/")
+    parser.add_argument("--batch-poll-seconds", type=float, default=60)
+    # Defaults to half the remaining build time, the other half is left to the machines and their scripts
+    parser.add_argument("--batch-timeout-hours", type=float, default=None)
+    parser.add_argument(
+        "--build-timeout-hours",
+        type=float,
+        default=float(os.environ.get("BUILD_TIMEOUT_HOURS", 2)),
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=int(os.environ.get("SHARD_INDEX", 0)),
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=int(os.environ.get("SHARD_COUNT", 1)),
+    )
+    parser.add_argument("--metrics-file", type=str, default=METRICS_FILE)
+    parser.add_argument(
+        "--metrics-namespace",
+        type=str,
+        default=os.environ.get("METRICS_NAMESPACE", "SyntheticDataGenerator"),
+    )
     args, _ = parser.parse_known_args()
 
     # Configure logging to output the line number and message
@@ -44,67 +130,284 @@ if __name__ == "__main__":
     column_name = args.column_name
     model_id = args.model_id
     context = args.context
-    language = args.language
+    language = args.language or (
+        "json" if args.generation_mode == "spec" else "python"
+    )
+    output_file = OUTPUT_FILES[args.generation_mode]
     model_kwargs = {
         "max_tokens_to_sample": args.max_tokens_to_sample,
         "temperature": args.temperature,
         "top_p": args.top_p,
     }
 
-    # Define the filter expression and expression attribute values
-    filter_expression = "#column_name = :column_value"
-    expression_attribute_names = {"#column_name": column_name}
-    expression_attribute_values = {":column_value": {"S": "yes"}}
-
-    # Scan the DynamoDB table with the specified filter
-    response = dynamodb.scan(
-        TableName=table_name,
-        FilterExpression=filter_expression,
-        ExpressionAttributeNames=expression_attribute_names,
-        ExpressionAttributeValues=expression_attribute_values,
+    # Record the time, tokens and bytes of every stage of the build
+    metrics = create_metrics(
+        path=args.metrics_file,
+        namespace=args.metrics_namespace,
+        process="main",
     )
 
-    # Retrieve all machines
-    item = response.get("Items", [])
-    if len(item) >= 1:
-        item = response.get("Items", [])[0]
-        user_id = item["user_id"]["S"]
-        machines = [x["S"] for x in item["machines"]["L"]]
-
-        # For each machine write the code and store it in a folder
-        app = DataGeneratorApp(
-            model_id=model_id,
-            streaming=False,
-            callbacks=[],
-            model_kwargs=model_kwargs,
-        )
-        for machine in machines:
-            try:
-                code = app.predict_code(
-                    context=context, question=machine, language=language
+    # Query all pending user requests from the sparse index
+    intake = JobIntake(
+        dynamodb_client=dynamodb,
+        table_name=table_name,
+        column_name=column_name,
+        index_name=args.index_name,
+    )
+    with metrics.span("pending_jobs") as span:
+        jobs = {job["prefix"]: job for job in intake.pending_jobs()}
+        span["rows"] = len(jobs)
+    print(f"Found {len(jobs)} pending requests")
+
+    # A shard of a sharded build only works on its own machines of every job
+    if args.shard_count > 1:
+        for prefix, job in jobs.items():
+            job["machines"] = [
+                machine
+                for machine in job["machines"]
+                if get_shard(
+                    f"{prefix}/{create_directory_string(machine)}",
+                    args.shard_count,
                 )
-                # directory = machine.lower().replace(" ", "-")
-                directory = create_directory_string(machine=machine)
-                app.write_parsed_code(code=code, dir=directory)
+                == args.shard_index
+            ]
+        print(f"Shard {args.shard_index + 1} of {args.shard_count}")
 
-                response = s3_client.upload_file(
-                    Filename=f"{directory}/main.py",
+    if jobs:
+        # Upload each machine's code or spec as soon as it is written and checkpoint it
+        def upload_code(machine: str, directory: str) -> None:
+            intake.set_checkpoint(directory, "code_generated")
+            with metrics.span("code_upload", machine=machine) as span:
+                span["bytes"] = os.path.getsize(f"{directory}/{output_file}")
+                s3_client.upload_file(
+                    Filename=f"{directory}/{output_file}",
                     Bucket=code_bucket,
-                    Key=f"{user_id}/{directory}/main.py",
+                    Key=f"{directory}/{output_file}",
                 )
-                print(f"{user_id}/{directory}/main.py", code_bucket)
-                print(response)
-            except Exception as e:
-                print(f"Error: {e}")
+            intake.set_checkpoint(directory, "code_uploaded")
+            print(f"{directory}/{output_file}", code_bucket)
+
+        # Restore the code an earlier build of the request uploaded
+        def restore_code(directory: str) -> bool:
+            os.makedirs(directory, exist_ok=True)
+            try:
+                s3_client.download_file(
+                    Bucket=code_bucket,
+                    Key=f"{directory}/{output_file}",
+                    Filename=f"{directory}/{output_file}",
+                )
+            except ClientError as e:
+                logger.warning(f"Regenerating {directory}: {e}")
+                return False
+            return True
+
+        # Reuse previously generated code stored under the code bucket
+        cache = None
+        if not args.no_cache:
+            cache = GenerationCache(
+                backend=S3CacheBackend(
+                    s3_client=s3_client,
+                    bucket=code_bucket,
+                    prefix=args.cache_prefix,
+                ),
+                ttl=args.cache_ttl_days * 24 * 60 * 60,
+                max_entries=args.cache_max_entries,
+            )
 
-        # Create a script that runs the code and moves data to S3
-        create_bash_script(
-            machines=machines, s3_bucket=data_bucket, user_id=user_id
+        # Rate limit and retry Bedrock requests of all machines in one place
+        # The shards of a build share the Bedrock quota of the account
+        scheduler = BedrockScheduler(
+            requests_per_minute=args.requests_per_minute / args.shard_count,
+            tokens_per_minute=args.tokens_per_minute / args.shard_count,
+            max_concurrency=args.max_concurrency,
+            max_retries=args.max_retries,
         )
 
-        # Update the user item and set the column_name (default: "active") to "no"
-        dynamodb = boto3.resource("dynamodb")
-        table = dynamodb.Table(table_name)
-        table.put_item(
-            Item={"user_id": user_id, "machines": machines, column_name: "no"}
+        # Generate the code for all machines of all requests in parallel
+        client = boto3.client(
+            "bedrock-runtime",
+            config=Config(retries={"total_max_attempts": 1}),
         )
+        metrics.instrument_bedrock(client)
+        engine = GenerationEngine(
+            app_factory=lambda: DataGeneratorApp(
+                model_id=model_id,
+                streaming=args.streaming,
+                callbacks=[],
+                model_kwargs=model_kwargs,
+                client=client,
+                memory=args.memory,
+                max_token_limit=args.memory_max_tokens,
+                cache=cache,
+                cancel_when_checked=not args.no_cancel_when_checked,
+                scheduler=scheduler,
+                generation_mode=args.generation_mode,
+                metrics=metrics,
+            ),
+            on_result=upload_code,
+            max_concurrency=args.max_concurrency,
+            # Dry-run every script before it is written and regenerate the ones that fail
+            validator=None
+            if args.no_validation
+            else ScriptValidator(
+                dry_run_days=args.dry_run_days,
+                max_seconds=args.max_run_seconds,
+            ),
+            max_attempts=args.max_attempts,
+        )
+
+        def get_prompt_kwargs(job: dict) -> dict:
+            return {
+                "context": context,
+                "language": language,
+                "interval": describe_duration(job["interval_seconds"]),
+                "span": describe_duration(job["span_days"] * 24 * 60 * 60),
+            }
+
+        def prepare_job(prefix: str) -> None:
+            job = jobs[prefix]
+            # The coordinator of a sharded build counts the build once for all shards
+            if args.shard_count == 1:
+                job["builds"] = intake.start_build(
+                    user_id=job["user_id"], job_id=job["job_id"]
+                )
+            # Skip the machines an earlier build of the job completed
+            job["pending"] = []
+            job["cache_keys"] = {}
+            for machine in job["machines"]:
+                directory = f"{prefix}/{create_directory_string(machine)}"
+                checkpoint = job["checkpoints"].get(directory)
+                if is_done(checkpoint, "data_uploaded"):
+                    continue
+                # The runner replaces the cached code of a machine with its repair
+                job["cache_keys"][directory] = engine.get_cache_key(
+                    machine, **get_prompt_kwargs(job)
+                )
+                if is_done(checkpoint, "code_uploaded") and restore_code(
+                    directory
+                ):
+                    continue
+                job["pending"].append(machine)
+            print(
+                f"{prefix}: build {job['builds']}, generating {len(job['pending'])} of {len(job['machines'])} machines"
+            )
+
+        def process_job(prefix: str, completions: dict) -> None:
+            job = jobs[prefix]
+            results = engine.generate(
+                machines=job["pending"],
+                output_dir=prefix,
+                time_axis={
+                    "interval_seconds": job["interval_seconds"],
+                    "span_days": job["span_days"],
+                },
+                completions=completions.get(prefix),
+                **get_prompt_kwargs(job),
+            )
+            for result in results:
+                print(
+                    f"{result['directory']}: {result['status']} in {result['latency']:.2f}s"
+                    f" after {result.get('attempts', 0)} attempt(s)"
+                )
+
+        with ThreadPoolExecutor(max_workers=args.max_jobs) as executor:
+            list(executor.map(prepare_job, jobs))
+
+        # Generate the first completion of every machine with a single batch inference job for large builds
+        requests = [
+            {"prefix": prefix, "question": machine}
+            for prefix, job in jobs.items()
+            for machine in job["pending"]
+        ]
+        completions = {}
+        # The threshold applies to the uncached records, fewer are generated on-demand
+        if args.memory is None and args.batch_threshold > 0 and requests:
+            # Resume the job of an earlier build CodeBuild stopped instead of paying for a new one
+            batch_prefixes = {request["prefix"] for request in requests}
+            job_arns = {
+                get_batch_job_arn(jobs[prefix], args.shard_index)
+                for prefix in batch_prefixes
+            } - {None}
+            job_arn = min(job_arns) if job_arns else None
+            submitted = []
+
+            def set_batch_job(job_arn: str) -> None:
+                if job_arn is not None:
+                    submitted.append(job_arn)
+                for prefix in batch_prefixes:
+                    intake.set_batch_job(
+                        user_id=jobs[prefix]["user_id"],
+                        job_id=jobs[prefix]["job_id"],
+                        job_arn=job_arn,
+                        shard_index=args.shard_index,
+                    )
+
+            if args.batch_backend == "local":
+                backend = LocalBatchBackend(
+                    runtime_client=client, model_id=model_id
+                )
+            else:
+                # CodeBuild stops the build after its timeout, counted from its start time in milliseconds
+                started = float(
+                    os.environ.get("CODEBUILD_START_TIME", time.time() * 1000)
+                )
+                remaining = (
+                    args.build_timeout_hours * 60 * 60
+                    - time.time()
+                    + started / 1000
+                )
+                timeout = remaining / 2
+                if args.batch_timeout_hours is not None:
+                    timeout = min(timeout, args.batch_timeout_hours * 60 * 60)
+                backend = BedrockBatchBackend(
+                    bedrock_client=boto3.client("bedrock"),
+                    s3_client=s3_client,
+                    bucket=code_bucket,
+                    role_arn=args.batch_role_arn,
+                    model_id=model_id,
+                    prefix=args.batch_prefix,
+                    poll_interval=args.batch_poll_seconds,
+                    timeout=timeout,
+                    job_arn=job_arn,
+                    on_submit=set_batch_job,
+                )
+            print(f"Requesting {len(requests)} machines in batch mode")
+            try:
+                with metrics.span("batch_inference", rows=len(requests)):
+                    outputs = engine.predict_batch(
+                        [
+                            {
+                                "question": request["question"],
+                                **get_prompt_kwargs(jobs[request["prefix"]]),
+                            }
+                            for request in requests
+                        ],
+                        backend=backend,
+                        min_records=1 if job_arn else args.batch_threshold,
+                    )
+            except Exception as e:
+                # Machines without a completion are requested on-demand
+                logger.error(f"Batch inference failed: {e}")
+                outputs = []
+            # The job was read, stopped or failed, the next build does not resume it
+            if job_arn or submitted:
+                set_batch_job(None)
+            for request, output in zip(requests, outputs):
+                if output is not None:
+                    completions.setdefault(request["prefix"], {})[
+                        request["question"]
+                    ] = output
+
+        with ThreadPoolExecutor(max_workers=args.max_jobs) as executor:
+            for future in [
+                executor.submit(process_job, prefix, completions)
+                for prefix in jobs
+            ]:
+                future.result()
+        engine.close()
+        print(f"Bedrock scheduler: {scheduler.metrics()}")
+        if cache is not None:
+            print(f"Generation cache: {cache.stats()}")
+
+        # Create a manifest the runner uses to execute the code and move data to S3
+        create_run_manifest(jobs=jobs, s3_bucket=data_bucket)
@@ -0,0 +1,284 @@
+import sys
+import json
+import time
+import argparse
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, TextIO
+
+# The JSON-lines file all processes of a build append to, which the buildspec summarizes and hands to the coordinator
+METRICS_FILE = "build_metrics.jsonl"
+# The CloudWatch units of the recorded values, values without a unit are properties of the event
+UNITS = {
+    "seconds": "Seconds",
+    "bytes": "Bytes",
+    "rows": "Count",
+    "input_tokens": "Count",
+    "output_tokens": "Count",
+}
+BEDROCK_HEADERS = {
+    "input_tokens": "x-amzn-bedrock-input-token-count",
+    "output_tokens": "x-amzn-bedrock-output-token-count",
+}
+
+
+class JsonLinesExporter:
+    """An exporter appending every event as one JSON line to a local file."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the JsonLinesExporter.
+
+        Args:
+            path (str): The file the events are appended to, shared by all processes of a build.
+        """
+        self.path = path
+
+    def export(self, event: Dict) -> None:
+        """Append an event to the file."""
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+
+class EmfExporter:
+    """
+    An exporter writing every event in the CloudWatch embedded metric format (EMF).
+
+    Only the stage is a dimension, the remaining strings of an event are written as properties to keep the number of
+    metrics low.
+    """
+
+    def __init__(
+        self, namespace: str = "SyntheticDataGenerator", stream: TextIO = None
+    ):
+        """
+        Initialize the EmfExporter.
+
+        Args:
+            namespace (str): The CloudWatch namespace of the metrics.
+            stream (TextIO): The stream the EMF documents are written to, stdout if None.
+        """
+        self.namespace = namespace
+        self.stream = stream
+
+    def export(self, event: Dict) -> None:
+        """Write an event as an EMF document."""
+        metrics = [
+            {"Name": name, "Unit": unit}
+            for name, unit in UNITS.items()
+            if name in event
+        ]
+        if not metrics:
+            return
+        document = {
+            "_aws": {
+                "Timestamp": int(event["timestamp"] * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["stage"]],
+                        "Metrics": metrics,
+                    }
+                ],
+            },
+            **event,
+        }
+        # Deliberately stdout: CodeBuild sends it to CloudWatch Logs, which extracts the metrics of EMF documents
+        print(json.dumps(document), file=self.stream or sys.stdout)
+
+
+class Metrics:
+    """
+    A lightweight, thread-safe recorder of the per-stage timings and counts of a build.
+
+    Stages are timed with `span`, counts without a duration are added with `record`. Every event is handed to the
+    exporters as soon as it is recorded and kept for the summary at the end of the build.
+    """
+
+    def __init__(self, exporters: List = None, **dimensions):
+        """
+        Initialize the Metrics.
+
+        Args:
+            exporters (List): The exporters of the events, the events are only kept in memory if None.
+            dimensions: Properties added to every event, e.g. the process of the build.
+        """
+        self.exporters = exporters or []
+        self.dimensions = dimensions
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, **values) -> Dict:
+        """
+        Record an event of a stage.
+
+        Args:
+            stage: The stage, e.g. "generation" or "data_upload".
+            values: The measurements and properties of the event, e.g. seconds, bytes, rows or tokens.
+
+        Returns:
+            Dict: The recorded event.
+        """
+        event = {
+            "timestamp": time.time(),
+            "stage": stage,
+            **self.dimensions,
+            **values,
+        }
+        with self._lock:
+            self.events.append(event)
+            for exporter in self.exporters:
+                exporter.export(event)
+        return event
+
+    @contextmanager
+    def span(self, stage: str, **values) -> Iterator[Dict]:
+        """
+        Time a stage and record it with its duration and status.
+
+        Measurements known only at the end of the stage are added to the yielded dict, e.g. `span["bytes"] = size`.
+
+        Args:
+            stage: The stage.
+            values: The properties of the event, e.g. the machine directory.
+
+        Returns:
+            Iterator[Dict]: The values of the event.
+        """
+        values = {**values, "status": "succeeded"}
+        start = time.perf_counter()
+        try:
+            yield values
+        except BaseException:
+            values["status"] = "failed"
+            raise
+        finally:
+            self.record(stage, seconds=time.perf_counter() - start, **values)
+
+    def instrument_bedrock(self, client) -> None:
+        """
+        Record the token counts of every `invoke_model` call of a bedrock-runtime client.
+
+        The counts are read from the response headers, so requests sent by LangChain with the same client are
+        recorded as well.
+
+        Args:
+            client: The bedrock-runtime client.
+        """
+
+        def on_response(parsed: Dict, model, **kwargs) -> None:
+            headers = parsed.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+            counts = {
+                name: int(headers[header])
+                for name, header in BEDROCK_HEADERS.items()
+                if header in headers
+            }
+            if "x-amzn-bedrock-invocation-latency" in headers:
+                counts["seconds"] = (
+                    int(headers["x-amzn-bedrock-invocation-latency"]) / 1000
+                )
+            if counts:
+                self.record("bedrock", operation=model.name, **counts)
+
+        client.meta.events.register(
+            "after-call.bedrock-runtime.InvokeModel", on_response
+        )
+
+
+def create_metrics(
+    path: str = None, namespace: str = None, **dimensions
+) -> Metrics:
+    """
+    Create the Metrics of a build process.
+
+    Args:
+        path: The JSON-lines file of the build, not written if None.
+        namespace: The CloudWatch namespace of the EMF documents written to stdout, not written if None.
+        dimensions: Properties added to every event, e.g. the process of the build.
+
+    Returns:
+        Metrics: The metrics.
+    """
+    exporters = []
+    if path:
+        exporters.append(JsonLinesExporter(path))
+    if namespace:
+        exporters.append(EmfExporter(namespace))
+    return Metrics(exporters=exporters, **dimensions)
+
+
+def summarize(events: List[Dict]) -> List[Dict]:
+    """
+    Aggregate events per stage.
+
+    Args:
+        events: The recorded events.
+
+    Returns:
+        List[Dict]: Per stage in order of first occurrence the number of events, the failed events, the total and
+        maximum seconds and the sums of all other measurements.
+    """
+    stages = {}
+    for event in events:
+        stage = stages.setdefault(
+            event["stage"],
+            {"stage": event["stage"], "count": 0, "failed": 0},
+        )
+        stage["count"] += 1
+        stage["failed"] += event.get("status") == "failed"
+        if "seconds" in event:
+            stage["seconds"] = stage.get("seconds", 0) + event["seconds"]
+            stage["max_seconds"] = max(
+                stage.get("max_seconds", 0), event["seconds"]
+            )
+        for name in UNITS:
+            if name != "seconds" and name in event:
+                stage[name] = stage.get(name, 0) + event[name]
+    return list(stages.values())
+
+
+def format_summary(summary: List[Dict]) -> str:
+    """
+    Format a summary as a fixed-width table.
+
+    Args:
+        summary: The per-stage summary of summarize.
+
+    Returns:
+        str: The table.
+    """
+    columns = ["stage", "count", "failed", "seconds", "max_seconds"] + [
+        name for name in UNITS if name != "seconds"
+    ]
+    rows = [
+        [
+            f"{stage[column]:.2f}"
+            if isinstance(stage.get(column), float)
+            else str(stage.get(column, ""))
+            for column in columns
+        ]
+        for stage in summary
+    ]
+    widths = [
+        max(len(cell) for cell in [column] + [row[i] for row in rows])
+        for i, column in enumerate(columns)
+    ]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths))
+        for row in [columns] + rows
+    )
+
+
+def load_events(path: str) -> List[Dict]:
+    """Load the events of a JSON-lines file."""
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    # Print the summary table of all processes of a build
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str, nargs="?", default=METRICS_FILE)
+    args = parser.parse_args()
+    print(format_summary(summarize(load_events(args.path))))
@@ -0,0 +1,148 @@
+import os
+import glob
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ["csv", "parquet"]
+
+
+def to_parquet(
+    df: pd.DataFrame,
+    directory: str,
+    partition: str = "month",
+    compression: str = "zstd",
+    part: int = 0,
+) -> List[str]:
+    """
+    Write a dataset as Parquet files partitioned by the month of its `Timestamp` column.
+
+    Float columns are stored as float32 and string columns are dictionary encoded. The partitions use the Hive
+    layout `<directory>/month=yyyy-MM/part-<part>.parquet`, which Amazon Athena and AWS Glue read as a partition column.
+
+    Args:
+        df: The dataset with a `Timestamp` column.
+        directory: The root directory of the partitions.
+        partition: The partition column name, the dataset is written as a single file if None.
+        compression: The Parquet compression codec.
+        part: The part number, to append a chunk of a dataset next to the previous parts of the same partition.
+
+    Returns:
+        List[str]: The written files.
+    """
+    df = df.copy()
+    for column in df.select_dtypes(include=[np.floating]).columns:
+        df[column] = df[column].astype(np.float32)
+    if "Timestamp" in df.columns:
+        try:
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        except (ValueError, TypeError):
+            logger.warning("Timestamp is not a datetime, writing one file")
+            partition = None
+
+    if partition is None or "Timestamp" not in df.columns:
+        groups = [(None, df)]
+    else:
+        # Integer month keys, formatting every timestamp is an order of magnitude slower
+        timestamps = df["Timestamp"].dt
+        groups = df.groupby(
+            timestamps.year * 100 + timestamps.month, sort=True
+        )
+
+    paths = []
+    for value, group in groups:
+        path = (
+            os.path.join(directory, f"part-{part}.parquet")
+            if value is None
+            else os.path.join(
+                directory,
+                f"{partition}={value // 100}-{value % 100:02d}",
+                f"part-{part}.parquet",
+            )
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        group.to_parquet(
+            path,
+            engine="pyarrow",
+            compression=compression,
+            index=False,
+            use_dictionary=True,
+        )
+        paths.append(path)
+    return paths
+
+
+def convert_csv(
+    path: str, delete: bool = True, chunk_rows: int = 100000, **kwargs
+) -> List[str]:
+    """
+    Convert a CSV file into a partitioned Parquet dataset next to it, e.g. `data.csv` into `data/`.
+
+    The file is read chunk by chunk, so the memory use is bounded by chunk_rows independent of the file size.
+
+    Args:
+        path: The CSV file.
+        delete: Flag indicating whether to delete the CSV file once converted.
+        chunk_rows: The maximum number of rows held in memory.
+        kwargs: Keyword arguments passed to to_parquet.
+
+    Returns:
+        List[str]: The written files.
+    """
+    paths = []
+    for part, chunk in enumerate(pd.read_csv(path, chunksize=chunk_rows)):
+        paths.extend(
+            to_parquet(
+                chunk, directory=os.path.splitext(path)[0], part=part, **kwargs
+            )
+        )
+    if delete:
+        os.remove(path)
+    return paths
+
+
+def convert_directory(directory: str, **kwargs) -> List[str]:
+    """
+    Convert all CSV files of a machine directory into partitioned Parquet datasets.
+
+    Args:
+        directory: The machine directory.
+        kwargs: Keyword arguments passed to convert_csv.
+
+    Returns:
+        List[str]: The written files.
+    """
+    paths = []
+    for path in sorted(
+        glob.glob(os.path.join(directory, "**", "*.csv"), recursive=True)
+    ):
+        logger.info(f"Converting {path} to Parquet")
+        paths.extend(convert_csv(path, **kwargs))
+    return paths
+
+
+def count_rows(path: str) -> int:
+    """
+    Count the data rows of a CSV or Parquet file without loading it.
+
+    Args:
+        path: The CSV file with a header row or the Parquet file.
+
+    Returns:
+        int: The number of rows.
+    """
+    if path.endswith(".parquet"):
+        return pq.ParquetFile(path).metadata.num_rows
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    # Without the header and with a missing newline at the end of the file
+    return max(lines - 1 + (last != b"\n"), 0)
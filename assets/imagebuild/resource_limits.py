@@ -0,0 +1,41 @@
+import os
+import sys
+import resource
+
+from typing import Dict, List
+
+LAUNCHER = os.path.realpath(__file__)
+
+
+def limit_command(command: List[str], limits: Dict[str, int]) -> List[str]:
+    """
+    Wrap a command so that it runs with resource limits.
+
+    A launcher process applies the limits and replaces itself with the command. Unlike a preexec_fn of subprocess,
+    this is safe in a process running threads.
+
+    Args:
+        command: The command.
+        limits: The soft and hard limit per resource, e.g. {"RLIMIT_AS": 1024**3}, limits set to None are left out.
+
+    Returns:
+        List[str]: The wrapped command, the command itself without limits.
+    """
+    arguments = [
+        f"{name}={value}"
+        for name, value in limits.items()
+        if value is not None
+    ]
+    if not arguments:
+        return command
+    return [sys.executable, LAUNCHER, *arguments, "--", *command]
+
+
+if __name__ == "__main__":
+    # Apply the limits and run the command in this process
+    separator = sys.argv.index("--")
+    for argument in sys.argv[1:separator]:
+        name, value = argument.split("=")
+        resource.setrlimit(getattr(resource, name), (int(value), int(value)))
+    command = sys.argv[separator + 1 :]
+    os.execvp(command[0], command)
@@ -0,0 +1,529 @@
+import os
+import sys
+import json
+import time
+import boto3
+import logging
+import argparse
+import subprocess
+
+from typing import Callable, Dict, List, Optional
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bedrock_scheduler import BedrockScheduler
+from data_generator_app import DataGeneratorApp
+from generation_cache import S3CacheBackend
+from job_intake import JobIntake
+from metrics import METRICS_FILE, Metrics, create_metrics
+from output_format import FORMATS, convert_directory, count_rows
+from resource_limits import limit_command
+from s3_uploader import MB, StreamingUploader
+from script_repairer import ScriptRepairer
+from script_validator import ScriptValidator
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_ENGINE = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "signal_engine.py"
+)
+
+
+def available_cores() -> int:
+    """Get the number of CPU cores available to this process."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class ScriptRunner:
+    """
+    A class executing the generated machine scripts in parallel and uploading their outputs to Amazon S3.
+
+    Every script runs in its own Python process with a timeout and an address space limit. The outputs of a script
+    are streamed to Amazon S3 while it is running and completed as soon as it finishes.
+    """
+
+    def __init__(
+        self,
+        uploader: StreamingUploader,
+        max_workers: int = None,
+        timeout: float = 3600,
+        memory_limit: int = None,
+        output_format: str = "csv",
+        chunk_memory: int = 512 * MB,
+        repairer: ScriptRepairer = None,
+        metrics: Metrics = None,
+        on_checkpoint: Callable[[str, str], None] = None,
+        cache: S3CacheBackend = None,
+        validator: ScriptValidator = None,
+    ):
+        """
+        Initialize the ScriptRunner.
+
+        Args:
+            uploader (StreamingUploader): The uploader streaming the outputs to the data bucket.
+            max_workers (int): The number of scripts executed in parallel, defaults to the available cores.
+            timeout (float): The timeout of a single script in seconds.
+            memory_limit (int): The address space limit of a single script in bytes, unlimited if None.
+            output_format (str): The format of the uploaded datasets, "csv" or partitioned "parquet".
+            chunk_memory (int): The memory budget in bytes of the chunks the signal engine generates at a time.
+            repairer (ScriptRepairer): Repairs failed scripts with Amazon Bedrock, failed scripts are final if None.
+            metrics (Metrics): Records the execution, repair, conversion and upload stages, kept in memory only if None.
+            on_checkpoint (Callable): Called with (directory, stage) once the data of a machine is generated and
+                uploaded, and with (directory, None) once its script failed for good, e.g. to record the checkpoint
+                of a resumable build.
+            cache (S3CacheBackend): The generation cache backend, which receives the repaired scripts once they ran
+                successfully and loses the scripts that failed for good, not updated if None.
+            validator (ScriptValidator): Validates repaired scripts like generated ones before they run, no validation
+                if None.
+        """
+        self.uploader = uploader
+        self.max_workers = max_workers or available_cores()
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.output_format = output_format
+        self.chunk_memory = chunk_memory
+        self.repairer = repairer
+        self.metrics = metrics or Metrics()
+        self.on_checkpoint = on_checkpoint or (lambda directory, stage: None)
+        self.cache = cache
+        self.validator = validator
+
+    def _command(
+        self, directory: str, time_axis: Dict = None
+    ) -> Optional[List[str]]:
+        """Get the command generating the data of a machine directory, None if there is nothing to execute."""
+        if os.path.exists(f"{directory}/spec.json"):
+            command = [
+                sys.executable,
+                SIGNAL_ENGINE,
+                "--spec",
+                "spec.json",
+                "--format",
+                self.output_format,
+                "--max-memory-mb",
+                str(self.chunk_memory // MB),
+            ]
+            for key, value in (time_axis or {}).items():
+                command += [f"--{key.replace('_', '-')}", str(value)]
+            return command
+        if os.path.exists(f"{directory}/main.py"):
+            return [sys.executable, "main.py"]
+        return None
+
+    def _update_cache(self, key: str, code: Optional[str]) -> None:
+        """Store the script of a cache key, or delete it if None, without failing the machine."""
+        if self.cache is None or key is None:
+            return
+        try:
+            if code is None:
+                self.cache.delete(key)
+            else:
+                self.cache.put(key, code)
+        except Exception as e:
+            logger.warning(f"Could not update the cached script {key}: {e}")
+
+    def _execute(
+        self, directory: str, command: List[str], result: Dict
+    ) -> Dict:
+        """
+        Run the command of a machine directory and stream its outputs to Amazon S3 while it is running.
+
+        Args:
+            directory: The machine directory.
+            command: The command generating the data.
+            result: The summary, updated with exit code, timeout and duration.
+
+        Returns:
+            Dict: The upload state of the outputs.
+        """
+        logger.info(f"Starting {directory}")
+        result.update({"exit_code": None, "timed_out": False})
+        start = time.perf_counter()
+        with open(f"{directory}/run.log", "w") as stdout, open(
+            f"{directory}/error.log", "w"
+        ) as stderr:
+            process = subprocess.Popen(
+                limit_command(command, {"RLIMIT_AS": self.memory_limit}),
+                cwd=directory,
+                stdout=stdout,
+                stderr=stderr,
+            )
+
+            def is_running() -> bool:
+                if process.poll() is not None:
+                    return False
+                if time.perf_counter() - start > self.timeout:
+                    process.kill()
+                    process.wait()
+                    result["timed_out"] = True
+                    return False
+                return True
+
+            uploads = self.uploader.watch(
+                directory=directory,
+                key_prefix=f"{directory}/",
+                is_running=is_running,
+            )
+        duration = time.perf_counter() - start
+        result["duration"] = result.get("duration", 0) + duration
+        if not result["timed_out"]:
+            result["exit_code"] = process.returncode
+        self.metrics.record(
+            "execution",
+            seconds=duration,
+            directory=directory,
+            attempt=result.get("attempts", 1),
+            status="succeeded" if result["exit_code"] == 0 else "failed",
+        )
+        return uploads
+
+    def _repair(
+        self,
+        directory: str,
+        command: List[str],
+        result: Dict,
+        attempt: int,
+        time_axis: Dict = None,
+    ) -> bool:
+        """
+        Replace the failed main.py of a machine directory with a repaired version.
+
+        A repair failing the validation is repaired again with the validation error, within the repair budget.
+
+        Args:
+            directory: The machine directory.
+            command: The failed command, only LLM-written scripts are repaired.
+            result: The summary with the error of the failed attempt.
+            attempt: The number of the failed attempt.
+            time_axis: The interval_seconds and span_days the validation extrapolates to.
+
+        Returns:
+            bool: Whether the script was repaired and should run again.
+        """
+        if self.repairer is None or command[-1] != "main.py":
+            return False
+        with open(f"{directory}/main.py", "r") as f:
+            code = f.read()
+        with self.metrics.span("repair", directory=directory) as span:
+            repair = self.repairer.repair(
+                directory=directory, code=code, error=result["error"]
+            )
+            while repair is not None and self.validator is not None:
+                report = self.validator.validate(repair, **(time_axis or {}))
+                result.setdefault("validation", []).append(report)
+                if report["status"] == "passed":
+                    break
+                logger.warning(
+                    f"Repair of {directory} failed the validation: {report['error']}"
+                )
+                repair = self.repairer.repair(
+                    directory=directory, code=repair, error=report["error"]
+                )
+            if repair is None:
+                span["status"] = "skipped"
+        result["repairs"] = self.repairer.usage(directory)
+        if repair is None:
+            return False
+        logger.warning(f"Repaired {directory} after attempt {attempt}")
+        # Remove the partial outputs of the failed attempt
+        for dirname, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith((".csv", ".parquet")):
+                    os.remove(os.path.join(dirname, filename))
+        with open(f"{directory}/main.py", "w") as f:
+            f.write(repair)
+        return True
+
+    def run_script(
+        self, directory: str, time_axis: Dict = None, cache_key: str = None
+    ) -> Dict:
+        """
+        Execute the main.py or the spec.json of a machine directory and stream its outputs to Amazon S3.
+
+        A spec.json is executed by the vectorized signal engine instead of an LLM-written script.
+
+        Args:
+            directory: The machine directory, `<user_id>/<job_id>/<machine>`, which is also the Amazon S3 key prefix.
+            time_axis: The interval_seconds and span_days of the request, passed on to the signal engine.
+            cache_key: The generation cache key of the script, replaced by a successful repair and deleted on failure.
+
+        Returns:
+            Dict: The summary with exit code, duration, repairs and uploaded keys.
+        """
+        result = {
+            "directory": directory,
+            "exit_code": None,
+            "timed_out": False,
+        }
+        command = self._command(directory, time_axis=time_axis)
+        if command is None:
+            result["status"] = "skipped"
+            return result
+
+        attempt = 1
+        while True:
+            result["attempts"] = attempt
+            uploads = self._execute(directory, command, result)
+            if result["exit_code"] == 0:
+                result.pop("error", None)
+                if attempt > 1:
+                    # Later builds reuse the repaired script once it ran successfully
+                    with open(f"{directory}/main.py", "r") as f:
+                        self._update_cache(cache_key, f.read())
+                break
+            self.uploader.abort(uploads)
+            result["status"] = "failed"
+            if result["timed_out"]:
+                result["error"] = f"Timed out after {self.timeout:.0f}s"
+            else:
+                with open(f"{directory}/error.log", "r") as f:
+                    result["error"] = f.read()[-2000:]
+            if not self._repair(
+                directory, command, result, attempt, time_axis=time_axis
+            ):
+                # The next build generates the code of the machine again instead of reading it from the cache
+                self._update_cache(cache_key, None)
+                self.on_checkpoint(directory, None)
+                return result
+            attempt += 1
+        self.on_checkpoint(directory, "data_generated")
+
+        if self.output_format == "parquet":
+            # Convert the CSV files of LLM-written scripts and pick up the Parquet files
+            start = time.perf_counter()
+            with self.metrics.span("conversion", directory=directory):
+                convert_directory(directory)
+            uploads = self.uploader.watch(
+                directory=directory,
+                key_prefix=f"{directory}/",
+                is_running=lambda: False,
+                uploads=uploads,
+            )
+            result["convert_duration"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with self.metrics.span("data_upload", directory=directory) as span:
+            outputs = [path for path in uploads if os.path.exists(path)]
+            span["bytes"] = sum(os.path.getsize(path) for path in outputs)
+            span["rows"] = sum(count_rows(path) for path in outputs)
+            result["uploaded"] = self.uploader.complete(uploads)
+        result["upload_duration"] = time.perf_counter() - start
+        result["status"] = "succeeded"
+        self.on_checkpoint(directory, "data_uploaded")
+        return result
+
+    def run(
+        self,
+        directories: List[str],
+        time_axis: Dict[str, Dict] = None,
+        cache_keys: Dict[str, str] = None,
+    ) -> List[Dict]:
+        """
+        Execute all machine scripts with at most max_workers in parallel.
+
+        Args:
+            directories: The list of machine directories.
+            time_axis: The time axis per machine directory.
+            cache_keys: The generation cache key per machine directory.
+
+        Returns:
+            List[Dict]: The per-machine summaries in order of completion.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.run_script,
+                    directory,
+                    (time_axis or {}).get(directory),
+                    (cache_keys or {}).get(directory),
+                ): directory
+                for directory in directories
+            }
+            for future in as_completed(futures):
+                # An unexpected error fails its machine, not the summaries of the others
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.exception(f"{futures[future]}: {e}")
+                    result = {
+                        "directory": futures[future],
+                        "status": "failed",
+                        "exit_code": None,
+                        "error": str(e),
+                    }
+                logger.info(
+                    f"{result['directory']}: {result['status']} (exit code {result['exit_code']})"
+                )
+                results.append(result)
+        return results
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default=os.environ.get("LOGLEVEL", "INFO").upper(),
+    )
+    parser.add_argument("--manifest", type=str, default="run_manifest.json")
+    parser.add_argument("--summary", type=str, default="run_summary.json")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument("--memory-limit-mb", type=int, default=None)
+    parser.add_argument("--chunk-memory-mb", type=int, default=512)
+    parser.add_argument("--part-size-mb", type=int, default=16)
+    parser.add_argument("--max-upload-concurrency", type=int, default=10)
+    parser.add_argument("--delete-after-upload", action="store_true")
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        choices=FORMATS,
+        default=os.environ.get("OUTPUT_FORMAT", "csv"),
+    )
+    parser.add_argument("--repair-attempts", type=int, default=2)
+    parser.add_argument("--repair-max-tokens", type=int, default=16000)
+    parser.add_argument("--no-validation", action="store_true")
+    parser.add_argument("--dry-run-days", type=float, default=1.0)
+    parser.add_argument("--max-run-seconds", type=float, default=3600)
+    parser.add_argument("--model-id", type=str, default=None)
+    parser.add_argument("--max-tokens-to-sample", type=int, default=4000)
+    parser.add_argument("--requests-per-minute", type=float, default=60)
+    parser.add_argument("--tokens-per-minute", type=float, default=200000)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--metrics-file", type=str, default=METRICS_FILE)
+    parser.add_argument(
+        "--metrics-namespace",
+        type=str,
+        default=os.environ.get("METRICS_NAMESPACE", "SyntheticDataGenerator"),
+    )
+    parser.add_argument("--table-name", type=str, default=None)
+    parser.add_argument("--column-name", type=str, default="active")
+    parser.add_argument("--max-builds", type=int, default=3)
+    parser.add_argument("--code-bucket", type=str, default=None)
+    parser.add_argument("--cache-prefix", type=str, default="cache/")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=int(os.environ.get("SHARD_COUNT", 1)),
+    )
+    args, _ = parser.parse_known_args()
+
+    # Configure logging to output the line number and message
+    log_format = "%(levelname)s: [%(filename)s:%(lineno)s] %(message)s"
+    logging.basicConfig(format=log_format, level=args.log_level)
+
+    with open(args.manifest, "r") as f:
+        manifest = json.load(f)
+
+    uploader = StreamingUploader(
+        s3_client=boto3.client("s3"),
+        bucket=manifest["data_bucket"],
+        part_size=args.part_size_mb * MB,
+        max_concurrency=args.max_upload_concurrency,
+        include="*.parquet" if args.output_format == "parquet" else "*.csv",
+        delete_after_upload=args.delete_after_upload,
+    )
+    # Record the time, bytes and rows of every stage of the build
+    metrics = create_metrics(
+        path=args.metrics_file,
+        namespace=args.metrics_namespace,
+        process="runner",
+    )
+
+    # Repair failed LLM-written scripts with Amazon Bedrock, disabled without a model
+    repairer = None
+    if args.model_id and args.repair_attempts > 0:
+        # The shards of a build share the Bedrock quota of the account
+        scheduler = BedrockScheduler(
+            requests_per_minute=args.requests_per_minute / args.shard_count,
+            tokens_per_minute=args.tokens_per_minute / args.shard_count,
+            max_retries=args.max_retries,
+        )
+        client = boto3.client(
+            "bedrock-runtime",
+            config=Config(retries={"total_max_attempts": 1}),
+        )
+        metrics.instrument_bedrock(client)
+        repairer = ScriptRepairer(
+            app_factory=lambda: DataGeneratorApp(
+                model_id=args.model_id,
+                streaming=False,
+                callbacks=[],
+                model_kwargs={
+                    "max_tokens_to_sample": args.max_tokens_to_sample,
+                    "temperature": 0.0,
+                },
+                verbose=False,
+                client=client,
+                scheduler=scheduler,
+                metrics=metrics,
+            ),
+            max_attempts=args.repair_attempts,
+            max_tokens=args.repair_max_tokens,
+        )
+
+    # Checkpoint every machine in the history table, so a failed build resumes with the remaining machines
+    intake = None
+    if args.table_name:
+        intake = JobIntake(
+            dynamodb_client=boto3.client("dynamodb"),
+            table_name=args.table_name,
+            column_name=args.column_name,
+        )
+
+    def set_checkpoint(directory: str, stage: str) -> None:
+        if intake is not None:
+            intake.set_checkpoint(directory, stage)
+
+    # Replace the cached scripts main.py generated with their repairs
+    cache = None
+    if args.code_bucket and not args.no_cache:
+        cache = S3CacheBackend(
+            s3_client=boto3.client("s3"),
+            bucket=args.code_bucket,
+            prefix=args.cache_prefix,
+        )
+
+    runner = ScriptRunner(
+        uploader=uploader,
+        max_workers=args.max_workers,
+        timeout=args.timeout,
+        memory_limit=args.memory_limit_mb * MB
+        if args.memory_limit_mb
+        else None,
+        output_format=args.output_format,
+        chunk_memory=args.chunk_memory_mb * MB,
+        repairer=repairer,
+        metrics=metrics,
+        on_checkpoint=set_checkpoint,
+        cache=cache,
+        # Repairs pass the same checks as the generated scripts
+        validator=None
+        if args.no_validation
+        else ScriptValidator(
+            dry_run_days=args.dry_run_days,
+            max_seconds=args.max_run_seconds,
+        ),
+    )
+    results = runner.run(
+        directories=manifest["directories"],
+        time_axis=manifest.get("time_axis"),
+        cache_keys=manifest.get("cache_keys"),
+    )
+
+    with open(args.summary, "w") as f:
+        json.dump(results, f, indent=4)
+
+    # Remove a job from the pending jobs once all of its machines succeeded or it ran out of builds,
+    # the coordinator of a sharded build does so once all shards are done
+    if intake is not None and args.shard_count == 1:
+        intake.finish_build(
+            jobs=manifest.get("jobs", {}),
+            results=results,
+            max_builds=args.max_builds,
+        )
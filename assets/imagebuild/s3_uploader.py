@@ -0,0 +1,241 @@
+import os
+import time
+import fnmatch
+import logging
+
+from typing import Callable, Dict, List
+from boto3.s3.transfer import TransferConfig
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# The trailing bytes of the uploaded parts compared with the file before a part is appended
+TAIL_SIZE = 4096
+
+
+class StreamingUploader:
+    """
+    A class streaming the files of a machine directory to Amazon S3 while they are written.
+
+    Files that grow beyond one part are uploaded part by part with a multipart upload while the script is still
+    running. Smaller files are uploaded with a managed transfer once the script has finished.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        part_size: int = 16 * MB,
+        max_concurrency: int = 10,
+        include: str = "*.csv",
+        poll_interval: float = 1.0,
+        delete_after_upload: bool = False,
+    ):
+        """
+        Initialize the StreamingUploader.
+
+        Args:
+            s3_client: The shared boto3 S3 client.
+            bucket (str): The Amazon S3 bucket data will be sent to.
+            part_size (int): The multipart part size in bytes, at least 5 MB.
+            max_concurrency (int): The number of threads of a managed transfer.
+            include (str): The glob pattern of the files that are uploaded.
+            poll_interval (float): The seconds between two directory scans.
+            delete_after_upload (bool): Flag indicating whether to delete local files once uploaded.
+        """
+        if part_size < 5 * MB:
+            raise ValueError("part_size must be at least 5 MB")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.part_size = part_size
+        self.include = include
+        self.poll_interval = poll_interval
+        self.delete_after_upload = delete_after_upload
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+        )
+
+    def _scan(self, directory: str, key_prefix: str, uploads: Dict) -> None:
+        """Register new files and upload all complete parts of growing files."""
+        for dirname, _, files in os.walk(directory):
+            for filename in fnmatch.filter(files, self.include):
+                path = os.path.join(dirname, filename)
+                if path not in uploads:
+                    uploads[path] = {
+                        "key": f"{key_prefix}{os.path.relpath(path, directory)}",
+                        "upload_id": None,
+                        "parts": [],
+                        "offset": 0,
+                        "inode": None,
+                        "tail": b"",
+                        "restart": False,
+                    }
+                self._upload_parts(path, uploads[path], final=False)
+
+    def _is_rewritten(self, path: str, upload: Dict) -> bool:
+        """
+        Check whether the uploaded bytes of a file no longer match it.
+
+        A file that was removed, replaced or truncated and written again, even past the uploaded offset, must not be
+        continued with more parts.
+
+        Args:
+            path: The local file path.
+            upload: The upload state of the file.
+
+        Returns:
+            bool: Whether the file changed before the uploaded offset.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return True
+        if stat.st_size < upload["offset"]:
+            return True
+        if upload["upload_id"] is None:
+            return False
+        if stat.st_ino != upload["inode"]:
+            return True
+        with open(path, "rb") as f:
+            f.seek(upload["offset"] - len(upload["tail"]))
+            return f.read(len(upload["tail"])) != upload["tail"]
+
+    def _upload_parts(self, path: str, upload: Dict, final: bool) -> None:
+        """
+        Upload the parts of a file that are available.
+
+        Args:
+            path: The local file path.
+            upload: The upload state of the file.
+            final: Flag indicating whether the file is complete and the remainder is the last part.
+        """
+        if upload["restart"]:
+            return
+        if self._is_rewritten(path, upload):
+            # The file was rewritten or removed, start over with a single upload at the end
+            self._abort(upload)
+            upload["restart"] = True
+            return
+        size = os.path.getsize(path) if os.path.exists(path) else -1
+        if upload["upload_id"] is None and (final or size < self.part_size):
+            return
+
+        with open(path, "rb") as f:
+            f.seek(upload["offset"])
+            while size - upload["offset"] >= self.part_size or (
+                final and size > upload["offset"]
+            ):
+                body = f.read(self.part_size)
+                if upload["upload_id"] is None:
+                    upload["inode"] = os.fstat(f.fileno()).st_ino
+                    upload[
+                        "upload_id"
+                    ] = self.s3_client.create_multipart_upload(
+                        Bucket=self.bucket, Key=upload["key"]
+                    )[
+                        "UploadId"
+                    ]
+                part_number = len(upload["parts"]) + 1
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket,
+                    Key=upload["key"],
+                    UploadId=upload["upload_id"],
+                    PartNumber=part_number,
+                    Body=body,
+                )
+                upload["parts"].append(
+                    {"ETag": response["ETag"], "PartNumber": part_number}
+                )
+                upload["offset"] += len(body)
+                upload["tail"] = body[-TAIL_SIZE:]
+
+    def _abort(self, upload: Dict) -> None:
+        """Abort a started multipart upload."""
+        if upload["upload_id"] is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=upload["key"],
+                UploadId=upload["upload_id"],
+            )
+        upload.update(
+            {
+                "upload_id": None,
+                "parts": [],
+                "offset": 0,
+                "inode": None,
+                "tail": b"",
+            }
+        )
+
+    def watch(
+        self,
+        directory: str,
+        key_prefix: str,
+        is_running: Callable[[], bool],
+        uploads: Dict = None,
+    ) -> Dict:
+        """
+        Stream the files of a directory while the script writing them is running.
+
+        Args:
+            directory: The machine directory.
+            key_prefix: The Amazon S3 key prefix, e.g. `<user_id>/<job_id>/<machine>/`.
+            is_running: Returns False once the script has finished.
+            uploads: The upload state of a previous watch to continue, e.g. after post-processing the outputs.
+
+        Returns:
+            Dict: The upload state per file, to be passed to complete or abort.
+        """
+        uploads = {} if uploads is None else uploads
+        while is_running():
+            self._scan(directory, key_prefix, uploads)
+            time.sleep(self.poll_interval)
+        self._scan(directory, key_prefix, uploads)
+        return uploads
+
+    def complete(self, uploads: Dict) -> List[str]:
+        """
+        Upload the remainder of all files and complete their uploads.
+
+        Args:
+            uploads: The upload state returned by watch.
+
+        Returns:
+            List[str]: The uploaded Amazon S3 keys.
+        """
+        keys = []
+        for path, upload in sorted(uploads.items()):
+            if not os.path.exists(path):
+                self._abort(upload)
+                continue
+            self._upload_parts(path, upload, final=True)
+            if upload["upload_id"] is not None:
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=upload["key"],
+                    UploadId=upload["upload_id"],
+                    MultipartUpload={"Parts": upload["parts"]},
+                )
+            else:
+                self.s3_client.upload_file(
+                    Filename=path,
+                    Bucket=self.bucket,
+                    Key=upload["key"],
+                    Config=self.transfer_config,
+                )
+            keys.append(upload["key"])
+            if self.delete_after_upload:
+                os.remove(path)
+        return keys
+
+    def abort(self, uploads: Dict) -> None:
+        """
+        Abort all started multipart uploads, e.g. when the script failed.
+
+        Args:
+            uploads: The upload state returned by watch.
+        """
+        for upload in uploads.values():
+            self._abort(upload)
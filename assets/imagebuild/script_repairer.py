@@ -0,0 +1,96 @@
+import logging
+import threading
+
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ScriptRepairer:
+    """
+    A class repairing failed machine scripts with Amazon Bedrock within a per-machine budget.
+
+    Every repair sends only the failed script and the tail of its traceback. A machine is repaired at most
+    max_attempts times and until its estimated tokens exceed max_tokens. Repairs run in the runner's worker threads,
+    so the scripts of other machines keep running while a repair is in flight.
+    """
+
+    def __init__(
+        self,
+        app_factory: Callable,
+        language: str = "python",
+        max_attempts: int = 2,
+        max_tokens: int = 16000,
+        max_error_lines: int = 20,
+    ):
+        """
+        Initialize the ScriptRepairer.
+
+        Args:
+            app_factory (Callable): Returns a new DataGeneratorApp for a worker thread.
+            language (str): The programming language of the scripts.
+            max_attempts (int): The maximum number of repairs of a machine.
+            max_tokens (int): The token budget of the repairs of a machine.
+            max_error_lines (int): The number of traceback lines sent to the model.
+        """
+        self.app_factory = app_factory
+        self.language = language
+        self.max_attempts = max_attempts
+        self.max_tokens = max_tokens
+        self.max_error_lines = max_error_lines
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._usage = {}
+
+    def _get_app(self):
+        """Get the DataGeneratorApp of the current worker thread."""
+        if not hasattr(self._local, "app"):
+            self._local.app = self.app_factory()
+        return self._local.app
+
+    def usage(self, directory: str) -> Dict:
+        """Get the repair attempts and tokens spent on a machine directory."""
+        with self._lock:
+            return dict(
+                self._usage.get(directory, {"attempts": 0, "tokens": 0})
+            )
+
+    def repair(self, directory: str, code: str, error: str) -> Optional[str]:
+        """
+        Repair the failed script of a machine directory.
+
+        Args:
+            directory: The machine directory.
+            code: The failed script.
+            error: The error output of the failed run.
+
+        Returns:
+            Optional[str]: The repaired script, None if the budget is spent or the repair failed.
+        """
+        error = "\n".join(error.strip().splitlines()[-self.max_error_lines :])
+        with self._lock:
+            usage = self._usage.setdefault(
+                directory, {"attempts": 0, "tokens": 0}
+            )
+            # The response is about as long as the script
+            estimated_tokens = (len(code) * 2 + len(error)) // 4
+            if (
+                usage["attempts"] >= self.max_attempts
+                or usage["tokens"] + estimated_tokens > self.max_tokens
+            ):
+                logger.info(f"Repair budget of {directory} is spent")
+                return None
+            usage["attempts"] += 1
+
+        try:
+            repair = self._get_app().repair_code(
+                code=code, error=error, language=self.language
+            )
+        except Exception as e:
+            logger.error(f"Repair of {directory} failed: {e}")
+            with self._lock:
+                usage["tokens"] += estimated_tokens
+            return None
+        with self._lock:
+            usage["tokens"] += repair["tokens"]
+        return repair["code"]
@@ -0,0 +1,333 @@
+import os
+import ast
+import sys
+import time
+import logging
+import tempfile
+import subprocess
+
+from typing import Dict, List
+
+from resource_limits import limit_command
+from s3_uploader import MB
+
+logger = logging.getLogger(__name__)
+
+# The modules a data generation script may import: numerics, dates, files and the packages of the build environment
+ALLOWED_IMPORTS = {
+    "__future__",
+    "argparse",
+    "bisect",
+    "calendar",
+    "cmath",
+    "collections",
+    "copy",
+    "csv",
+    "dataclasses",
+    "datetime",
+    "decimal",
+    "enum",
+    "fractions",
+    "functools",
+    "gzip",
+    "heapq",
+    "io",
+    "itertools",
+    "json",
+    "logging",
+    "math",
+    "numpy",
+    "operator",
+    "os",
+    "pandas",
+    "pathlib",
+    "pyarrow",
+    "random",
+    "re",
+    "statistics",
+    "string",
+    "sys",
+    "time",
+    "typing",
+    "uuid",
+    "warnings",
+    "zoneinfo",
+}
+# Calls that run commands or code, e.g. through the allowed `os` module
+DENIED_CALLS = {
+    "__import__",
+    "compile",
+    "eval",
+    "exec",
+    "os.fork",
+    "os.forkpty",
+    "os.kill",
+    "os.killpg",
+    "os.popen",
+    "os.system",
+}
+DENIED_CALL_PREFIXES = ("os.exec", "os.spawn", "os.posix_spawn")
+OUTPUT_EXTENSIONS = (".csv", ".parquet")
+# Runs main.py and records the CPU time of the process, independent of other dry runs running in parallel
+MEASURE = """
+import atexit, resource, runpy
+
+def record():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    with open(".cpu_seconds", "w") as f:
+        f.write(str(usage.ru_utime + usage.ru_stime))
+
+atexit.register(record)
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+
+class ScriptValidator:
+    """
+    A class validating generated scripts before they are written and executed in full.
+
+    A script is compiled with `ast`, its imports are checked against an allowlist, calls that run commands or code are
+    rejected and it is dry-run in a temporary
+    directory with a scaled-down span under CPU, memory and file size limits. The full-run time is extrapolated from
+    the CPU time the dry run spends beyond its imports, the output size from the size of its outputs.
+
+    Scripts read the span from the `SPAN_DAYS` environment variable, see the prompt of DataGeneratorApp.
+    """
+
+    def __init__(
+        self,
+        allowed_imports: set = ALLOWED_IMPORTS,
+        dry_run_days: float = 1.0,
+        timeout: float = 120,
+        memory_limit: int = 2048 * MB,
+        max_file_size: int = 1024 * MB,
+        max_seconds: float = 3600,
+        max_bytes: int = None,
+    ):
+        """
+        Initialize the ScriptValidator.
+
+        Args:
+            allowed_imports (set): The top-level modules a script may import.
+            dry_run_days (float): The span of the dry run in days.
+            timeout (float): The wall clock and CPU time limit of the dry run in seconds.
+            memory_limit (int): The data segment limit of the dry run in bytes.
+            max_file_size (int): The size limit of a file written by the dry run in bytes.
+            max_seconds (float): The maximum extrapolated duration of the full run in seconds.
+            max_bytes (int): The maximum extrapolated output size of the full run in bytes, unlimited if None.
+        """
+        self.allowed_imports = allowed_imports
+        self.dry_run_days = dry_run_days
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_file_size = max_file_size
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+
+    def _limits(self) -> Dict[str, int]:
+        """Get the CPU, memory and file size limits of the dry run."""
+        return {
+            "RLIMIT_CPU": int(self.timeout) + 1,
+            "RLIMIT_DATA": self.memory_limit,
+            "RLIMIT_FSIZE": self.max_file_size,
+        }
+
+    def check_imports(self, tree: ast.Module) -> List[str]:
+        """
+        Get the imports of a script that are not allowed.
+
+        Args:
+            tree: The parsed script.
+
+        Returns:
+            List[str]: The disallowed modules.
+        """
+        denied = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                modules = [node.module or "."] if node.level == 0 else ["."]
+            else:
+                continue
+            for module in modules:
+                if module.split(".")[0] not in self.allowed_imports:
+                    denied.append(module)
+        return denied
+
+    def check_calls(self, tree: ast.Module) -> List[str]:
+        """
+        Get the calls of a script that run commands or code, resolving import aliases like `from os import system`.
+
+        Args:
+            tree: The parsed script.
+
+        Returns:
+            List[str]: The denied calls by their qualified name, e.g. `os.system`.
+        """
+        aliases = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    aliases[alias.asname or alias.name] = alias.name
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                for alias in node.names:
+                    aliases[
+                        alias.asname or alias.name
+                    ] = f"{node.module}.{alias.name}"
+
+        def qualified_name(node: ast.AST) -> str:
+            if isinstance(node, ast.Name):
+                return aliases.get(node.id, node.id)
+            if isinstance(node, ast.Attribute):
+                return f"{qualified_name(node.value)}.{node.attr}"
+            return ""
+
+        denied = []
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call):
+                continue
+            name = qualified_name(node.func)
+            # getattr(os, "system") is the same call
+            if (
+                name == "getattr"
+                and len(node.args) > 1
+                and isinstance(node.args[1], ast.Constant)
+            ):
+                name = f"{qualified_name(node.args[0])}.{node.args[1].value}"
+            if name in DENIED_CALLS or name.startswith(DENIED_CALL_PREFIXES):
+                denied.append(name)
+        return denied
+
+    def _run(self, code: str, span_days: float = None) -> Dict:
+        """Run code in an empty temporary directory without credentials and measure it."""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "main.py"), "w") as f:
+                f.write(code)
+            env = {"PATH": os.environ.get("PATH", ""), "HOME": directory}
+            if span_days is not None:
+                env["SPAN_DAYS"] = str(span_days)
+            start = time.perf_counter()
+            try:
+                # The limits are applied by a launcher, validations run in the threads of the generation engine
+                process = subprocess.run(
+                    limit_command(
+                        [sys.executable, "-c", MEASURE], self._limits()
+                    ),
+                    cwd=directory,
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                return {"exit_code": None, "error": "Dry run timed out"}
+            outputs = [
+                os.path.join(dirname, filename)
+                for dirname, _, files in os.walk(directory)
+                for filename in files
+                if filename.endswith(OUTPUT_EXTENSIONS)
+            ]
+            result = {
+                "exit_code": process.returncode,
+                "seconds": time.perf_counter() - start,
+                "cpu_seconds": 0.0,
+                "bytes": sum(os.path.getsize(path) for path in outputs),
+                "outputs": [
+                    os.path.relpath(path, directory) for path in outputs
+                ],
+                "error": process.stderr[-2000:]
+                if process.returncode
+                else None,
+            }
+            if os.path.exists(os.path.join(directory, ".cpu_seconds")):
+                with open(os.path.join(directory, ".cpu_seconds"), "r") as f:
+                    result["cpu_seconds"] = float(f.read())
+            csv_files = [path for path in outputs if path.endswith(".csv")]
+            if csv_files:
+                with open(csv_files[0], "r") as f:
+                    result["header"] = f.readline().strip()
+                    result["rows"] = sum(1 for _ in f)
+        return result
+
+    def validate(
+        self, code: str, interval_seconds: float = 60, span_days: float = 365
+    ) -> Dict:
+        """
+        Validate a generated script and extrapolate its full run.
+
+        Args:
+            code: The generated script.
+            interval_seconds: The sampling interval of the request.
+            span_days: The span of the request in days.
+
+        Returns:
+            Dict: The report with `status` ("passed" or "failed"), `error` and the dry run measurements.
+        """
+        report = {"status": "failed", "dry_run_days": self.dry_run_days}
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            report["error"] = f"SyntaxError: {e}"
+            return report
+        denied = self.check_imports(tree)
+        if denied:
+            report["error"] = f"Imports not allowed: {', '.join(denied)}"
+            return report
+        denied = self.check_calls(tree)
+        if denied:
+            report["error"] = f"Calls not allowed: {', '.join(denied)}"
+            return report
+
+        # The imports alone, their time is not extrapolated with the span
+        imports = ast.Module(
+            body=[
+                node
+                for node in tree.body
+                if isinstance(node, (ast.Import, ast.ImportFrom))
+            ],
+            type_ignores=[],
+        )
+        dry_run = self._run(code, span_days=self.dry_run_days)
+        report["dry_run"] = dry_run
+        if dry_run["exit_code"] != 0:
+            report["error"] = dry_run["error"]
+            return report
+        if not dry_run["outputs"]:
+            report["error"] = "The script wrote no .csv or .parquet file"
+            return report
+        if "header" in dry_run and "Timestamp" not in dry_run["header"]:
+            report["error"] = "The output has no Timestamp header"
+            return report
+        expected_rows = self.dry_run_days * 24 * 60 * 60 / interval_seconds
+        if dry_run.get("rows", 0) > 2 * expected_rows:
+            report["error"] = (
+                f"The dry run wrote {dry_run['rows']} rows instead of "
+                f"{expected_rows:.0f}, SPAN_DAYS is ignored"
+            )
+            return report
+
+        # The full run takes the dry run plus the CPU time of the remaining span, without the imports
+        baseline = self._run(ast.unparse(imports))
+        factor = span_days / self.dry_run_days
+        work_seconds = max(dry_run["cpu_seconds"] - baseline["cpu_seconds"], 0)
+        report["estimated_seconds"] = dry_run["seconds"] + work_seconds * (
+            factor - 1
+        )
+        report["estimated_bytes"] = int(dry_run["bytes"] * factor)
+        if report["estimated_seconds"] > self.max_seconds:
+            report["error"] = (
+                f"The full run would take {report['estimated_seconds']:.0f}s, "
+                f"more than {self.max_seconds:.0f}s"
+            )
+            return report
+        if self.max_bytes and report["estimated_bytes"] > self.max_bytes:
+            report["error"] = (
+                f"The full run would write {report['estimated_bytes'] / MB:.0f} MB, "
+                f"more than {self.max_bytes / MB:.0f} MB"
+            )
+            return report
+        report["status"] = "passed"
+        report["error"] = None
+        return report
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import boto3
+import logging
+import argparse
+import subprocess
+
+from abc import ABC, abstractmethod
+from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+
+from job_intake import JobIntake
+from metrics import METRICS_FILE, format_summary, load_events, summarize
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+# The files every shard leaves behind for the coordinator
+SHARD_FILES = ["run_manifest.json", "run_summary.json", "build_metrics.jsonl"]
+
+
+def load_shard(directory: str) -> Dict:
+    """Load the manifest, the per-machine results and the metrics events a shard wrote to a directory."""
+    with open(os.path.join(directory, "run_manifest.json"), "r") as f:
+        manifest = json.load(f)
+    with open(os.path.join(directory, "run_summary.json"), "r") as f:
+        results = json.load(f)
+    events = []
+    if os.path.exists(os.path.join(directory, "build_metrics.jsonl")):
+        events = load_events(os.path.join(directory, "build_metrics.jsonl"))
+    return {"manifest": manifest, "results": results, "events": events}
+
+
+def merge_manifests(manifests: List[Dict]) -> Dict:
+    """
+    Merge the run manifests of the shards of a build into the manifest of a single build.
+
+    Args:
+        manifests: The manifests of the shards.
+
+    Returns:
+        Dict: The manifest with the directories, time axis, cache keys and jobs of all shards.
+    """
+    merged = {
+        "data_bucket": manifests[0]["data_bucket"] if manifests else None,
+        "directories": [],
+        "time_axis": {},
+        "cache_keys": {},
+        "jobs": {},
+    }
+    for manifest in manifests:
+        merged["directories"].extend(manifest["directories"])
+        merged["time_axis"].update(manifest.get("time_axis", {}))
+        merged["cache_keys"].update(manifest.get("cache_keys", {}))
+        for prefix, job in manifest.get("jobs", {}).items():
+            merged_job = merged["jobs"].setdefault(
+                prefix, {**job, "directories": []}
+            )
+            merged_job["directories"].extend(job["directories"])
+            merged_job["builds"] = max(merged_job["builds"], job["builds"])
+    return merged
+
+
+class ShardLauncher(ABC):
+    """The base class of the launchers running one shard of a build each."""
+
+    @abstractmethod
+    def run_shard(self, index: int, count: int) -> Dict:
+        """
+        Run a shard and wait for it.
+
+        Args:
+            index: The shard index from 0 to count - 1.
+            count: The number of shards.
+
+        Returns:
+            Dict: The manifest, results and metrics events of the shard, see load_shard.
+        """
+
+
+class CodeBuildShardLauncher(ShardLauncher):
+    """
+    A launcher starting one execution of the build project per shard.
+
+    Every execution receives its shard in the SHARD_INDEX and SHARD_COUNT environment variables and copies its
+    SHARD_FILES below SHARD_PREFIX in the code bucket, where the launcher downloads them.
+    """
+
+    def __init__(
+        self,
+        codebuild_client,
+        s3_client,
+        project_name: str,
+        bucket: str,
+        prefix: str = "shards/",
+        poll_interval: float = 30,
+    ):
+        """
+        Initialize the CodeBuildShardLauncher.
+
+        Args:
+            codebuild_client: The boto3 CodeBuild client.
+            s3_client: The boto3 Amazon S3 client.
+            project_name (str): The build project running the shards.
+            bucket (str): The code bucket the shards copy their files to.
+            prefix (str): The key prefix of the shard files.
+            poll_interval (float): The seconds between two status checks of a build.
+        """
+        self.codebuild_client = codebuild_client
+        self.s3_client = s3_client
+        self.project_name = project_name
+        self.bucket = bucket
+        self.prefix = f"{prefix}{int(time.time())}/"
+        self.poll_interval = poll_interval
+
+    def run_shard(self, index: int, count: int) -> Dict:
+        """Start the build of a shard, wait for it and download its files."""
+        prefix = f"{self.prefix}{index}/"
+        build_id = self.codebuild_client.start_build(
+            projectName=self.project_name,
+            environmentVariablesOverride=[
+                {
+                    "name": "SHARD_INDEX",
+                    "value": str(index),
+                    "type": "PLAINTEXT",
+                },
+                {
+                    "name": "SHARD_COUNT",
+                    "value": str(count),
+                    "type": "PLAINTEXT",
+                },
+                {"name": "SHARD_PREFIX", "value": prefix, "type": "PLAINTEXT"},
+            ],
+        )["build"]["id"]
+        logger.info(f"Started shard {index} as build {build_id}")
+        while True:
+            time.sleep(self.poll_interval)
+            status = self.codebuild_client.batch_get_builds(ids=[build_id])[
+                "builds"
+            ][0]["buildStatus"]
+            if status != "IN_PROGRESS":
+                break
+        if status != "SUCCEEDED":
+            raise RuntimeError(f"Shard {index} build {build_id} {status}")
+
+        directory = os.path.join("shards", str(index))
+        os.makedirs(directory, exist_ok=True)
+        for filename in SHARD_FILES:
+            self.s3_client.download_file(
+                Bucket=self.bucket,
+                Key=f"{prefix}{filename}",
+                Filename=os.path.join(directory, filename),
+            )
+        return load_shard(directory)
+
+
+class LocalShardLauncher(ShardLauncher):
+    """
+    A launcher running every shard as local main.py and runner.py processes, e.g. for tests and benchmarks.
+
+    Every shard works in its own directory below `directory`, so the shards do not share machine directories or
+    run manifests.
+    """
+
+    def __init__(
+        self,
+        argv: List[str],
+        directory: str = "shards",
+        command: List[str] = None,
+    ):
+        """
+        Initialize the LocalShardLauncher.
+
+        Args:
+            argv (List[str]): The arguments of main.py and runner.py, which ignore the arguments of the other.
+            directory (str): The directory of the shard directories.
+            command (List[str]): The command running a script with arguments, the current Python interpreter if
+                None, e.g. a wrapper replacing AWS clients in tests.
+        """
+        self.argv = argv
+        self.directory = directory
+        self.command = command or [sys.executable]
+
+    def run_shard(self, index: int, count: int) -> Dict:
+        """Run main.py and runner.py of a shard and load its files."""
+        directory = os.path.abspath(os.path.join(self.directory, str(index)))
+        os.makedirs(directory, exist_ok=True)
+        env = {
+            **os.environ,
+            "SHARD_INDEX": str(index),
+            "SHARD_COUNT": str(count),
+        }
+        for script in ["main.py", "runner.py"]:
+            subprocess.run(
+                self.command + [os.path.join(ROOT, script)] + self.argv,
+                cwd=directory,
+                env=env,
+                check=True,
+            )
+        return load_shard(directory)
+
+
+class ShardCoordinator:
+    """
+    A coordinator splitting a build into shards that run in parallel.
+
+    Every shard generates, runs and uploads the machines whose directory hashes to its index, see get_shard. The
+    coordinator counts the build of every pending job once before the shards start and completes the jobs once all
+    shards are done, since a single shard only sees part of a job's machines.
+    """
+
+    def __init__(
+        self,
+        launcher: ShardLauncher,
+        shard_count: int,
+        intake: JobIntake = None,
+        max_builds: int = 3,
+    ):
+        """
+        Initialize the ShardCoordinator.
+
+        Args:
+            launcher (ShardLauncher): Runs a shard and returns its files.
+            shard_count (int): The number of shards.
+            intake (JobIntake): The pending jobs, the jobs are neither counted nor completed if None.
+            max_builds (int): The number of builds after which a job with failed machines is completed as failed.
+        """
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.launcher = launcher
+        self.shard_count = shard_count
+        self.intake = intake
+        self.max_builds = max_builds
+
+    def _run_shard(self, index: int) -> Dict:
+        """Run a shard and time it, recording an error instead of raising it."""
+        start = time.perf_counter()
+        try:
+            shard = self.launcher.run_shard(index, self.shard_count)
+            shard["status"] = "succeeded"
+        except Exception as e:
+            logger.error(f"Shard {index} failed: {e}")
+            shard = {"status": "failed", "error": str(e)}
+        shard["index"] = index
+        shard["latency"] = time.perf_counter() - start
+        return shard
+
+    def run(self) -> Dict:
+        """
+        Run all shards in parallel and merge their manifests, results and metrics events.
+
+        The jobs stay pending if a shard failed, the next build resumes them from their checkpoints.
+
+        Returns:
+            Dict: The merged `manifest`, `results` and `events`, and the status and latency per shard.
+        """
+        if self.intake is not None:
+            for job in self.intake.pending_jobs():
+                self.intake.start_build(
+                    user_id=job["user_id"], job_id=job["job_id"]
+                )
+
+        with ThreadPoolExecutor(max_workers=self.shard_count) as executor:
+            shards = list(
+                executor.map(self._run_shard, range(self.shard_count))
+            )
+        succeeded = [
+            shard for shard in shards if shard["status"] == "succeeded"
+        ]
+        merged = {
+            "manifest": merge_manifests(
+                [shard["manifest"] for shard in succeeded]
+            ),
+            "results": [
+                result for shard in succeeded for result in shard["results"]
+            ],
+            "events": [
+                event for shard in succeeded for event in shard["events"]
+            ],
+            "shards": [
+                {
+                    key: shard[key]
+                    for key in ["index", "status", "latency", "error"]
+                    if key in shard
+                }
+                for shard in shards
+            ],
+        }
+        if self.intake is not None and len(succeeded) == len(shards):
+            self.intake.finish_build(
+                jobs=merged["manifest"]["jobs"],
+                results=merged["results"],
+                max_builds=self.max_builds,
+            )
+        return merged
+
+
+if __name__ == "__main__":
+    # Parse command line arguments, the remaining arguments are passed on to main.py and runner.py
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default=os.environ.get("LOGLEVEL", "INFO").upper(),
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=int(os.environ.get("SHARD_COUNT", 1)),
+    )
+    parser.add_argument(
+        "--launcher", type=str, choices=["codebuild", "local"], default="local"
+    )
+    # A CodeBuild build ID is `<project name>:<uuid>`
+    parser.add_argument(
+        "--project-name",
+        type=str,
+        default=os.environ.get("CODEBUILD_BUILD_ID", "").split(":")[0],
+    )
+    parser.add_argument("--code-bucket", type=str, default=None)
+    parser.add_argument("--shard-prefix", type=str, default="shards/")
+    parser.add_argument("--poll-seconds", type=float, default=30)
+    parser.add_argument("--table-name", type=str, default=None)
+    parser.add_argument("--column-name", type=str, default="active")
+    parser.add_argument("--index-name", type=str, default=None)
+    parser.add_argument("--max-builds", type=int, default=3)
+    parser.add_argument("--manifest", type=str, default="run_manifest.json")
+    parser.add_argument("--summary", type=str, default="run_summary.json")
+    parser.add_argument("--metrics-file", type=str, default=METRICS_FILE)
+    args, argv = parser.parse_known_args()
+
+    # Configure logging to output the line number and message
+    log_format = "%(levelname)s: [%(filename)s:%(lineno)s] %(message)s"
+    logging.basicConfig(format=log_format, level=args.log_level)
+
+    if args.launcher == "codebuild":
+        launcher = CodeBuildShardLauncher(
+            codebuild_client=boto3.client("codebuild"),
+            s3_client=boto3.client("s3"),
+            project_name=args.project_name,
+            bucket=args.code_bucket,
+            prefix=args.shard_prefix,
+            poll_interval=args.poll_seconds,
+        )
+    else:
+        # Every argument the coordinator shares with main.py and runner.py is passed on
+        shared = []
+        for name in ["code_bucket", "table_name", "column_name", "index_name"]:
+            if getattr(args, name):
+                shared += [f"--{name.replace('_', '-')}", getattr(args, name)]
+        launcher = LocalShardLauncher(argv=shared + argv)
+
+    intake = None
+    if args.table_name:
+        intake = JobIntake(
+            dynamodb_client=boto3.client("dynamodb"),
+            table_name=args.table_name,
+            column_name=args.column_name,
+            index_name=args.index_name,
+        )
+    coordinator = ShardCoordinator(
+        launcher=launcher,
+        shard_count=args.shard_count,
+        intake=intake,
+        max_builds=args.max_builds,
+    )
+    merged = coordinator.run()
+
+    # Leave the files of a single build behind, e.g. for the metrics summary of the build
+    with open(args.manifest, "w") as f:
+        json.dump(merged["manifest"], f, indent=4)
+    with open(args.summary, "w") as f:
+        json.dump(merged["results"], f, indent=4)
+    with open(args.metrics_file, "w") as f:
+        for event in merged["events"]:
+            f.write(json.dumps(event) + "\n")
+    for shard in merged["shards"]:
+        print(
+            f"Shard {shard['index']}: {shard['status']} in {shard['latency']:.2f}s"
+        )
+    print(format_summary(summarize(merged["events"])))
+    if any(shard["status"] != "succeeded" for shard in merged["shards"]):
+        sys.exit(1)
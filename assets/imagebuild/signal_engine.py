@@ -0,0 +1,317 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Iterator, List
+
+from output_format import FORMATS, to_parquet
+
+SPEC_DEFAULTS = {
+    "start": "2023-01-01 00:00:00",
+    "interval_seconds": 60,
+    "periods": 525600,
+    "seed": None,
+    "label_anomalies": True,
+}
+# The drift of a signal is its change over one year
+HOURS_PER_YEAR = 365 * 24
+SIGNAL_DEFAULTS = {
+    "noise": 0.0,
+    "drift": 0.0,
+    "seasonality": [],
+    "anomaly_rate": 0.0,
+    "anomaly_magnitude": 0.0,
+    "decimals": 3,
+}
+
+
+def validate_spec(spec: Dict) -> Dict:
+    """
+    Validate a signal spec and fill in the defaults.
+
+    A spec describes the time axis and a list of signals:
+
+        {
+            "start": "2023-01-01 00:00:00",
+            "interval_seconds": 60,
+            "periods": 525600,
+            "signals": [
+                {
+                    "name": "Spindle_Temperature_C",
+                    "mean": 65.0,
+                    "min": 20.0,
+                    "max": 110.0,
+                    "noise": 1.5,
+                    "drift": 3.0,
+                    "seasonality": [{"period_hours": 24, "amplitude": 4.0}],
+                    "anomaly_rate": 0.001,
+                    "anomaly_magnitude": 25.0
+                }
+            ]
+        }
+
+    `drift` is the linear change over one year, whatever the span of the dataset, `anomaly_rate` the fraction of
+    samples with a spike of up to `anomaly_magnitude` in either direction.
+
+    Args:
+        spec: The parsed spec.
+
+    Returns:
+        Dict: The spec with all defaults filled in.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("The spec must be a JSON object")
+    spec = {**SPEC_DEFAULTS, **spec}
+    if not spec.get("signals"):
+        raise ValueError("The spec has no signals")
+    if int(spec["periods"]) <= 0 or float(spec["interval_seconds"]) <= 0:
+        raise ValueError("periods and interval_seconds must be positive")
+
+    signals, names = [], set()
+    for signal in spec["signals"]:
+        signal = {**SIGNAL_DEFAULTS, **signal}
+        for key in ["name", "mean", "min", "max"]:
+            if key not in signal:
+                raise ValueError(f"Signal {signal.get('name')} has no {key}")
+        if signal["name"] in names or signal["name"] == "Timestamp":
+            raise ValueError(f"Duplicate signal {signal['name']}")
+        if not signal["min"] <= signal["mean"] <= signal["max"]:
+            raise ValueError(
+                f"Signal {signal['name']} has a mean outside [min, max]"
+            )
+        if not 0 <= signal["anomaly_rate"] <= 1:
+            raise ValueError(
+                f"Signal {signal['name']} has an anomaly_rate outside [0, 1]"
+            )
+        names.add(signal["name"])
+        signals.append(signal)
+    spec["signals"] = signals
+    return spec
+
+
+def create_timestamps(
+    start: str, interval_seconds: float, periods: int, offset: int = 0
+) -> np.ndarray:
+    """
+    Create the `yyyy-MM-dd HH:mm:ss` timestamps of a spec in one vectorized pass.
+
+    Args:
+        start: The first timestamp of the dataset.
+        interval_seconds: The seconds between two samples.
+        periods: The number of samples.
+        offset: The index of the first sample, e.g. of a chunk.
+
+    Returns:
+        np.ndarray: The formatted timestamps.
+    """
+    offsets = np.arange(offset, offset + periods, dtype=np.int64) * int(
+        interval_seconds
+    )
+    timestamps = np.datetime64(start.replace(" ", "T"), "s") + offsets
+    return np.char.replace(
+        np.datetime_as_string(timestamps, unit="s"), "T", " "
+    )
+
+
+def generate_signal(
+    signal: Dict,
+    index: np.ndarray,
+    spec: Dict,
+    phases: List[float],
+    rng: np.random.Generator,
+) -> Dict[str, np.ndarray]:
+    """
+    Generate the values and the anomaly mask of one signal for a range of samples.
+
+    Args:
+        signal: The validated signal spec.
+        index: The sample indices since start.
+        spec: The validated spec.
+        phases: The phase of every seasonality of the signal.
+        rng: The random number generator.
+
+    Returns:
+        Dict[str, np.ndarray]: The `values` and the boolean `anomalies`.
+    """
+    periods = len(index)
+    hours = index * (spec["interval_seconds"] / 3600)
+    values = np.full(periods, float(signal["mean"]))
+    values += signal["drift"] * hours / HOURS_PER_YEAR
+    for season, phase in zip(signal["seasonality"], phases):
+        values += season["amplitude"] * np.sin(
+            2 * np.pi * hours / season["period_hours"] + phase
+        )
+    if signal["noise"]:
+        values += rng.normal(0, signal["noise"], periods)
+    np.clip(values, signal["min"], signal["max"], out=values)
+
+    anomalies = rng.random(periods) < signal["anomaly_rate"]
+    count = int(anomalies.sum())
+    if count:
+        spikes = rng.uniform(0.5, 1.0, count) * signal["anomaly_magnitude"]
+        values[anomalies] += spikes * rng.choice([-1.0, 1.0], count)
+    return {
+        "values": np.round(values, signal["decimals"]),
+        "anomalies": anomalies,
+    }
+
+
+def chunk_rows_for(spec: Dict, max_memory: int) -> int:
+    """
+    Get the number of rows per chunk that keeps a chunk within a memory budget.
+
+    Args:
+        spec: The validated spec.
+        max_memory: The memory budget of one chunk in bytes.
+
+    Returns:
+        int: The rows per chunk.
+    """
+    # Measured peak per row: ~400 bytes for the timestamp strings and the writer buffers, ~32 bytes per signal
+    row_bytes = len(spec["signals"]) * 32 + 400
+    return max(max_memory // row_bytes, 1000)
+
+
+def generate_chunks(
+    spec: Dict, chunk_rows: int = 100000
+) -> Iterator[pd.DataFrame]:
+    """
+    Generate the dataset of a spec chunk by chunk with vectorized NumPy operations.
+
+    Every chunk only depends on its sample indices, so the memory use is bounded by chunk_rows independent of the
+    interval and span of the dataset.
+
+    Args:
+        spec: The spec, see validate_spec.
+        chunk_rows: The maximum number of rows of a chunk.
+
+    Returns:
+        Iterator[pd.DataFrame]: The `Timestamp` column followed by one column per signal and an optional `Anomaly`
+        label.
+    """
+    spec = validate_spec(spec)
+    periods = int(spec["periods"])
+    rng = np.random.default_rng(spec["seed"])
+    phases = [
+        [rng.uniform(0, 2 * np.pi) for _ in signal["seasonality"]]
+        for signal in spec["signals"]
+    ]
+    for offset in range(0, periods, chunk_rows):
+        index = np.arange(offset, min(offset + chunk_rows, periods))
+        columns = {
+            "Timestamp": create_timestamps(
+                start=spec["start"],
+                interval_seconds=spec["interval_seconds"],
+                periods=len(index),
+                offset=offset,
+            )
+        }
+        labels = np.zeros(len(index), dtype=bool)
+        for signal, signal_phases in zip(spec["signals"], phases):
+            generated = generate_signal(
+                signal=signal,
+                index=index,
+                spec=spec,
+                phases=signal_phases,
+                rng=rng,
+            )
+            columns[signal["name"]] = generated["values"]
+            labels |= generated["anomalies"]
+        if spec["label_anomalies"]:
+            columns["Anomaly"] = labels.astype(np.int8)
+        yield pd.DataFrame(columns)
+
+
+def generate_dataset(spec: Dict) -> pd.DataFrame:
+    """
+    Generate the full dataset of a spec in memory.
+
+    Args:
+        spec: The spec, see validate_spec.
+
+    Returns:
+        pd.DataFrame: The `Timestamp` column followed by one column per signal and an optional `Anomaly` label.
+    """
+    spec = validate_spec(spec)
+    return pd.concat(
+        generate_chunks(spec, chunk_rows=int(spec["periods"])),
+        ignore_index=True,
+    )
+
+
+def write_dataset(
+    spec: Dict, path: str, output_format: str = "csv", chunk_rows: int = 100000
+) -> None:
+    """
+    Generate the dataset of a spec chunk by chunk and append every chunk to the output.
+
+    Args:
+        spec: The spec, see validate_spec.
+        path: The output path, the Parquet partitions are written to a directory of the same name without extension.
+        output_format: The output format, "csv" with headers or partitioned "parquet".
+        chunk_rows: The maximum number of rows held in memory.
+    """
+    for part, chunk in enumerate(generate_chunks(spec, chunk_rows=chunk_rows)):
+        if output_format == "parquet":
+            to_parquet(chunk, directory=os.path.splitext(path)[0], part=part)
+        else:
+            chunk.to_csv(
+                path, index=False, mode="a" if part else "w", header=not part
+            )
+
+
+def load_spec(text: str) -> Dict:
+    """
+    Parse and validate a JSON spec, e.g. the fenced block of an LLM response.
+
+    Args:
+        text: The JSON spec.
+
+    Returns:
+        Dict: The validated spec.
+    """
+    try:
+        spec = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The spec is not valid JSON: {e}")
+    return validate_spec(spec)
+
+
+def signal_names(spec: Dict) -> List[str]:
+    """Get the column names of the dataset of a spec."""
+    return [signal["name"] for signal in spec["signals"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spec", type=str, default="spec.json")
+    parser.add_argument("--output", type=str, default="data.csv")
+    parser.add_argument("--format", type=str, choices=FORMATS, default="csv")
+    parser.add_argument("--interval-seconds", type=float, default=None)
+    parser.add_argument("--span-days", type=float, default=None)
+    parser.add_argument("--max-memory-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    with open(args.spec, "r") as f:
+        spec = load_spec(f.read())
+    # The time axis of the request overrides the spec
+    if args.interval_seconds:
+        spec["interval_seconds"] = args.interval_seconds
+    if args.span_days:
+        spec["periods"] = int(
+            args.span_days * 24 * 60 * 60 / spec["interval_seconds"]
+        )
+    write_dataset(
+        spec=spec,
+        path=args.output,
+        output_format=args.format,
+        chunk_rows=chunk_rows_for(
+            spec, max_memory=args.max_memory_mb * 1024 * 1024
+        ),
+    )
+    print(
+        f"Wrote {spec['periods']} rows of {signal_names(spec)} to {args.output}"
+    )
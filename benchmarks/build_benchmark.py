@@ -0,0 +1,416 @@
+"""End-to-end benchmark of a build for 10, 50 and 200 machines without network access.
+
+Usage:
+    python benchmarks/build_benchmark.py [--machines 10 50 200] [--latency 1.0] [--throttle-rate 0.0]
+        [--generation-mode script] [--output build_benchmark.json] [-- <arguments of main.py>]
+
+Amazon DynamoDB, Amazon S3 and Amazon SQS are mocked with moto, Amazon Bedrock is replaced by the FakeBedrockRuntime
+of benchmarks/fake_bedrock.py. Every build runs the request Lambda (assets/apis/async/app.py) once per 10 machines and
+the listing Lambda on the queued requests, then main.py and runner.py as in buildspec.yml, in a temporary directory,
+and finally reads the status of every job. The results hold the wall clock time of
+every step, the per-stage summary of build_metrics.jsonl and the requests, throttles and tokens of the fake client.
+Arguments after `--` are passed on to main.py, e.g. `-- --no-cache --max-concurrency 8`.
+
+Requires moto and the requirements of assets/imagebuild, see benchmarks/requirements.txt.
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import socket
+import argparse
+import tempfile
+
+from contextlib import contextmanager
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+IMAGEBUILD = os.path.join(os.path.dirname(ROOT), "assets", "imagebuild")
+API = os.path.join(os.path.dirname(ROOT), "assets", "apis", "async")
+sys.path[:0] = [ROOT, IMAGEBUILD, API]
+
+import boto3  # noqa: E402
+
+from moto import mock_aws  # noqa: E402
+
+from fake_bedrock import FakeBedrockRuntime  # noqa: E402
+from job_intake import JobIntake  # noqa: E402
+from metrics import load_events, summarize  # noqa: E402
+from shard_coordinator import (  # noqa: E402
+    LocalShardLauncher,
+    ShardCoordinator,
+)
+
+REGION = "us-east-1"
+TABLE_NAME = "history"
+INDEX_NAME = "active-index"
+COLUMN_NAME = "active"
+CODE_BUCKET = "benchmark-code"
+DATA_BUCKET = "benchmark-data"
+MODEL_ID = "anthropic.claude-v2"
+MACHINES_PER_REQUEST = 10
+
+
+def create_resources() -> dict:
+    """Create the history table, the buckets and the queues, and return the queue URLs."""
+    boto3.client("dynamodb").create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "user_id", "KeyType": "HASH"},
+            {"AttributeName": "job_id", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "user_id", "AttributeType": "S"},
+            {"AttributeName": "job_id", "AttributeType": "S"},
+            {"AttributeName": COLUMN_NAME, "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": INDEX_NAME,
+                "KeySchema": [
+                    {"AttributeName": COLUMN_NAME, "KeyType": "HASH"}
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    s3_client = boto3.client("s3")
+    for bucket in [CODE_BUCKET, DATA_BUCKET]:
+        s3_client.create_bucket(Bucket=bucket)
+    sqs_client = boto3.client("sqs")
+    return {
+        "queue_url": sqs_client.create_queue(QueueName="jobs")["QueueUrl"],
+        "listing_queue_url": sqs_client.create_queue(QueueName="listing")[
+            "QueueUrl"
+        ],
+    }
+
+
+def run_script(path: str, argv: list) -> float:
+    """Run a script as __main__ with command line arguments and return the seconds it took."""
+    start = time.perf_counter()
+    with mock.patch.object(sys, "argv", [path] + argv):
+        runpy.run_path(path, run_name="__main__")
+    return time.perf_counter() - start
+
+
+@contextmanager
+def moto_server():
+    """Serve moto over HTTP, so the shard processes of a build share the mocked services."""
+    from moto.server import ThreadedMotoServer
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = ThreadedMotoServer(
+        ip_address="127.0.0.1", port=port, verbose=False
+    )
+    server.start()
+    try:
+        with mock.patch.dict(
+            os.environ, {"AWS_ENDPOINT_URL": f"http://127.0.0.1:{port}"}
+        ):
+            yield
+    finally:
+        server.stop()
+
+
+def run_shards(shards: int, argv: list, args) -> dict:
+    """
+    Run the build as shard processes with the ShardCoordinator and the LocalShardLauncher.
+
+    Args:
+        shards: The number of shards.
+        argv: The arguments of main.py and runner.py.
+        args: The parsed arguments of the benchmark.
+
+    Returns:
+        dict: The merged manifest, results and events, and the summed stats of the fake clients of the shards.
+    """
+    fake_bedrock = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "throttle_rate": args.throttle_rate,
+        "max_concurrency": args.max_bedrock_concurrency,
+        "seed": args.seed,
+    }
+    with mock.patch.dict(
+        os.environ, {"FAKE_BEDROCK": json.dumps(fake_bedrock)}
+    ):
+        merged = ShardCoordinator(
+            launcher=LocalShardLauncher(
+                argv=argv,
+                command=[
+                    sys.executable,
+                    os.path.join(ROOT, "fake_bedrock_run.py"),
+                ],
+            ),
+            shard_count=shards,
+            intake=JobIntake(
+                dynamodb_client=boto3.client("dynamodb"),
+                table_name=TABLE_NAME,
+                column_name=COLUMN_NAME,
+                index_name=INDEX_NAME,
+            ),
+        ).run()
+    stats = {}
+    for index in range(shards):
+        for name in ["main", "runner"]:
+            path = os.path.join(
+                "shards", str(index), f"fake_bedrock_{name}.json"
+            )
+            with open(path, "r") as f:
+                for key, value in json.load(f).items():
+                    if key == "max_in_flight":
+                        stats[key] = max(stats.get(key, 0), value)
+                    else:
+                        stats[key] = stats.get(key, 0) + value
+    merged["bedrock"] = stats
+    return merged
+
+
+def count_objects(bucket: str) -> int:
+    """Count the objects of a bucket."""
+    paginator = boto3.client("s3").get_paginator("list_objects_v2")
+    return sum(
+        page.get("KeyCount", 0) for page in paginator.paginate(Bucket=bucket)
+    )
+
+
+def run_build(
+    machines: int, client: FakeBedrockRuntime, args, shards: int = 1
+) -> dict:
+    """
+    Run the requests and the build for a number of machines.
+
+    Args:
+        machines: The number of machines, requested in batches of 10 per user.
+        client: The fake bedrock-runtime client of the requests and of an unsharded build.
+        args: The parsed arguments of the benchmark.
+        shards: The number of shards of the build, run in-process if 1.
+
+    Returns:
+        dict: The wall clock time per step, the per-stage summary and the fake client stats.
+    """
+    create_client = boto3.client
+
+    def client_factory(service_name: str, *client_args, **kwargs):
+        if service_name == "bedrock-runtime":
+            return client
+        return create_client(service_name, *client_args, **kwargs)
+
+    result = {"machines": machines, "shards": shards}
+    with mock_aws() if shards == 1 else moto_server(), mock.patch.object(
+        boto3, "client", side_effect=client_factory
+    ), mock.patch.dict(
+        os.environ,
+        {
+            "table_name": TABLE_NAME,
+            "column_name": COLUMN_NAME,
+            "model_id": MODEL_ID,
+            "pipeline_name": "benchmark",
+            "handler_mode": args.handler_mode,
+            **create_resources(),
+            "code_bucket": CODE_BUCKET,
+            # The LLM-written scripts read the span of the full run
+            "SPAN_DAYS": str(args.span_days),
+            "GENERATION_MODE": args.generation_mode,
+        },
+    ):
+        # The request Lambda, a cold start followed by warm invocations
+        start = time.perf_counter()
+        api = runpy.run_path(os.path.join(API, "app.py"))
+        job_ids = {}
+        for i, offset in enumerate(range(0, machines, MACHINES_PER_REQUEST)):
+            response = api["index"](
+                {
+                    "industry": "semiconductor",
+                    "number": min(MACHINES_PER_REQUEST, machines - offset),
+                    "user_id": f"user-{i}",
+                    "interval_seconds": args.interval_seconds,
+                    "span_days": args.span_days,
+                },
+                None,
+            )
+            job_ids[f"user-{i}"] = json.loads(response)["body"]["job_id"]
+        result["api_s"] = time.perf_counter() - start
+
+        # The listing Lambda, fed by the listing queue like its event source
+        start = time.perf_counter()
+        sqs_client = boto3.client("sqs")
+        while True:
+            messages = sqs_client.receive_message(
+                QueueUrl=os.environ["listing_queue_url"],
+                MaxNumberOfMessages=10,
+            ).get("Messages", [])
+            if not messages:
+                break
+            api["list_machines"](
+                {
+                    "Records": [
+                        {"messageId": m["MessageId"], "body": m["Body"]}
+                        for m in messages
+                    ]
+                },
+                None,
+            )
+            sqs_client.delete_message_batch(
+                QueueUrl=os.environ["listing_queue_url"],
+                Entries=[
+                    {"Id": str(j), "ReceiptHandle": m["ReceiptHandle"]}
+                    for j, m in enumerate(messages)
+                ],
+            )
+        result["listing_s"] = time.perf_counter() - start
+
+        # The build phase of buildspec.yml
+        argv = [
+            "--code-bucket",
+            CODE_BUCKET,
+            "--data-bucket",
+            DATA_BUCKET,
+            "--table-name",
+            TABLE_NAME,
+            "--column-name",
+            COLUMN_NAME,
+            "--index-name",
+            INDEX_NAME,
+            "--model-id",
+            MODEL_ID,
+            "--generation-mode",
+            args.generation_mode,
+        ]
+        if shards == 1:
+            result["main_s"] = run_script(
+                os.path.join(IMAGEBUILD, "main.py"), argv + args.main_args
+            )
+            result["runner_s"] = run_script(
+                os.path.join(IMAGEBUILD, "runner.py"),
+                [
+                    "--manifest",
+                    "run_manifest.json",
+                    "--summary",
+                    "run_summary.json",
+                    "--output-format",
+                    args.output_format,
+                    "--model-id",
+                    MODEL_ID,
+                    "--table-name",
+                    TABLE_NAME,
+                    "--column-name",
+                    COLUMN_NAME,
+                ],
+            )
+            result["build_s"] = result["main_s"] + result["runner_s"]
+            with open("run_summary.json", "r") as f:
+                runs = json.load(f)
+            events = load_events("build_metrics.jsonl")
+            result["bedrock"] = client.stats()
+        else:
+            start = time.perf_counter()
+            merged = run_shards(
+                shards,
+                argv
+                + ["--output-format", args.output_format]
+                + args.main_args,
+                args,
+            )
+            result["build_s"] = time.perf_counter() - start
+            result["shard_s"] = [
+                shard["latency"] for shard in merged["shards"]
+            ]
+            runs, events = merged["results"], merged["events"]
+            result["bedrock"] = merged["bedrock"]
+        result["total_s"] = (
+            result["api_s"] + result["listing_s"] + result["build_s"]
+        )
+        result["jobs"] = [
+            json.loads(
+                api["status"]({"user_id": user_id, "job_id": job_id}, None)
+            )["body"]
+            for user_id, job_id in job_ids.items()
+        ]
+        result["succeeded"] = sum(run["status"] == "succeeded" for run in runs)
+        result["code_objects"] = count_objects(CODE_BUCKET)
+        result["data_objects"] = count_objects(DATA_BUCKET)
+    result["stages"] = summarize(events)
+    return result
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    main_args = argv[argv.index("--") + 1 :] if "--" in argv else []
+    argv = argv[: argv.index("--")] if "--" in argv else argv
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--machines", type=int, nargs="+", default=[10, 50, 200]
+    )
+    parser.add_argument("--shards", type=int, nargs="+", default=[1])
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--max-bedrock-concurrency", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--generation-mode",
+        type=str,
+        choices=["script", "spec"],
+        default="script",
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        choices=["csv", "parquet"],
+        default="csv",
+    )
+    parser.add_argument(
+        "--handler-mode",
+        type=str,
+        choices=["slim", "langchain"],
+        default="slim",
+    )
+    parser.add_argument("--interval-seconds", type=int, default=60)
+    parser.add_argument("--span-days", type=int, default=1)
+    parser.add_argument("--output", type=str, default="build_benchmark.json")
+    args = parser.parse_args(argv)
+    args.main_args = main_args
+    output = os.path.abspath(args.output)
+
+    # Credentials and region for moto, never used against AWS
+    os.environ.update(
+        {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": REGION,
+            "METRICS_NAMESPACE": "",
+        }
+    )
+    results = {"config": {**vars(args)}, "results": []}
+    cwd = os.getcwd()
+    for machines in args.machines:
+        for shards in args.shards:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                try:
+                    results["results"].append(
+                        run_build(
+                            machines,
+                            client=FakeBedrockRuntime(
+                                latency=args.latency,
+                                jitter=args.jitter,
+                                throttle_rate=args.throttle_rate,
+                                max_concurrency=args.max_bedrock_concurrency,
+                                seed=args.seed,
+                            ),
+                            args=args,
+                            shards=shards,
+                        )
+                    )
+                finally:
+                    os.chdir(cwd)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps(results, indent=4))
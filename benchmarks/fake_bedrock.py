@@ -0,0 +1,225 @@
+"""A local stand-in for the `bedrock-runtime` client that replays recorded responses.
+
+The responses are the text files in benchmarks/fixtures, one per kind of prompt. The client simulates the latency
+of a request, throttles requests at random or beyond a concurrency limit and reports token counts like Amazon
+Bedrock, in the response headers of `invoke_model` and in the last chunk of `invoke_model_with_response_stream`.
+"""
+import os
+import io
+import json
+import time
+import random
+import threading
+
+from typing import Dict, Iterator
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "fixtures"
+)
+# The kind of response replayed for a prompt, by a phrase of the prompts of this repository
+KINDS = {
+    "NUMBERED list": "machines",
+    "signal specification": "spec",
+    "failed with the error below": "repair",
+    "": "script",
+}
+
+
+def load_responses(directory: str = FIXTURES) -> Dict[str, str]:
+    """Load the recorded response of every kind of prompt."""
+    responses = {}
+    for kind in KINDS.values():
+        with open(os.path.join(directory, f"{kind}.txt"), "r") as f:
+            responses[kind] = f.read()
+    return responses
+
+
+class StreamingBody(io.BytesIO):
+    """The body of an `invoke_model` response."""
+
+
+class EventStream:
+    """The body of an `invoke_model_with_response_stream` response, which can be closed early."""
+
+    def __init__(self, events: Iterator[Dict]):
+        self._events = events
+        self.closed = False
+
+    def __iter__(self) -> Iterator[Dict]:
+        for event in self._events:
+            if self.closed:
+                return
+            yield event
+
+    def close(self) -> None:
+        self.closed = True
+        if hasattr(self._events, "close"):
+            self._events.close()
+
+
+class FakeBedrockRuntime:
+    """
+    A thread-safe fake of the `bedrock-runtime` client for Anthropic Claude text completion models.
+
+    Throttled requests raise the same ThrottlingException as Amazon Bedrock, so the BedrockScheduler and the botocore
+    retries react to them as in a real build.
+    """
+
+    def __init__(
+        self,
+        responses: Dict[str, str] = None,
+        latency: float = 1.0,
+        jitter: float = 0.2,
+        throttle_rate: float = 0.0,
+        max_concurrency: int = None,
+        chunk_size: int = 64,
+        seed: int = 0,
+    ):
+        """
+        Initialize the FakeBedrockRuntime.
+
+        Args:
+            responses (Dict[str, str]): The response per kind of prompt, the fixtures if None.
+            latency (float): The mean duration of a request in seconds.
+            jitter (float): The relative random deviation of the duration.
+            throttle_rate (float): The probability of throttling a request.
+            max_concurrency (int): The number of requests in flight beyond which requests are throttled, unlimited
+                if None.
+            chunk_size (int): The characters per chunk of a streamed response.
+            seed (int): The seed of the latency and throttling decisions.
+        """
+        self.responses = responses or load_responses()
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.meta = type("Meta", (), {"events": HierarchicalEmitter()})()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "max_in_flight": 0,
+        }
+
+    def stats(self) -> Dict:
+        """Get the number of requests, throttled requests and tokens so far."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _start(self, operation: str, body: str) -> Dict:
+        """Admit or throttle a request and pick its response and duration."""
+        prompt = json.loads(body)["prompt"]
+        with self._lock:
+            self._stats["requests"] += 1
+            if self._random.random() < self.throttle_rate or (
+                self.max_concurrency
+                and self._in_flight >= self.max_concurrency
+            ):
+                self._stats["throttled"] += 1
+                raise ClientError(
+                    {
+                        "Error": {
+                            "Code": "ThrottlingException",
+                            "Message": "Too many requests, please wait before trying again.",
+                        },
+                        "ResponseMetadata": {"HTTPStatusCode": 429},
+                    },
+                    operation,
+                )
+            self._in_flight += 1
+            self._stats["max_in_flight"] = max(
+                self._stats["max_in_flight"], self._in_flight
+            )
+            seconds = self.latency * (
+                1 + self._random.uniform(-self.jitter, self.jitter)
+            )
+        kind = next(kind for phrase, kind in KINDS.items() if phrase in prompt)
+        completion = self.responses[kind]
+        tokens = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(completion) // 4,
+        }
+        with self._lock:
+            for name, count in tokens.items():
+                self._stats[name] += count
+        return {"completion": completion, "seconds": seconds, **tokens}
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> Dict:
+        """Replay a complete response after the simulated latency."""
+        request = self._start("InvokeModel", body)
+        try:
+            time.sleep(request["seconds"])
+        finally:
+            self._finish()
+        response = {
+            "ResponseMetadata": {
+                "HTTPStatusCode": 200,
+                "HTTPHeaders": {
+                    "x-amzn-bedrock-input-token-count": str(
+                        request["input_tokens"]
+                    ),
+                    "x-amzn-bedrock-output-token-count": str(
+                        request["output_tokens"]
+                    ),
+                    "x-amzn-bedrock-invocation-latency": str(
+                        int(request["seconds"] * 1000)
+                    ),
+                },
+            },
+            "contentType": "application/json",
+        }
+        # The hooks see the parsed response like the hooks of a botocore client
+        self.meta.events.emit(
+            "after-call.bedrock-runtime.InvokeModel",
+            parsed=response,
+            model=type("OperationModel", (), {"name": "InvokeModel"})(),
+        )
+        response["body"] = StreamingBody(
+            json.dumps(
+                {"completion": request["completion"], "stop_reason": "stop"}
+            ).encode()
+        )
+        return response
+
+    def invoke_model_with_response_stream(
+        self, modelId: str, body: str, **kwargs
+    ) -> Dict:
+        """Replay a response chunk by chunk, spreading the simulated latency over the chunks."""
+        request = self._start("InvokeModelWithResponseStream", body)
+        completion = request["completion"]
+        offsets = range(0, len(completion), self.chunk_size)
+        delay = request["seconds"] / max(len(offsets), 1)
+
+        def events() -> Iterator[Dict]:
+            try:
+                for offset in offsets:
+                    time.sleep(delay)
+                    chunk = {
+                        "completion": completion[
+                            offset : offset + self.chunk_size
+                        ]
+                    }
+                    if offset + self.chunk_size >= len(completion):
+                        chunk["amazon-bedrock-invocationMetrics"] = {
+                            "inputTokenCount": request["input_tokens"],
+                            "outputTokenCount": request["output_tokens"],
+                            "invocationLatency": int(
+                                request["seconds"] * 1000
+                            ),
+                        }
+                    yield {"chunk": {"bytes": json.dumps(chunk).encode()}}
+            finally:
+                self._finish()
+
+        return {"body": EventStream(events())}
@@ -0,0 +1,47 @@
+"""Run a script of the build with the FakeBedrockRuntime, e.g. a shard process of the build benchmark.
+
+Usage:
+    FAKE_BEDROCK='{"latency": 1.0}' python benchmarks/fake_bedrock_run.py <script> [<arguments of the script>]
+
+The FAKE_BEDROCK environment variable holds the keyword arguments of the FakeBedrockRuntime. All other AWS clients
+are created as usual, e.g. against a moto server set in AWS_ENDPOINT_URL. The stats of the fake client are written
+to `fake_bedrock_<script>.json` in the working directory when the script ends.
+"""
+import os
+import sys
+import json
+import runpy
+import atexit
+
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, ROOT)
+
+import boto3  # noqa: E402
+
+from fake_bedrock import FakeBedrockRuntime  # noqa: E402
+
+if __name__ == "__main__":
+    script, argv = sys.argv[1], sys.argv[2:]
+    client = FakeBedrockRuntime(
+        **json.loads(os.environ.get("FAKE_BEDROCK", "{}"))
+    )
+    create_client = boto3.client
+
+    def client_factory(service_name: str, *client_args, **kwargs):
+        if service_name == "bedrock-runtime":
+            return client
+        return create_client(service_name, *client_args, **kwargs)
+
+    def write_stats() -> None:
+        name = os.path.splitext(os.path.basename(script))[0]
+        with open(f"fake_bedrock_{name}.json", "w") as f:
+            json.dump(client.stats(), f)
+
+    atexit.register(write_stats)
+    sys.path.insert(0, os.path.dirname(os.path.realpath(script)))
+    with mock.patch.object(
+        boto3, "client", side_effect=client_factory
+    ), mock.patch.object(sys, "argv", [script] + argv):
+        runpy.run_path(script, run_name="__main__")
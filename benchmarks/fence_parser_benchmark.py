@@ -0,0 +1,86 @@
+"""Micro-benchmark of the fence parser against the former markdown + BeautifulSoup + lxml extraction.
+
+Usage:
+    python benchmarks/fence_parser_benchmark.py [--repeat 200]
+
+The baseline is skipped if markdown, beautifulsoup4 or lxml are not installed.
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "assets", "imagebuild"))
+
+from fence_parser import extract_code  # noqa: E402
+
+CODE = "\n".join(
+    f"    def signal_{i}(self, t):\n        return np.sin(t * {i}) + np.random.normal(0, 0.1, len(t))"
+    for i in range(60)
+)
+RESPONSE = f"""```python
+import numpy as np
+
+
+class Generator:
+{CODE}
+```
+
+<error>
+1. The `main` function is missing.
+</error>
+
+```python
+import numpy as np
+
+
+class Generator:
+{CODE}
+
+
+def main():
+    Generator()
+```
+
+<error>CHECKED: NO ERRORS</error>
+"""
+
+
+def baseline(text: str) -> str:
+    """The former extraction path of DataGeneratorApp.predict_code."""
+    import markdown
+    from bs4 import BeautifulSoup
+
+    html = markdown.markdown(text, extensions=["fenced_code"])
+    soup = BeautifulSoup(html, features="lxml")
+    soup.error.decompose()
+    return soup.find("code").get_text()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {
+        "response_bytes": len(RESPONSE),
+        "fence_parser_ms": timeit.timeit(
+            lambda: extract_code(RESPONSE), number=args.repeat
+        )
+        / args.repeat
+        * 1000,
+    }
+    try:
+        results["baseline_ms"] = (
+            timeit.timeit(lambda: baseline(RESPONSE), number=args.repeat)
+            / args.repeat
+            * 1000
+        )
+        results["speedup"] = (
+            results["baseline_ms"] / results["fence_parser_ms"]
+        )
+    except ImportError as e:
+        results["baseline_skipped"] = str(e)
+    print(json.dumps(results, indent=4))
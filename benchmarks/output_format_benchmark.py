@@ -0,0 +1,147 @@
+"""Benchmark of CSV against partitioned Parquet output for one machine dataset of the signal engine.
+
+Usage:
+    python benchmarks/output_format_benchmark.py [--signals 30] [--periods 525600] [--bucket my-bucket]
+
+Upload times are measured against the given Amazon S3 bucket, without a bucket they are estimated from the file
+sizes at --bandwidth-mb-s.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "assets", "imagebuild"))
+
+import pandas as pd  # noqa: E402
+
+from output_format import convert_csv, to_parquet  # noqa: E402
+from signal_engine import generate_dataset  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def create_spec(signals: int, periods: int) -> dict:
+    """Create a spec with the given number of noisy, seasonal signals."""
+    return {
+        "periods": periods,
+        "seed": 0,
+        "signals": [
+            {
+                "name": f"Signal_{i}",
+                "mean": 50.0 + i,
+                "min": 0.0,
+                "max": 200.0,
+                "noise": 1.0,
+                "drift": 2.0,
+                "seasonality": [{"period_hours": 24, "amplitude": 5.0}],
+                "anomaly_rate": 0.001,
+                "anomaly_magnitude": 20.0,
+            }
+            for i in range(signals)
+        ],
+    }
+
+
+def size_of(path: str) -> int:
+    """Get the size of a file or of all files below a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(dirname, filename))
+        for dirname, _, files in os.walk(path)
+        for filename in files
+    )
+
+
+def timed(function) -> float:
+    """Run a function and return the seconds it took."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def upload(s3_client, bucket: str, path: str, prefix: str) -> float:
+    """Upload a file or all files below a directory and return the seconds it took."""
+    files = (
+        [path]
+        if os.path.isfile(path)
+        else [
+            os.path.join(dirname, filename)
+            for dirname, _, names in os.walk(path)
+            for filename in names
+        ]
+    )
+    start = time.perf_counter()
+    for filename in files:
+        s3_client.upload_file(
+            Filename=filename,
+            Bucket=bucket,
+            Key=f"{prefix}{os.path.relpath(filename, os.path.dirname(path))}",
+        )
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signals", type=int, default=30)
+    parser.add_argument("--periods", type=int, default=525600)
+    parser.add_argument("--bucket", type=str, default=None)
+    parser.add_argument(
+        "--prefix", type=str, default="benchmarks/output-format/"
+    )
+    parser.add_argument("--bandwidth-mb-s", type=float, default=100)
+    args = parser.parse_args()
+
+    df = generate_dataset(
+        create_spec(signals=args.signals, periods=args.periods)
+    )
+    directory = tempfile.mkdtemp()
+    csv_path = os.path.join(directory, "data.csv")
+    parquet_path = os.path.join(directory, "data")
+    try:
+        results = {"rows": len(df), "columns": len(df.columns)}
+        results["csv_write_s"] = timed(
+            lambda: df.to_csv(csv_path, index=False)
+        )
+        results["parquet_write_s"] = timed(
+            lambda: to_parquet(df, directory=parquet_path)
+        )
+        results["csv_mb"] = size_of(csv_path) / MB
+        results["parquet_mb"] = size_of(parquet_path) / MB
+        results["size_ratio"] = results["csv_mb"] / results["parquet_mb"]
+        results["csv_read_s"] = timed(lambda: pd.read_csv(csv_path))
+        results["parquet_read_s"] = timed(
+            lambda: pd.read_parquet(parquet_path)
+        )
+
+        if args.bucket:
+            import boto3
+
+            s3_client = boto3.client("s3")
+            results["csv_upload_s"] = upload(
+                s3_client, args.bucket, csv_path, args.prefix
+            )
+            results["parquet_upload_s"] = upload(
+                s3_client, args.bucket, parquet_path, args.prefix
+            )
+        else:
+            results["csv_upload_s_estimated"] = (
+                results["csv_mb"] / args.bandwidth_mb_s
+            )
+            results["parquet_upload_s_estimated"] = (
+                results["parquet_mb"] / args.bandwidth_mb_s
+            )
+
+        # The runner path for LLM-written scripts, which still write CSV
+        shutil.rmtree(parquet_path)
+        results["csv_to_parquet_convert_s"] = timed(
+            lambda: convert_csv(csv_path, delete=False)
+        )
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps(results, indent=4))
@@ -3,6 +3,7 @@ import os
 from constructs import Construct
 from aws_cdk import Duration, Stack, Size
 from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda_event_sources as event_sources
 
 from utils.config import Config
 from infrastructure.common.lambda_docker_construct import LambdaDockerConstruct
@@ -53,6 +54,8 @@ class APIStack(Stack):
                     "dynamodb:PutItem",
                     "dynamodb:Scan",
                     "dynamodb:GetItem",
+                    "dynamodb:UpdateItem",
+                    "dynamodb:BatchWriteItem",
                 ],
                 resources=[backend.history_table.table_arn],
             ),
@@ -65,6 +68,16 @@ class APIStack(Stack):
                 resources=[
                     backend.s3_kms_key.key_arn,
                     backend.ddb_kms_key.key_arn,
+                    backend.sqs_kms_key.key_arn,
+                ],
+            ),
+            iam.PolicyStatement(
+                actions=[
+                    "sqs:SendMessage",
+                ],
+                resources=[
+                    backend.job_queue.queue_arn,
+                    backend.listing_queue.queue_arn,
                 ],
             ),
             iam.PolicyStatement(
@@ -72,7 +85,10 @@ class APIStack(Stack):
                     "s3:PutObject",
                     "s3:GetObject",
                 ],
-                resources=[backend.code_bucket.bucket_arn],
+                resources=[
+                    backend.code_bucket.bucket_arn,
+                    backend.code_bucket.arn_for_objects("machine_index.json"),
+                ],
             ),
             iam.PolicyStatement(
                 actions=[
@@ -92,16 +108,82 @@ class APIStack(Stack):
             ),
         ]
 
+        environment_variables = {
+            "model_id": "anthropic.claude-v2",
+            "table_name": backend.history_table.table_name,
+            "column_name": config.COLUMN_NAME,
+            "pipeline_name": pipeline.pipeline.pipeline_name,
+            "queue_url": backend.job_queue.queue_url,
+            "listing_queue_url": backend.listing_queue.queue_url,
+            "max_batch_size": str(config.BATCH_SIZE),
+            "handler_mode": config.HANDLER_MODE,
+            "code_bucket": backend.code_bucket.bucket_name,
+            "machine_similarity": str(config.MACHINE_SIMILARITY),
+        }
+
         LambdaDockerConstruct(
             self,
             "async-lambda",
             function_name=f"{construct_id}-async",
-            environment_variables={
-                "model_id": "anthropic.claude-v2",
-                "table_name": backend.history_table.table_name,
-                "column_name": config.COLUMN_NAME,
-                "pipeline_name": pipeline.pipeline.pipeline_name,
-            },
+            environment_variables=environment_variables,
+            kms_key=backend.lambda_kms_key,
+            initial_policy=lambda_policy_list,
+            code_dir=f"{config.CODE_DIR}/async/",
+            timeout=Duration.seconds(config.TIMEOUT),
+            memory_size=config.MEMORY_SIZE,
+            ephemeral_storage_size=Size.mebibytes(
+                config.EMPHEMERAL_STORAGE_SIZE
+            ),
+        ).lambda_function
+
+        # Generate the machine lists of submitted jobs outside of the request
+        # The listing calls the model and writes an item per machine, it runs longer than the API functions
+        listing_function = LambdaDockerConstruct(
+            self,
+            "listing-lambda",
+            function_name=f"{construct_id}-listing",
+            environment_variables=environment_variables,
+            kms_key=backend.lambda_kms_key,
+            initial_policy=lambda_policy_list,
+            code_dir=f"{config.CODE_DIR}/async/",
+            timeout=Duration.seconds(config.LISTING_TIMEOUT),
+            memory_size=config.MEMORY_SIZE,
+            ephemeral_storage_size=Size.mebibytes(
+                config.EMPHEMERAL_STORAGE_SIZE
+            ),
+            cmd=["app.list_machines"],
+        ).lambda_function
+        listing_function.add_event_source(
+            event_sources.SqsEventSource(
+                backend.listing_queue,
+                batch_size=1,
+                report_batch_item_failures=True,
+            )
+        )
+
+        # Report the progress of a job from its status record
+        LambdaDockerConstruct(
+            self,
+            "status-lambda",
+            function_name=f"{construct_id}-status",
+            environment_variables=environment_variables,
+            kms_key=backend.lambda_kms_key,
+            initial_policy=lambda_policy_list,
+            code_dir=f"{config.CODE_DIR}/async/",
+            timeout=Duration.seconds(config.TIMEOUT),
+            memory_size=config.MEMORY_SIZE,
+            ephemeral_storage_size=Size.mebibytes(
+                config.EMPHEMERAL_STORAGE_SIZE
+            ),
+            cmd=["app.status"],
+        )
+
+        # Batch queued jobs into a single pipeline execution
+        dispatch_function = LambdaDockerConstruct(
+            self,
+            "dispatch-lambda",
+            function_name=f"{construct_id}-dispatch",
+            environment_variables=environment_variables,
             kms_key=backend.lambda_kms_key,
             initial_policy=lambda_policy_list,
             code_dir=f"{config.CODE_DIR}/async/",
@@ -110,4 +192,12 @@ class APIStack(Stack):
             ephemeral_storage_size=Size.mebibytes(
                 config.EMPHEMERAL_STORAGE_SIZE
             ),
+            cmd=["app.dispatch"],
         ).lambda_function
+        dispatch_function.add_event_source(
+            event_sources.SqsEventSource(
+                backend.job_queue,
+                batch_size=config.BATCH_SIZE,
+                max_batching_window=Duration.seconds(config.BATCH_WINDOW),
+            )
+        )
@@ -1,4 +1,6 @@
-from aws_cdk import Stack
+import os
+
+from aws_cdk import Duration, Stack
 from constructs import Construct
 
 from infrastructure.common.kms_construct import KMSConstruct
@@ -8,6 +10,8 @@ from infrastructure.common.securitygroup_construct import (
 )
 from infrastructure.common.vpc_construct import VPCConstruct
 from infrastructure.common.dynamodb_construct import DynamoDBConstruct
+from infrastructure.common.sqs_construct import SQSConstruct
+from utils.config import Config
 
 
 class BackendStack(Stack):
@@ -19,6 +23,10 @@ class BackendStack(Stack):
     :ecr_kms_key:           The KMS Key for ECR CDK object
     :codebuild_kms_key:     The KMS Key for CodeBuild CDK object
     :artifact_bucket:       The S3 bucket CDK object
+    :history_table:         The DynamoDB table CDK object
+    :active_index_name:     The sparse index on the pending requests of history_table
+    :job_queue:             The SQS queue buffering job requests until they are dispatched to a build
+    :listing_queue:         The SQS queue buffering submitted requests until their machine list is generated
     """
 
     def __init__(
@@ -72,6 +80,13 @@ class BackendStack(Stack):
             key_alias=f"alias/{construct_id}-lambda",
         ).key
 
+        self.sqs_kms_key = KMSConstruct(
+            self,
+            "kms-sqs",
+            account_id=self.account,
+            key_alias=f"alias/{construct_id}-sqs",
+        ).key
+
         self.code_bucket = S3Construct(
             self,
             "s3-code",
@@ -86,11 +101,39 @@ class BackendStack(Stack):
             kms_key=self.s3_kms_key,
         ).bucket
 
-        self.history_table = DynamoDBConstruct(
+        history_table = DynamoDBConstruct(
             self,
             "dynomdb-table",
             table_name=f"{construct_id}-interaction-history",
             encryption_key=self.ddb_kms_key,
             partition_key="user_id",
+            sort_key="job_id",
             time_to_live_attribute="dttm",
-        ).table
+            index_partition_key="active",
+            index_name="active-index",
+        )
+        self.history_table = history_table.table
+        self.active_index_name = history_table.index_name
+
+        self.job_queue = SQSConstruct(
+            self,
+            "sqs-jobs",
+            queue_name=f"{construct_id}-jobs",
+            kms_key=self.sqs_kms_key,
+        ).queue
+
+        # The listing Lambda of the API stack consumes the queue, a message stays invisible for 6 of its timeouts
+        api_config = Config(
+            path=os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "..", "api"
+            )
+        )
+        self.listing_queue = SQSConstruct(
+            self,
+            "sqs-listing",
+            queue_name=f"{construct_id}-listing",
+            kms_key=self.sqs_kms_key,
+            visibility_timeout=Duration.seconds(
+                6 * api_config.LISTING_TIMEOUT
+            ),
+        ).queue
@@ -11,6 +11,7 @@ class DynamoDBConstruct(Construct):
 
     Attributes:
     :table:       The DynamoDB CDK table
+    :index_name:  The name of the sparse global secondary index
     """
 
     def __init__(
@@ -20,7 +21,10 @@ class DynamoDBConstruct(Construct):
         table_name: str,
         encryption_key: _kms.Key,
         partition_key: str = "name",
+        sort_key: str = None,
         time_to_live_attribute: str = "dttm",
+        index_partition_key: str = None,
+        index_name: str = None,
         **kwargs,
     ) -> None:
         """
@@ -30,7 +34,10 @@ class DynamoDBConstruct(Construct):
             table_name:                 The DDB table name
             encryption_key:             The KMS encryption key
             partition_key:              The name of the partition column
+            sort_key:                   The name of the sort column, no sort key if None
             time_to_live_attribute:     The TTL attribute
+            index_partition_key:        The partition column of a sparse global secondary index, no index if None
+            index_name:                 The name of the sparse global secondary index
 
         Returns:
             None
@@ -44,8 +51,26 @@ class DynamoDBConstruct(Construct):
             partition_key=_dynamodb.Attribute(
                 name=partition_key, type=_dynamodb.AttributeType.STRING
             ),
+            sort_key=_dynamodb.Attribute(
+                name=sort_key, type=_dynamodb.AttributeType.STRING
+            )
+            if sort_key
+            else None,
             encryption=_dynamodb.TableEncryption.CUSTOMER_MANAGED,
             encryption_key=encryption_key,
             removal_policy=cdk.RemovalPolicy.DESTROY,
             time_to_live_attribute=time_to_live_attribute,
         )
+
+        # Only items carrying the index_partition_key are projected into the sparse index
+        self.index_name = None
+        if index_partition_key:
+            self.index_name = index_name or f"{index_partition_key}-index"
+            self.table.add_global_secondary_index(
+                index_name=self.index_name,
+                partition_key=_dynamodb.Attribute(
+                    name=index_partition_key,
+                    type=_dynamodb.AttributeType.STRING,
+                ),
+                projection_type=_dynamodb.ProjectionType.ALL,
+            )
@@ -26,6 +26,7 @@ class LambdaDockerConstruct(Construct):
         timeout: Duration = Duration.seconds(15),
         memory_size: int = 256,
         ephemeral_storage_size: Size = Size.mebibytes(256),
+        cmd: List[str] = None,
         **kwargs,
     ) -> None:
         """Initialize class
@@ -39,6 +40,7 @@ class LambdaDockerConstruct(Construct):
             handler:                The entry Lambda handler path
             timeout:                The number of minutes for timeout
             memory_size:            The memory size in MB
+            cmd:                    The handler overriding the image CMD, e.g. ["app.dispatch"]
 
         Returns:
             None
@@ -51,7 +53,7 @@ class LambdaDockerConstruct(Construct):
             function_name=function_name,
             description="AWS Lambda function for Langchain",
             code=lambda_func.DockerImageCode.from_image_asset(
-                f"assets/{code_dir}"
+                f"assets/{code_dir}", cmd=cmd
             ),
             timeout=timeout,
             memory_size=memory_size,
@@ -0,0 +1,61 @@
+from aws_cdk import Duration
+from aws_cdk import aws_kms as kms
+from aws_cdk import aws_sqs as sqs
+from constructs import Construct
+
+
+class SQSConstruct(Construct):
+    """SQSConstruct class to construct an SQS queue with a dead-letter queue.
+
+    Attributes:
+    :queue:                 The SQS queue CDK object
+    :dead_letter_queue:     The SQS dead-letter queue CDK object
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        queue_name: str,
+        kms_key: kms.Key,
+        visibility_timeout: Duration = Duration.minutes(6),
+        max_receive_count: int = 3,
+        **kwargs,
+    ) -> None:
+        """
+        Args:
+            scope:                  The app construct
+            construct_id:           The name of the stack
+            queue_name:             The SQS queue name
+            kms_key:                The KMS key CDK object
+            visibility_timeout:     The visibility timeout, at least the timeout of the consumer
+            max_receive_count:      The number of receives before a message is moved to the dead-letter queue
+
+        Returns:
+            None
+        """
+        super().__init__(scope, construct_id, **kwargs)
+
+        self.dead_letter_queue = sqs.Queue(
+            self,
+            "dead-letter-queue",
+            queue_name=f"{queue_name}-dlq",
+            encryption=sqs.QueueEncryption.KMS,
+            encryption_master_key=kms_key,
+            enforce_ssl=True,
+            retention_period=Duration.days(14),
+        )
+
+        self.queue = sqs.Queue(
+            self,
+            "queue",
+            queue_name=queue_name,
+            encryption=sqs.QueueEncryption.KMS,
+            encryption_master_key=kms_key,
+            enforce_ssl=True,
+            visibility_timeout=visibility_timeout,
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=max_receive_count,
+                queue=self.dead_letter_queue,
+            ),
+        )
@@ -62,8 +62,13 @@ class ImagebuildStack(Stack):
                                 "dynamodb:PutItem",
                                 "dynamodb:Scan",
                                 "dynamodb:GetItem",
+                                "dynamodb:Query",
+                                "dynamodb:UpdateItem",
+                            ],
+                            resources=[
+                                backend.history_table.table_arn,
+                                f"{backend.history_table.table_arn}/index/*",
                             ],
-                            resources=[backend.history_table.table_arn],
                         ),
                         iam.PolicyStatement(
                             actions=[
@@ -82,10 +87,22 @@ class ImagebuildStack(Stack):
                             ],
                             resources=["*"],
                         ),
+                        # The coordinator of a sharded build starts one build of the project per shard
+                        iam.PolicyStatement(
+                            actions=[
+                                "codebuild:StartBuild",
+                                "codebuild:BatchGetBuilds",
+                            ],
+                            resources=[
+                                f"arn:aws:codebuild:{self.region}:{self.account}:project/{Environment.PROJECT_NAME}-{image_type}-run",
+                            ],
+                        ),
                         iam.PolicyStatement(
                             actions=[
                                 "s3:PutObject",
                                 "s3:GetObject",
+                                "s3:DeleteObject",
+                                "s3:ListBucket",
                                 "s3:CreateMultipartUpload",
                                 "s3:ListMultipartUploadParts",
                                 "s3:AbortMultipartUpload",
@@ -113,6 +130,38 @@ class ImagebuildStack(Stack):
             },
         )
 
+        # The service role of batch inference jobs reading prompts from and writing completions to the code bucket
+        batch_inference_role = iam.Role(
+            self,
+            "batch-inference-role",
+            assumed_by=iam.ServicePrincipal("bedrock.amazonaws.com"),
+            inline_policies={
+                "batch-inference-inline": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            actions=[
+                                "s3:GetObject",
+                                "s3:PutObject",
+                                "s3:ListBucket",
+                            ],
+                            resources=[
+                                backend.code_bucket.bucket_arn,
+                                backend.code_bucket.bucket_arn + "/*",
+                            ],
+                        ),
+                        iam.PolicyStatement(
+                            actions=[
+                                "kms:Decrypt",
+                                "kms:Encrypt",
+                                "kms:GenerateDataKey",
+                            ],
+                            resources=[backend.s3_kms_key.key_arn],
+                        ),
+                    ]
+                ),
+            },
+        )
+
         # Add more service principals the IAM role can assume
         codebuild_role.assume_role_policy.add_statements(
             iam.PolicyStatement(
@@ -150,9 +199,30 @@ class ImagebuildStack(Stack):
                 "COLUMN_NAME": codebuild.BuildEnvironmentVariable(
                     value=config.COLUMN_NAME
                 ),
+                "INDEX_NAME": codebuild.BuildEnvironmentVariable(
+                    value=backend.active_index_name
+                ),
                 "MODEL_ID": codebuild.BuildEnvironmentVariable(
                     value=config.MODEL_ID
                 ),
+                "GENERATION_MODE": codebuild.BuildEnvironmentVariable(
+                    value=config.GENERATION_MODE
+                ),
+                "OUTPUT_FORMAT": codebuild.BuildEnvironmentVariable(
+                    value=config.OUTPUT_FORMAT
+                ),
+                "BATCH_INFERENCE_THRESHOLD": codebuild.BuildEnvironmentVariable(
+                    value=str(config.BATCH_INFERENCE_THRESHOLD)
+                ),
+                "BATCH_ROLE_ARN": codebuild.BuildEnvironmentVariable(
+                    value=batch_inference_role.role_arn
+                ),
+                "SHARD_COUNT": codebuild.BuildEnvironmentVariable(
+                    value=str(config.SHARD_COUNT)
+                ),
+                "BUILD_TIMEOUT_HOURS": codebuild.BuildEnvironmentVariable(
+                    value=str(config.TIMEOUT)
+                ),
             },
             repository=repository,
             kms_key=backend.codebuild_kms_key,
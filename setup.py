@@ -21,7 +21,8 @@ setup(
         "cdk-nag",
         "checkov",
         "cfn-lint",
+        "moto[dynamodb,s3,sqs]>=5.0",
     ],
-    tests_require=["pytest"],
+    tests_require=["pytest", "moto[dynamodb,s3,sqs]>=5.0"],
     packages=["infrastructure"],
 )
@@ -33,6 +33,17 @@ def test_s3_resources():
         env=ENV,
     )
     template = cdk.assertions.Template.from_stack(api)
-    template.resource_count_is("AWS::IAM::Policy", 1)
-    template.resource_count_is("AWS::IAM::Role", 1)
-    template.resource_count_is("AWS::Lambda::Function", 1)
+    template.resource_count_is("AWS::IAM::Policy", 4)
+    template.resource_count_is("AWS::IAM::Role", 4)
+    template.resource_count_is("AWS::Lambda::Function", 4)
+    template.resource_count_is("AWS::Lambda::EventSourceMapping", 2)
+    # A failing listing message is delivered again on its own
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {"BatchSize": 1, "FunctionResponseTypes": ["ReportBatchItemFailures"]},
+    )
+    # The listing runs longer than the other functions
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {"FunctionName": "api-listing", "Timeout": 300},
+    )
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import boto3
+import pytest
+import importlib.util
+
+from unittest import mock
+from moto import mock_aws
+
+API = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "apis",
+    "async",
+)
+sys.path.insert(0, API)
+
+TABLE_NAME = "jobs"
+
+
+class FakeGenerator:
+    def __init__(self, names):
+        self.names = names
+        self.calls = 0
+
+    def predict_list(self, number, industry):
+        self.calls += 1
+        if isinstance(self.names, Exception):
+            raise self.names
+        return self.names
+
+
+@pytest.fixture
+def app(monkeypatch):
+    with mock_aws():
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        dynamodb_client = boto3.client("dynamodb")
+        dynamodb_client.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {"AttributeName": "user_id", "KeyType": "HASH"},
+                {"AttributeName": "job_id", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "job_id", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        sqs_client = boto3.client("sqs")
+        for variable, name in [
+            ("queue_url", "jobs"),
+            ("listing_queue_url", "listing"),
+        ]:
+            monkeypatch.setenv(
+                variable, sqs_client.create_queue(QueueName=name)["QueueUrl"]
+            )
+        monkeypatch.setenv("table_name", TABLE_NAME)
+        monkeypatch.setenv("column_name", "active")
+        monkeypatch.delenv("code_bucket", raising=False)
+        # The CDK app of the repository root is called app too
+        spec = importlib.util.spec_from_file_location(
+            "async_app", os.path.join(API, "app.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+
+
+def submit(app, number=2):
+    response = json.loads(
+        app.index(
+            {"number": number, "user_id": "user", "industry": "automotive"},
+            None,
+        )
+    )
+    job_id = response["body"]["job_id"]
+    _, message = app.listing_queue.receive()[0]
+    return job_id, {"messageId": job_id, "body": json.dumps(message)}
+
+
+def get_job(app, job_id):
+    return app.table.get_item(Key={"user_id": "user", "job_id": job_id})[
+        "Item"
+    ]
+
+
+def test_lists_a_submitted_job_once(app):
+    job_id, record = submit(app)
+    generator = FakeGenerator(["Lathe", "Press"])
+
+    with mock.patch.object(
+        app, "get_generator", return_value=(generator, False)
+    ):
+        assert app.list_machines({"Records": [record]}, None) == {
+            "batchItemFailures": []
+        }
+        # A message delivered again does not list the job again
+        assert app.list_machines({"Records": [record]}, None) == {
+            "batchItemFailures": []
+        }
+
+    assert generator.calls == 1
+    job = get_job(app, job_id)
+    assert job["job_status"] == "listed"
+    assert job["machine_count"] == 2
+    assert len(app.job_queue.receive()) == 1
+
+
+def test_failed_listing_marks_the_job_failed(app):
+    job_id, record = submit(app)
+    generator = FakeGenerator(ValueError("no list"))
+
+    with mock.patch.object(
+        app, "get_generator", return_value=(generator, False)
+    ):
+        assert app.list_machines({"Records": [record]}, None) == {
+            "batchItemFailures": []
+        }
+
+    job = get_job(app, job_id)
+    assert job["job_status"] == "failed"
+    assert job["job_error"] == "no list"
+    assert "active" not in job
+
+
+def test_reports_failed_messages(app):
+    job_id, record = submit(app)
+    generator = FakeGenerator(["Lathe"])
+    records = [{"messageId": "broken", "body": "{"}, record]
+
+    with mock.patch.object(
+        app, "get_generator", return_value=(generator, False)
+    ):
+        response = app.list_machines({"Records": records}, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "broken"}]}
+    assert get_job(app, job_id)["job_status"] == "listed"
+
+
+def test_deleted_job_is_not_listed(app):
+    job_id, record = submit(app)
+    app.table.delete_item(Key={"user_id": "user", "job_id": job_id})
+    generator = FakeGenerator(["Lathe"])
+
+    with mock.patch.object(
+        app, "get_generator", return_value=(generator, False)
+    ):
+        app.list_machines({"Records": [record]}, None)
+
+    assert generator.calls == 0
+    assert "Item" not in app.table.get_item(
+        Key={"user_id": "user", "job_id": job_id}
+    )
+    assert app.job_queue.receive() == []
+
+
+def test_job_changed_while_listing_is_not_overwritten(app):
+    job_id, record = submit(app)
+
+    def predict_list(number, industry):
+        # Another delivery of the message listed the job meanwhile
+        app.table.update_item(
+            Key={"user_id": "user", "job_id": job_id},
+            UpdateExpression="SET job_status = :status",
+            ExpressionAttributeValues={":status": "building"},
+        )
+        return ["Lathe"]
+
+    generator = mock.Mock(predict_list=predict_list)
+    with mock.patch.object(
+        app, "get_generator", return_value=(generator, False)
+    ):
+        app.list_machines({"Records": [record]}, None)
+
+    assert get_job(app, job_id)["job_status"] == "building"
+    assert app.job_queue.receive() == []
@@ -17,8 +17,8 @@ def test_s3_resources():
         env=ENV,
     )
     template = cdk.assertions.Template.from_stack(backend)
-    template.resource_count_is("AWS::KMS::Key", 4)
-    template.resource_count_is("AWS::KMS::Alias", 4)
+    template.resource_count_is("AWS::KMS::Key", 5)
+    template.resource_count_is("AWS::KMS::Alias", 5)
     template.resource_count_is("AWS::S3::Bucket", 2)
     template.resource_count_is("AWS::S3::BucketPolicy", 2)
     template.resource_count_is("AWS::EC2::EIP", 2)
@@ -36,3 +36,30 @@ def test_s3_resources():
     template.resource_count_is("AWS::IAM::Policy", 2)
     template.resource_count_is("AWS::IAM::Role", 2)
     template.resource_count_is("AWS::Logs::LogGroup", 2)
+    template.resource_count_is("AWS::SQS::Queue", 4)
+    template.resource_count_is("AWS::SQS::QueuePolicy", 4)
+    # A listing message stays invisible for 6 timeouts of the listing Lambda
+    template.has_resource_properties(
+        "AWS::SQS::Queue",
+        {"QueueName": "backend-listing", "VisibilityTimeout": 1800},
+    )
+    template.resource_count_is("AWS::DynamoDB::Table", 1)
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "KeySchema": [
+                {"AttributeName": "user_id", "KeyType": "HASH"},
+                {"AttributeName": "job_id", "KeyType": "RANGE"},
+            ],
+            "GlobalSecondaryIndexes": [
+                cdk.assertions.Match.object_like(
+                    {
+                        "IndexName": "active-index",
+                        "KeySchema": [
+                            {"AttributeName": "active", "KeyType": "HASH"}
+                        ],
+                    }
+                )
+            ],
+        },
+    )
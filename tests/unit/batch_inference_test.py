@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import pytest
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from batch_inference import (  # noqa: E402
+    BatchBackend,
+    BedrockBatchBackend,
+    LocalBatchBackend,
+)
+
+
+class FakeRuntimeClient:
+    def __init__(self):
+        self.requests = []
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        prompt = json.loads(body)["prompt"]
+        self.requests.append((modelId, prompt))
+        if prompt == "throttled":
+            raise RuntimeError("ThrottlingException")
+        completion = json.dumps({"completion": prompt.upper()})
+        return {"body": io.BytesIO(completion.encode("utf-8"))}
+
+
+def test_local_backend_returns_the_output_per_record():
+    client = FakeRuntimeClient()
+    backend = LocalBatchBackend(runtime_client=client, model_id="model")
+
+    outputs = backend.run(
+        {
+            "00000000000": {"prompt": "lathe"},
+            "00000000001": {"prompt": "throttled"},
+            "00000000002": {"prompt": "press"},
+        }
+    )
+
+    # Failed records are left out
+    assert outputs == {
+        "00000000000": {"completion": "LATHE"},
+        "00000000002": {"completion": "PRESS"},
+    }
+    assert client.requests == [
+        ("model", "lathe"),
+        ("model", "throttled"),
+        ("model", "press"),
+    ]
+
+
+def test_empty_batch():
+    backend = LocalBatchBackend(
+        runtime_client=FakeRuntimeClient(), model_id="model"
+    )
+    assert backend.run({}) == {}
+
+
+def test_backend_requires_process():
+    with pytest.raises(TypeError):
+        BatchBackend()
+
+
+class FakeBedrockClient:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.submitted = []
+        self.stopped = []
+
+    def create_model_invocation_job(self, **kwargs):
+        self.submitted.append(kwargs)
+        return {
+            "jobArn": "arn:aws:bedrock:us-east-1:1:model-invocation-job/new"
+        }
+
+    def get_model_invocation_job(self, jobIdentifier):
+        return {
+            "status": self.statuses.pop(0),
+            "outputDataConfig": {
+                "s3OutputDataConfig": {
+                    "s3Uri": "s3://bucket/batch/job/output/"
+                }
+            },
+        }
+
+    def stop_model_invocation_job(self, jobIdentifier):
+        self.stopped.append(jobIdentifier)
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.uploads = []
+        self.downloads = []
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.uploads.append(Key)
+
+    def download_file(self, Bucket, Key, Filename):
+        self.downloads.append((Bucket, Key))
+        with open(Filename, "w") as f:
+            record = {"recordId": "a", "modelOutput": {"completion": "x"}}
+            f.write(json.dumps(record) + "\n")
+
+
+def create_bedrock_backend(bedrock_client, s3_client, **kwargs):
+    return BedrockBatchBackend(
+        bedrock_client=bedrock_client,
+        s3_client=s3_client,
+        bucket="bucket",
+        role_arn="role",
+        model_id="model",
+        poll_interval=0,
+        **kwargs,
+    )
+
+
+def test_bedrock_backend_reports_the_submitted_job():
+    bedrock_client = FakeBedrockClient(["InProgress", "Completed"])
+    s3_client = FakeS3Client()
+    submitted = []
+    backend = create_bedrock_backend(
+        bedrock_client, s3_client, on_submit=submitted.append
+    )
+    assert backend.min_records == 100
+
+    outputs = backend.run({"a": {"prompt": "lathe"}})
+
+    assert outputs == {"a": {"completion": "x"}}
+    assert len(bedrock_client.submitted) == 1
+    assert submitted == [backend.job_arn]
+    assert s3_client.downloads == [
+        ("bucket", "batch/job/output/new/records.jsonl.out")
+    ]
+
+
+def test_bedrock_backend_resumes_a_job():
+    bedrock_client = FakeBedrockClient(["Completed"])
+    s3_client = FakeS3Client()
+    backend = create_bedrock_backend(
+        bedrock_client,
+        s3_client,
+        job_arn="arn:aws:bedrock:us-east-1:1:model-invocation-job/old",
+    )
+    # The resumed job is paid for, any batch size reads it
+    assert backend.min_records == 1
+
+    # Records the job lacks are left out
+    outputs = backend.run({"a": {"prompt": "lathe"}, "b": {"prompt": "press"}})
+
+    assert outputs == {"a": {"completion": "x"}}
+    assert bedrock_client.submitted == []
+    assert s3_client.uploads == []
+    assert s3_client.downloads == [
+        ("bucket", "batch/job/output/old/records.jsonl.out")
+    ]
+
+
+def test_bedrock_backend_stops_a_job_after_the_timeout():
+    bedrock_client = FakeBedrockClient(["InProgress"] * 2)
+    backend = create_bedrock_backend(bedrock_client, FakeS3Client(), timeout=0)
+
+    with pytest.raises(TimeoutError):
+        backend.run({"a": {"prompt": "lathe"}})
+    assert bedrock_client.stopped == [backend.job_arn]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import os
+import pytest
+import importlib.util
+
+from unittest import mock
+from botocore.exceptions import ClientError, EventStreamError
+
+ASSETS = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "..", "assets"
+)
+# The build and the Lambda ship their own copy of the scheduler
+COPIES = {
+    "imagebuild": os.path.join(ASSETS, "imagebuild", "bedrock_scheduler.py"),
+    "async": os.path.join(ASSETS, "apis", "async", "bedrock_scheduler.py"),
+}
+
+
+def client_error(code, cls=ClientError):
+    return cls({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+@pytest.fixture(params=sorted(COPIES))
+def bedrock_scheduler(request):
+    spec = importlib.util.spec_from_file_location(
+        f"{request.param}_bedrock_scheduler", COPIES[request.param]
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_is_throttling_error(bedrock_scheduler):
+    is_throttling_error = bedrock_scheduler.is_throttling_error
+    assert is_throttling_error(client_error("ThrottlingException"))
+    assert is_throttling_error(client_error("ServiceUnavailableException"))
+    # Errors of the response stream
+    assert is_throttling_error(
+        client_error("throttlingException", EventStreamError)
+    )
+    assert is_throttling_error(
+        client_error("serviceUnavailableException", EventStreamError)
+    )
+    assert not is_throttling_error(client_error("ValidationException"))
+    assert not is_throttling_error(ValueError("no response"))
+
+    # LangChain wraps the botocore error
+    try:
+        try:
+            raise client_error("ThrottlingException")
+        except ClientError as e:
+            raise ValueError("Error raised by bedrock service") from e
+    except ValueError as e:
+        assert is_throttling_error(e)
+
+
+def test_retries_throttled_requests(bedrock_scheduler):
+    scheduler = bedrock_scheduler.BedrockScheduler(
+        requests_per_minute=6000,
+        base_delay=0.001,
+        max_concurrency=4,
+        max_retries=3,
+    )
+    request = mock.Mock(
+        side_effect=[
+            client_error("throttlingException", EventStreamError),
+            client_error("ThrottlingException"),
+            "completion",
+        ]
+    )
+
+    assert scheduler.call(request) == "completion"
+    metrics = scheduler.metrics()
+    assert request.call_count == 3
+    assert metrics["requests"] == 3
+    assert metrics["throttles"] == 2
+    assert metrics["retries"] == 2
+    assert metrics["failures"] == 0
+    assert metrics["in_flight"] == 0
+
+
+def test_concurrency_is_halved_on_throttling(bedrock_scheduler):
+    scheduler = bedrock_scheduler.BedrockScheduler(
+        requests_per_minute=6000,
+        base_delay=0.001,
+        max_concurrency=8,
+        max_retries=2,
+    )
+    request = mock.Mock(
+        side_effect=[client_error("ThrottlingException")] * 2 + ["ok"]
+    )
+    scheduler.call(request)
+    assert 2 <= scheduler.concurrency < 3
+
+    scheduler.call(lambda: "ok")
+    assert scheduler.concurrency > 2
+
+
+def test_gives_up_after_max_retries(bedrock_scheduler):
+    scheduler = bedrock_scheduler.BedrockScheduler(
+        requests_per_minute=6000, base_delay=0.001, max_retries=2
+    )
+    request = mock.Mock(side_effect=client_error("ThrottlingException"))
+
+    with pytest.raises(ClientError):
+        scheduler.call(request)
+    assert request.call_count == 3
+    assert scheduler.metrics()["failures"] == 1
+
+
+def test_does_not_retry_other_errors(bedrock_scheduler):
+    scheduler = bedrock_scheduler.BedrockScheduler(
+        requests_per_minute=6000, base_delay=0.001
+    )
+    request = mock.Mock(side_effect=client_error("ValidationException"))
+
+    with pytest.raises(ClientError):
+        scheduler.call(request)
+    assert request.call_count == 1
+    assert scheduler.metrics()["retries"] == 0
+
+
+def test_backoff_is_capped(bedrock_scheduler):
+    scheduler = bedrock_scheduler.BedrockScheduler(
+        base_delay=1.0, max_delay=5.0
+    )
+    for attempt in range(10):
+        assert 0 <= scheduler._backoff(attempt) <= min(5.0, 2**attempt)
+
+
+def test_token_bucket_waits_for_refill(bedrock_scheduler):
+    bucket = bedrock_scheduler.TokenBucket(per_minute=6000, capacity=1)
+    assert bucket.acquire() == 0
+    # The next token is refilled after 10 ms
+    waited = bucket.acquire()
+    assert 0 < waited <= 0.01
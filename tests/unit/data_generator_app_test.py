@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import pytest
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from batch_inference import BatchBackend  # noqa: E402
+from data_generator_app import DataGeneratorApp  # noqa: E402
+from generation_cache import GenerationCache, LocalCacheBackend  # noqa: E402
+
+
+class FakeRuntimeClient:
+    def __init__(self, completion):
+        self.completion = completion
+        self.prompts = []
+
+    def invoke_model(self, body, modelId, accept, contentType, **kwargs):
+        self.prompts.append(json.loads(body)["prompt"])
+        completion = json.dumps({"completion": self.completion})
+        return {"body": io.BytesIO(completion.encode("utf-8"))}
+
+
+@pytest.mark.parametrize("memory", ["window", "summary"])
+def test_predict_with_conversation_memory(memory):
+    client = FakeRuntimeClient("```python\nprint('lathe')\n```")
+    app = DataGeneratorApp(
+        model_id="anthropic.claude-v2",
+        streaming=False,
+        callbacks=[],
+        model_kwargs={"max_tokens_to_sample": 100},
+        verbose=False,
+        client=client,
+        memory=memory,
+        max_token_limit=2000,
+    )
+    kwargs = {
+        "context": "automotive",
+        "language": "python",
+        "interval": "1 minute",
+        "span": "1 day",
+    }
+
+    # The memory counts tokens without the anthropic package
+    for machine in ["Lathe", "Press"]:
+        assert app.predict_code(question=machine, **kwargs) == (
+            "print('lathe')\n"
+        )
+    # The second prompt holds the first turn
+    assert len(client.prompts) == 2
+    assert "Lathe" in client.prompts[1]
+    assert app.get_llm().get_num_tokens("x" * 40) == 10
+
+
+class RecordingBackend(BatchBackend):
+    min_records = 2
+
+    def __init__(self):
+        self.batches = []
+
+    def _process(self, input_path, directory):
+        self.batches.append([])
+        output_path = os.path.join(directory, "records.jsonl.out")
+        with open(input_path, "r") as f, open(output_path, "w") as out:
+            for line in f:
+                record = json.loads(line)
+                self.batches[-1].append(record["recordId"])
+                record["modelOutput"] = {"completion": "```python\n```"}
+                out.write(json.dumps(record) + "\n")
+        return output_path
+
+
+@pytest.mark.parametrize(
+    "machines, min_records, batches",
+    [
+        # Duplicates are sent once, below the minimum of the backend
+        (["Lathe", "Lathe"], 1, 0),
+        (["Lathe", "Press"], 1, 1),
+        (["Lathe", "Press"], 3, 0),
+    ],
+)
+def test_predict_batch_counts_the_submitted_records(
+    tmp_path, machines, min_records, batches
+):
+    app = DataGeneratorApp(
+        model_id="anthropic.claude-v2",
+        streaming=False,
+        callbacks=[],
+        model_kwargs={"max_tokens_to_sample": 100},
+        verbose=False,
+        client=FakeRuntimeClient(""),
+        cache=GenerationCache(LocalCacheBackend(str(tmp_path))),
+    )
+    backend = RecordingBackend()
+    kwargs = {
+        "context": "automotive",
+        "language": "python",
+        "interval": "1 minute",
+        "span": "1 day",
+    }
+
+    outputs = app.predict_batch(
+        [{"question": machine, **kwargs} for machine in machines],
+        backend=backend,
+        min_records=min_records,
+    )
+
+    assert len(backend.batches) == batches
+    # Prompts without a job are generated on-demand
+    assert outputs == [("```python\n```" if batches else None)] * len(machines)
+
+
+def test_predict_batch_record_ids_do_not_depend_on_the_order():
+    app = DataGeneratorApp(
+        model_id="anthropic.claude-v2",
+        streaming=False,
+        callbacks=[],
+        model_kwargs={"max_tokens_to_sample": 100},
+        verbose=False,
+        client=FakeRuntimeClient(""),
+    )
+    backend = RecordingBackend()
+    kwargs = {
+        "context": "automotive",
+        "language": "python",
+        "interval": "1 minute",
+        "span": "1 day",
+    }
+
+    # A job resumed by a later build maps its records to the same machines
+    for machines in [["Lathe", "Press"], ["Press", "Oven", "Lathe"]]:
+        app.predict_batch(
+            [{"question": machine, **kwargs} for machine in machines],
+            backend=backend,
+        )
+    first, second = backend.batches
+    assert first == [second[2], second[0]]
+    assert all(len(record_id) == 11 for record_id in second)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import os
+import pytest
+import importlib.util
+
+ASSETS = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "..", "assets"
+)
+# The build and the Lambda ship their own copy of the parser
+COPIES = {
+    "imagebuild": os.path.join(ASSETS, "imagebuild", "fence_parser.py"),
+    "async": os.path.join(ASSETS, "apis", "async", "fence_parser.py"),
+}
+
+RESPONSE = """Here is the script:
+```python
+import math
+print(math.pi)
+```
+<error>
+```python
+print("not this")
+```
+</error>
+Corrected:
+```
+print("last")
+```
+"""
+
+
+@pytest.fixture(params=sorted(COPIES))
+def fence_parser(request):
+    spec = importlib.util.spec_from_file_location(
+        f"{request.param}_fence_parser", COPIES[request.param]
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_extract_blocks_skips_errors(fence_parser):
+    assert fence_parser.extract_blocks(RESPONSE) == [
+        "import math\nprint(math.pi)\n",
+        'print("last")\n',
+    ]
+    assert fence_parser.extract_code(RESPONSE) == 'print("last")\n'
+
+
+def test_unterminated_fence_is_closed(fence_parser):
+    assert fence_parser.extract_code("```\n1. Lathe\n2. Press") == (
+        "1. Lathe\n2. Press\n"
+    )
+
+
+def test_missing_fence_raises(fence_parser):
+    with pytest.raises(ValueError):
+        fence_parser.extract_code("no code here")
+
+
+def test_streamed_chunks_match_single_pass(fence_parser):
+    parser = fence_parser.StreamingFenceParser()
+    completed = []
+    for i in range(0, len(RESPONSE), 7):
+        completed.extend(parser.feed(RESPONSE[i : i + 7]))
+    completed.extend(parser.close())
+    assert completed == fence_parser.extract_blocks(RESPONSE)
+
+
+def test_self_check_marks_the_block_as_checked(fence_parser):
+    parser = fence_parser.StreamingFenceParser()
+    parser.feed("```\nprint(1)\n```\n<error>\n")
+    assert not parser.checked
+    parser.feed("NO ERRORS\n</error>\n")
+    assert parser.checked
+    assert parser.errors == ["\nNO ERRORS\n"]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import boto3
+
+from unittest import mock
+from moto import mock_aws
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from generation_cache import (  # noqa: E402
+    GenerationCache,
+    LocalCacheBackend,
+    S3CacheBackend,
+    create_cache_key,
+)
+
+
+def test_cache_key_depends_on_every_input():
+    key = create_cache_key("model", {"temperature": 0}, "prompt", "lathe")
+    assert key == create_cache_key(
+        "model", {"temperature": 0}, "prompt", "lathe"
+    )
+    assert key != create_cache_key(
+        "model", {"temperature": 0}, "prompt", "press"
+    )
+    assert key != create_cache_key(
+        "model", {"temperature": 1}, "prompt", "lathe"
+    )
+
+
+def test_hits_and_misses(tmp_path):
+    cache = GenerationCache(LocalCacheBackend(str(tmp_path)))
+    assert cache.get("a") is None
+    cache.put("a", "print('a')")
+    assert cache.get("a") == "print('a')"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "entries": 1,
+    }
+
+
+def test_evicts_least_recently_used(tmp_path):
+    backend = LocalCacheBackend(str(tmp_path))
+    cache = GenerationCache(backend, max_entries=2)
+    cache.put("a", "a")
+    cache.put("b", "b")
+    # Reading a makes b the least recently used entry
+    assert cache.get("a") == "a"
+    cache.put("c", "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+    assert backend.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expires_entries_after_ttl(tmp_path):
+    backend = LocalCacheBackend(str(tmp_path))
+    cache = GenerationCache(backend, ttl=60)
+    with mock.patch("time.time", return_value=1000):
+        cache.put("a", "a")
+    with mock.patch("time.time", return_value=1059):
+        assert cache.contains("a")
+        assert cache.get("a") == "a"
+    with mock.patch("time.time", return_value=1061):
+        assert not cache.contains("a")
+        assert cache.get("a") is None
+    assert backend.get("a") is None
+
+
+def test_loads_entries_of_the_backend(tmp_path):
+    GenerationCache(LocalCacheBackend(str(tmp_path))).put("a", "a")
+    cache = GenerationCache(LocalCacheBackend(str(tmp_path)))
+    assert cache.contains("a")
+    assert cache.get("a") == "a"
+
+
+@mock_aws
+def test_s3_backend():
+    s3_client = boto3.client("s3", region_name="us-east-1")
+    s3_client.create_bucket(Bucket="code")
+    backend = S3CacheBackend(s3_client=s3_client, bucket="code")
+    cache = GenerationCache(backend, max_entries=1)
+    cache.put("a", "a")
+    cache.put("b", "b")
+
+    assert set(backend.list()) == {"b"}
+    assert backend.get("a") is None
+    assert GenerationCache(backend).get("b") == "b"
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from generation_engine import GenerationEngine  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+
+class FakeApp:
+    """Returns the scripts in order and records the calls of the engine."""
+
+    def __init__(self, scripts=None, blocks=None):
+        self.scripts = list(scripts or [])
+        self.blocks = blocks or []
+        self.cache = None
+        self.conversation = None
+        self.generation_mode = "script"
+        self.metrics = Metrics()
+        self.calls = []
+        self.writes = []
+        self.threads = set()
+
+    def predict_code(
+        self, on_block, validate, use_cache, completion, **kwargs
+    ):
+        self.threads.add(threading.get_ident())
+        self.calls.append(
+            {"use_cache": use_cache, "early": on_block is not None, **kwargs}
+        )
+        if on_block is not None:
+            for block in self.blocks:
+                on_block(block)
+        code = self.scripts.pop(0) if self.scripts else "print(1)"
+        if isinstance(code, Exception):
+            raise code
+        if validate is not None:
+            validate(code)
+        return code
+
+    def write_parsed_code(self, code, dir):
+        self.writes.append((dir, code))
+
+
+class FakeValidator:
+    def validate(self, code, **time_axis):
+        if "broken" in code:
+            return {"status": "failed", "error": "broken"}
+        return {"status": "passed", "error": None}
+
+
+def create_engine(app, validator=None, on_result=None, **kwargs):
+    return GenerationEngine(
+        app_factory=lambda: app,
+        on_result=on_result or (lambda machine, directory: None),
+        validator=validator,
+        **kwargs,
+    )
+
+
+def test_regenerates_scripts_failing_the_validation(tmp_path):
+    app = FakeApp(scripts=["broken()", "print('fixed')"])
+    engine = create_engine(app, validator=FakeValidator(), max_attempts=3)
+
+    [result] = engine.generate(["Lathe"], output_dir=str(tmp_path))
+    engine.close()
+
+    assert result["status"] == "succeeded"
+    assert result["attempts"] == 2
+    assert [report["status"] for report in result["validation"]] == [
+        "failed",
+        "passed",
+    ]
+    # Only the first attempt reads the cache
+    assert [call["use_cache"] for call in app.calls] == [True, False]
+    assert app.writes == [(str(tmp_path / "lathe"), "print('fixed')")]
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    app = FakeApp(scripts=["broken()"] * 3)
+    engine = create_engine(app, validator=FakeValidator(), max_attempts=2)
+
+    [result] = engine.generate(["Lathe"], output_dir=str(tmp_path))
+    engine.close()
+
+    assert result["status"] == "failed"
+    assert result["error"] == "Validation failed: broken"
+    assert len(app.calls) == 2
+    assert app.writes == []
+
+
+def test_does_not_retry_without_validator(tmp_path):
+    app = FakeApp(scripts=[ValueError("malformed spec"), "print(1)"])
+    engine = create_engine(app, max_attempts=3)
+
+    [result] = engine.generate(["Lathe"], output_dir=str(tmp_path))
+    engine.close()
+
+    assert result["status"] == "failed"
+    assert result["error"] == "malformed spec"
+    assert len(app.calls) == 1
+
+
+def test_every_worker_thread_reuses_its_app(tmp_path):
+    apps = []
+    lock = threading.Lock()
+
+    def app_factory():
+        with lock:
+            apps.append(FakeApp())
+            return apps[-1]
+
+    engine = GenerationEngine(
+        app_factory=app_factory,
+        on_result=lambda machine, directory: None,
+        max_concurrency=2,
+    )
+    machines = [f"Machine {i}" for i in range(20)]
+    results = engine.generate(machines, output_dir=str(tmp_path))
+    results += engine.generate(machines, output_dir=str(tmp_path))
+    engine.close()
+
+    assert len(results) == 40
+    assert all(result["status"] == "succeeded" for result in results)
+    assert 1 <= len(apps) <= 2
+    assert sum(len(app.calls) for app in apps) == 40
+    # No app is shared between threads
+    assert all(len(app.threads) == 1 for app in apps)
+
+
+def test_writes_blocks_early_only_without_validator(tmp_path):
+    handed_over = []
+    app = FakeApp(scripts=["print(2)"], blocks=["print(1)"])
+    engine = create_engine(
+        app,
+        on_result=lambda machine, directory: handed_over.append(
+            (machine, directory)
+        ),
+    )
+
+    engine.generate(["Lathe"], output_dir=str(tmp_path), language="python")
+    directory = str(tmp_path / "lathe")
+    assert app.calls[0]["early"]
+    assert app.calls[0]["language"] == "python"
+    assert app.writes == [(directory, "print(1)"), (directory, "print(2)")]
+    assert handed_over == [("Lathe", directory)]
+
+    app.blocks, app.writes = ["print(1)"], []
+    engine.validator = FakeValidator()
+    engine.generate(["Lathe"], output_dir=str(tmp_path))
+    engine.close()
+    assert not app.calls[1]["early"]
+    assert app.writes == [(directory, "print(1)")]
@@ -26,7 +26,7 @@ def test_cicd_resources():
     )
     template = cdk.assertions.Template.from_stack(imagebuild)
     template.resource_count_is("AWS::IAM::Policy", 5)
-    template.resource_count_is("AWS::IAM::Role", 4)
+    template.resource_count_is("AWS::IAM::Role", 5)
     template.resource_count_is("AWS::CodeBuild::Project", 1)
     template.resource_count_is("AWS::CodeCommit::Repository", 1)
     template.resource_count_is("AWS::CodePipeline::Pipeline", 1)
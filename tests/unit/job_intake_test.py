@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import boto3
+import pytest
+
+from moto import mock_aws
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from job_intake import (  # noqa: E402
+    JobIntake,
+    get_batch_job_arn,
+    get_job_key,
+    get_shard,
+    is_done,
+)
+
+TABLE_NAME = "jobs"
+INDEX_NAME = "active-index"
+
+
+@pytest.fixture
+def dynamodb_client():
+    with mock_aws():
+        client = boto3.client("dynamodb", region_name="us-east-1")
+        client.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {"AttributeName": "user_id", "KeyType": "HASH"},
+                {"AttributeName": "job_id", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "job_id", "AttributeType": "S"},
+                {"AttributeName": "active", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": INDEX_NAME,
+                    "KeySchema": [
+                        {"AttributeName": "active", "KeyType": "HASH"}
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield client
+
+
+def put_job(client, user_id, job_id, machines, active=True):
+    item = {
+        "user_id": {"S": user_id},
+        "job_id": {"S": job_id},
+        "job_status": {"S": "listed"},
+        "interval_seconds": {"N": "30"},
+    }
+    if active:
+        item["active"] = {"S": "yes"}
+    client.put_item(TableName=TABLE_NAME, Item=item)
+    for machine in machines:
+        client.put_item(
+            TableName=TABLE_NAME,
+            Item={
+                "user_id": {"S": user_id},
+                "job_id": {"S": f"{job_id}/{machine.lower()}"},
+                "machine": {"S": machine},
+            },
+        )
+
+
+def get_job(client, user_id, job_id):
+    return client.get_item(
+        TableName=TABLE_NAME,
+        Key={"user_id": {"S": user_id}, "job_id": {"S": job_id}},
+    )["Item"]
+
+
+def test_helpers():
+    assert is_done("code_uploaded", "code_generated")
+    assert not is_done("code_uploaded", "data_generated")
+    assert not is_done(None, "code_generated")
+    assert get_job_key("user/job/lathe") == {
+        "user_id": "user",
+        "job_id": "job",
+    }
+    shards = {get_shard(f"user/job/{i}", 4) for i in range(100)}
+    assert shards == {0, 1, 2, 3}
+    assert get_shard("user/job/lathe", 4) == get_shard("user/job/lathe", 4)
+
+
+@pytest.mark.parametrize("index_name", [INDEX_NAME, None])
+def test_pending_jobs(dynamodb_client, index_name):
+    put_job(dynamodb_client, "user", "job-1", ["Lathe", "Press"])
+    put_job(dynamodb_client, "user", "job-2", ["Oven"], active=False)
+    intake = JobIntake(dynamodb_client, TABLE_NAME, index_name=index_name)
+
+    jobs = list(intake.pending_jobs())
+
+    assert len(jobs) == 1
+    job = jobs[0]
+    assert job["prefix"] == "user/job-1"
+    assert sorted(job["machines"]) == ["Lathe", "Press"]
+    assert job["interval_seconds"] == 30.0
+    assert job["span_days"] == 365.0
+    assert job["builds"] == 0
+    assert job["checkpoints"] == {}
+
+
+def test_checkpoints_count_progress_once(dynamodb_client):
+    put_job(dynamodb_client, "user", "job", ["Lathe"])
+    intake = JobIntake(dynamodb_client, TABLE_NAME, index_name=INDEX_NAME)
+
+    intake.set_checkpoint("user/job/lathe", "code_uploaded")
+    intake.set_checkpoint("user/job/lathe", "code_uploaded")
+    job = get_job(dynamodb_client, "user", "job")
+    assert job["scripts_generated"] == {"N": "1"}
+
+    intake.set_checkpoint("user/job/lathe", "data_uploaded")
+    job = get_job(dynamodb_client, "user", "job")
+    assert job["scripts_generated"] == {"N": "1"}
+    assert job["datasets_uploaded"] == {"N": "1"}
+    assert next(intake.pending_jobs())["checkpoints"] == {
+        "user/job/lathe": "data_uploaded"
+    }
+
+    # Starting a machine over takes back its progress
+    intake.set_checkpoint("user/job/lathe", None)
+    job = get_job(dynamodb_client, "user", "job")
+    assert job["scripts_generated"] == {"N": "0"}
+    assert job["datasets_uploaded"] == {"N": "0"}
+
+    with pytest.raises(ValueError):
+        intake.set_checkpoint("user/job/lathe", "unknown")
+
+
+def test_start_build_counts_builds(dynamodb_client):
+    put_job(dynamodb_client, "user", "job", ["Lathe"])
+    intake = JobIntake(dynamodb_client, TABLE_NAME, index_name=INDEX_NAME)
+    assert intake.start_build("user", "job") == 1
+    assert intake.start_build("user", "job") == 2
+    assert get_job(dynamodb_client, "user", "job")["job_status"] == {
+        "S": "building"
+    }
+
+
+def test_batch_job_is_recorded_per_shard(dynamodb_client):
+    put_job(dynamodb_client, "user", "job", ["Lathe"])
+    intake = JobIntake(dynamodb_client, TABLE_NAME, index_name=INDEX_NAME)
+
+    intake.set_batch_job("user", "job", "arn:job-0")
+    intake.set_batch_job("user", "job", "arn:job-1", shard_index=1)
+    job = next(intake.pending_jobs())
+    assert get_batch_job_arn(job) == "arn:job-0"
+    assert get_batch_job_arn(job, shard_index=1) == "arn:job-1"
+
+    intake.set_batch_job("user", "job", None)
+    job = next(intake.pending_jobs())
+    assert get_batch_job_arn(job) is None
+    assert get_batch_job_arn(job, shard_index=1) == "arn:job-1"
+
+
+def test_finish_build(dynamodb_client):
+    put_job(dynamodb_client, "user", "done", ["Lathe"])
+    put_job(dynamodb_client, "user", "retry", ["Press"])
+    put_job(dynamodb_client, "user", "failed", ["Oven"])
+    intake = JobIntake(dynamodb_client, TABLE_NAME, index_name=INDEX_NAME)
+
+    intake.finish_build(
+        jobs={
+            "user/done": {
+                "user_id": "user",
+                "job_id": "done",
+                "directories": ["user/done/lathe"],
+                "builds": 1,
+            },
+            "user/retry": {
+                "user_id": "user",
+                "job_id": "retry",
+                "directories": ["user/retry/press"],
+                "builds": 1,
+            },
+            "user/failed": {
+                "user_id": "user",
+                "job_id": "failed",
+                "directories": ["user/failed/oven"],
+                "builds": 3,
+            },
+        },
+        results=[
+            {"directory": "user/done/lathe", "status": "succeeded"},
+            {"directory": "user/retry/press", "status": "failed"},
+            {"directory": "user/failed/oven", "status": "failed"},
+        ],
+        max_builds=3,
+    )
+
+    assert [job["job_id"] for job in intake.pending_jobs()] == ["retry"]
+    for job_id, status in [("done", "completed"), ("failed", "failed")]:
+        job = get_job(dynamodb_client, "user", job_id)
+        assert job["job_status"] == {"S": status}
+        assert "active" not in job
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import boto3
+import pytest
+
+from moto import mock_aws
+
+API = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "apis",
+    "async",
+)
+sys.path.insert(0, API)
+
+from job_queue import (  # noqa: E402
+    InMemoryJobQueue,
+    JobDispatcher,
+    SQSJobQueue,
+)
+
+
+def test_dispatch_batches_jobs():
+    batches = []
+    dispatcher = JobDispatcher(start_build=batches.append, max_batch_size=2)
+
+    assert dispatcher.dispatch([{"job_id": str(i)} for i in range(5)]) == 3
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert dispatcher.dispatch([]) == 0
+
+
+def test_drain_dispatches_and_acknowledges_all_jobs():
+    queue = InMemoryJobQueue()
+    for i in range(25):
+        queue.put({"user_id": "user", "job_id": str(i)})
+    batches = []
+    dispatcher = JobDispatcher(start_build=batches.append, max_batch_size=10)
+
+    assert dispatcher.drain(queue) == 3
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [job["job_id"] for batch in batches for job in batch] == [
+        str(i) for i in range(25)
+    ]
+    assert not queue.messages
+    assert not queue.in_flight
+    assert dispatcher.drain(queue) == 0
+
+
+def test_failed_build_leaves_jobs_in_flight():
+    queue = InMemoryJobQueue()
+    queue.put({"job_id": "1"})
+
+    def start_build(jobs):
+        raise RuntimeError("pipeline unavailable")
+
+    dispatcher = JobDispatcher(start_build=start_build)
+    with pytest.raises(RuntimeError):
+        dispatcher.drain(queue)
+    assert len(queue.in_flight) == 1
+
+
+@mock_aws
+def test_sqs_queue():
+    sqs_client = boto3.client("sqs", region_name="us-east-1")
+    queue_url = sqs_client.create_queue(QueueName="jobs")["QueueUrl"]
+    queue = SQSJobQueue(sqs_client=sqs_client, queue_url=queue_url)
+    for i in range(12):
+        queue.put({"job_id": str(i)})
+    batches = []
+
+    builds = JobDispatcher(
+        start_build=batches.append, max_batch_size=100
+    ).drain(queue)
+
+    assert builds == 1
+    assert sorted(int(job["job_id"]) for job in batches[0]) == list(range(12))
+    assert queue.receive() == []
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+LAMBDA_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "apis",
+    "async",
+)
+HEAVY_MODULES = {
+    "langchain",
+    "bs4",
+    "lxml",
+    "markdown",
+    "chalice",
+    "pandas",
+    "numpy",
+}
+IMPORT_TIME_BUDGET_MS = 1500
+
+
+def copied_files():
+    """Get the files the Dockerfile copies into the Lambda image."""
+    files = []
+    with open(os.path.join(LAMBDA_DIR, "Dockerfile"), "r") as f:
+        for line in f:
+            if line.startswith("COPY "):
+                files.extend(line.split()[1:-1])
+    return files
+
+
+@pytest.fixture(scope="module")
+def image_dir(tmp_path_factory):
+    """A directory holding only the files of the Lambda image, so a file missing in the Dockerfile fails the import."""
+    directory = tmp_path_factory.mktemp("image")
+    for filename in copied_files():
+        shutil.copy(os.path.join(LAMBDA_DIR, filename), directory)
+    return str(directory)
+
+
+def profile_imports(module: str, directory: str):
+    """Import a module with `-X importtime` and return the cumulative time in us per top-level module."""
+    env = {
+        **os.environ,
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "table_name": "jobs",
+        "queue_url": "https://sqs.us-east-1.amazonaws.com/1234567890/jobs",
+    }
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip().split(".")[0]
+        profile[name] = max(profile.get(name, 0), int(cumulative))
+    return profile
+
+
+def test_lambda_defers_heavy_imports(image_dir):
+    profile = profile_imports("app", image_dir)
+    assert not HEAVY_MODULES & set(profile), sorted(
+        HEAVY_MODULES & set(profile)
+    )
+
+
+def test_lambda_import_time_budget(image_dir):
+    profile = profile_imports("app", image_dir)
+    report = sorted(profile.items(), key=lambda item: -item[1])[:10]
+    assert profile["app"] / 1000 < IMPORT_TIME_BUDGET_MS, report
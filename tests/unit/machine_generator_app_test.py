@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import pytest
+
+API = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "apis",
+    "async",
+)
+sys.path.insert(0, API)
+
+from machine_generator_app import MachineGeneratorApp  # noqa: E402
+
+
+class FakeRuntimeClient:
+    def __init__(self, completion):
+        self.completion = completion
+        self.prompts = []
+
+    def invoke_model(self, body, modelId, accept, contentType, **kwargs):
+        self.prompts.append(json.loads(body)["prompt"])
+        completion = json.dumps({"completion": self.completion})
+        return {"body": io.BytesIO(completion.encode("utf-8"))}
+
+
+@pytest.mark.parametrize("memory", ["window", "summary"])
+def test_predict_list_with_conversation_memory(memory):
+    client = FakeRuntimeClient("```\n1. Lathe\n2. Press\n```")
+    app = MachineGeneratorApp(
+        model_id="anthropic.claude-v2",
+        streaming=False,
+        callbacks=[],
+        model_kwargs={"max_tokens_to_sample": 100},
+        verbose=False,
+        client=client,
+        memory=memory,
+        max_token_limit=100,
+    )
+
+    # The memory counts tokens without the anthropic package
+    for industry in ["automotive", "food"]:
+        assert app.predict_list(number=2, industry=industry) == [
+            "Lathe",
+            "Press",
+        ]
+    assert "automotive" in client.prompts[-1]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import pytest
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from metrics import (  # noqa: E402
+    EmfExporter,
+    JsonLinesExporter,
+    Metrics,
+    format_summary,
+    load_events,
+    summarize,
+)
+
+
+def test_span_records_duration_and_status():
+    metrics = Metrics(process="runner")
+    with metrics.span("data_upload", directory="lathe") as span:
+        span["bytes"] = 10
+
+    with pytest.raises(RuntimeError):
+        with metrics.span("execution", directory="press"):
+            raise RuntimeError("failed")
+
+    upload, execution = metrics.events
+    assert upload["stage"] == "data_upload"
+    assert upload["status"] == "succeeded"
+    assert upload["bytes"] == 10
+    assert upload["process"] == "runner"
+    assert upload["seconds"] >= 0
+    assert execution["status"] == "failed"
+    assert execution["directory"] == "press"
+
+
+def test_summarize_and_format():
+    events = [
+        {"stage": "generation", "seconds": 1.0, "input_tokens": 10},
+        {"stage": "execution", "seconds": 2.0, "status": "succeeded"},
+        {"stage": "generation", "seconds": 3.0, "input_tokens": 5},
+        {"stage": "execution", "seconds": 0.5, "status": "failed"},
+        {"stage": "data_upload", "bytes": 100, "rows": 4},
+    ]
+
+    summary = summarize(events)
+
+    assert summary == [
+        {
+            "stage": "generation",
+            "count": 2,
+            "failed": 0,
+            "seconds": 4.0,
+            "max_seconds": 3.0,
+            "input_tokens": 15,
+        },
+        {
+            "stage": "execution",
+            "count": 2,
+            "failed": 1,
+            "seconds": 2.5,
+            "max_seconds": 2.0,
+        },
+        {
+            "stage": "data_upload",
+            "count": 1,
+            "failed": 0,
+            "bytes": 100,
+            "rows": 4,
+        },
+    ]
+    lines = format_summary(summary).splitlines()
+    assert len(lines) == 4
+    assert lines[0].split()[:5] == [
+        "stage",
+        "count",
+        "failed",
+        "seconds",
+        "max_seconds",
+    ]
+    assert lines[1].split()[:5] == ["generation", "2", "0", "4.00", "3.00"]
+    # The columns are aligned
+    assert len({len(line) for line in lines}) == 1
+
+
+def test_emf_document():
+    stream = io.StringIO()
+    exporter = EmfExporter(namespace="Test", stream=stream)
+    exporter.export(
+        {
+            "timestamp": 1700000000.5,
+            "stage": "execution",
+            "seconds": 1.5,
+            "rows": 10,
+            "directory": "lathe",
+        }
+    )
+    # Events without a measurement are not written
+    exporter.export({"timestamp": 1700000001, "stage": "skipped"})
+
+    [line] = stream.getvalue().splitlines()
+    document = json.loads(line)
+    assert document["_aws"] == {
+        "Timestamp": 1700000000500,
+        "CloudWatchMetrics": [
+            {
+                "Namespace": "Test",
+                "Dimensions": [["stage"]],
+                "Metrics": [
+                    {"Name": "seconds", "Unit": "Seconds"},
+                    {"Name": "rows", "Unit": "Count"},
+                ],
+            }
+        ],
+    }
+    assert document["stage"] == "execution"
+    assert document["seconds"] == 1.5
+    assert document["directory"] == "lathe"
+
+
+def test_json_lines_round_trip(tmp_path):
+    path = str(tmp_path / "build_metrics.jsonl")
+    metrics = Metrics(exporters=[JsonLinesExporter(path)], process="main")
+    metrics.record("pending_jobs", rows=3)
+    metrics.record("generation", seconds=1.0)
+    assert load_events(path) == metrics.events
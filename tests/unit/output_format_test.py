@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from output_format import (  # noqa: E402
+    convert_csv,
+    convert_directory,
+    count_rows,
+    to_parquet,
+)
+
+
+def write_csv(path, rows=100):
+    # Hourly from 2024-01-29, the first 72 rows are in January
+    df = pd.DataFrame(
+        {
+            "Timestamp": pd.date_range("2024-01-29", periods=rows, freq="h"),
+            "Temperature": [20.5 + i for i in range(rows)],
+            "Status": ["ok" if i % 2 else "warn" for i in range(rows)],
+        }
+    )
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_convert_csv_round_trips_in_chunks(tmp_path):
+    path = tmp_path / "lathe" / "data.csv"
+    path.parent.mkdir()
+    df = write_csv(path)
+    assert count_rows(str(path)) == 100
+
+    paths = convert_csv(str(path), chunk_rows=30)
+
+    assert not path.exists()
+    # One file per chunk and month of the chunk
+    data = tmp_path / "lathe" / "data"
+    assert sorted(os.path.relpath(p, data) for p in paths) == [
+        "month=2024-01/part-0.parquet",
+        "month=2024-01/part-1.parquet",
+        "month=2024-01/part-2.parquet",
+        "month=2024-02/part-2.parquet",
+        "month=2024-02/part-3.parquet",
+    ]
+    assert count_rows(str(data / "month=2024-02" / "part-2.parquet")) == 18
+    assert sum(count_rows(p) for p in paths) == 100
+
+    table = pq.read_table(str(data))
+    assert table.schema.field("Temperature").type == pa.float32()
+    assert pa.types.is_timestamp(table.schema.field("Timestamp").type)
+    result = table.to_pandas().sort_values("Timestamp")
+    assert list(result["Temperature"]) == list(df["Temperature"])
+    assert list(result["Status"].astype(str)) == list(df["Status"])
+    assert list(result["month"].astype(str)) == (
+        ["2024-01"] * 72 + ["2024-02"] * 28
+    )
+
+
+def test_to_parquet_without_timestamps_writes_one_file(tmp_path):
+    df = pd.DataFrame({"Timestamp": ["a", "b"], "Value": [1.0, 2.0]})
+    paths = to_parquet(df, str(tmp_path))
+    assert paths == [str(tmp_path / "part-0.parquet")]
+    assert count_rows(paths[0]) == 2
+
+
+def test_convert_directory_keeps_the_csv_if_asked(tmp_path):
+    write_csv(tmp_path / "data.csv")
+    paths = convert_directory(str(tmp_path), delete=False)
+    assert (tmp_path / "data.csv").exists()
+    assert sum(count_rows(p) for p in paths) == 100
+
+
+def test_count_rows_of_csv(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("Timestamp,a\n")
+    assert count_rows(str(path)) == 0
+    path.write_text("Timestamp,a\n1,2\n3,4")
+    assert count_rows(str(path)) == 2
+    path.write_text("")
+    assert count_rows(str(path)) == 0
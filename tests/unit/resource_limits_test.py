@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import resource
+import subprocess
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from resource_limits import limit_command  # noqa: E402
+
+PRINT_LIMITS = (
+    "import resource;"
+    "print(resource.getrlimit(resource.RLIMIT_AS)[0],"
+    " resource.getrlimit(resource.RLIMIT_FSIZE)[0])"
+)
+
+
+def test_command_without_limits_is_unchanged():
+    command = [sys.executable, "main.py"]
+    assert limit_command(command, {}) == command
+    assert limit_command(command, {"RLIMIT_AS": None}) == command
+
+
+def test_limits_apply_to_the_command():
+    command = limit_command(
+        [sys.executable, "-c", PRINT_LIMITS],
+        {"RLIMIT_AS": 2 * 1024**3, "RLIMIT_FSIZE": 1024**2},
+    )
+    output = subprocess.run(
+        command, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.split() == [str(2 * 1024**3), str(1024**2)]
+    # The limits do not leak into the calling process
+    assert resource.getrlimit(resource.RLIMIT_FSIZE)[0] != 1024**2
+
+
+def test_exit_code_of_the_command():
+    command = limit_command(
+        [sys.executable, "-c", "raise SystemExit(3)"],
+        {"RLIMIT_AS": 2 * 1024**3},
+    )
+    assert subprocess.run(command).returncode == 3
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import boto3
+import pytest
+
+from moto import mock_aws
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from s3_uploader import MB, StreamingUploader  # noqa: E402
+
+BUCKET = "data"
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def create_uploader(s3_client, **kwargs):
+    return StreamingUploader(
+        s3_client=s3_client, bucket=BUCKET, part_size=5 * MB, **kwargs
+    )
+
+
+def writes(path, chunks):
+    """Return an is_running callable appending a chunk to a file per call until all chunks are written."""
+    chunks = list(chunks)
+
+    def is_running():
+        if not chunks:
+            return False
+        with open(path, "ab") as f:
+            f.write(chunks.pop(0))
+        return True
+
+    return is_running
+
+
+def get_object(s3_client, key):
+    return s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_growing_file_is_uploaded_in_parts(s3_client, tmp_path):
+    uploader = create_uploader(s3_client, poll_interval=0)
+    path = tmp_path / "data.csv"
+    chunks = [bytes([i]) * 3 * MB for i in range(4)]
+
+    uploads = uploader.watch(
+        str(tmp_path), "user/job/lathe/", writes(path, chunks)
+    )
+    upload = uploads[str(path)]
+    # Two complete parts were uploaded while the file was written
+    assert len(upload["parts"]) == 2
+    assert upload["offset"] == 10 * MB
+
+    assert uploader.complete(uploads) == ["user/job/lathe/data.csv"]
+    assert get_object(s3_client, "user/job/lathe/data.csv") == b"".join(chunks)
+
+
+def test_rewritten_file_is_uploaded_again(s3_client, tmp_path):
+    uploader = create_uploader(s3_client, poll_interval=0)
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a" * 6 * MB)
+    uploads = uploader.watch(str(tmp_path), "lathe/", lambda: False)
+    assert len(uploads[str(path)]["parts"]) == 1
+
+    # Truncated and written again past the uploaded offset
+    path.write_bytes(b"b" * 12 * MB)
+    uploader.watch(str(tmp_path), "lathe/", lambda: False, uploads=uploads)
+    assert uploads[str(path)]["restart"]
+
+    uploader.complete(uploads)
+    assert get_object(s3_client, "lathe/data.csv") == b"b" * 12 * MB
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_replaced_file_is_uploaded_again(s3_client, tmp_path):
+    uploader = create_uploader(s3_client, poll_interval=0)
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a" * 6 * MB)
+    uploads = uploader.watch(str(tmp_path), "lathe/", lambda: False)
+
+    # Same leading bytes, but a new file
+    replacement = tmp_path / "data.tmp"
+    replacement.write_bytes(b"a" * 6 * MB + b"c" * MB)
+    os.replace(replacement, path)
+    uploader.watch(str(tmp_path), "lathe/", lambda: False, uploads=uploads)
+    assert uploads[str(path)]["restart"]
+
+    uploader.complete(uploads)
+    assert get_object(s3_client, "lathe/data.csv") == (
+        b"a" * 6 * MB + b"c" * MB
+    )
+
+
+def test_small_files_are_uploaded_on_completion(s3_client, tmp_path):
+    uploader = create_uploader(s3_client, delete_after_upload=True)
+    (tmp_path / "2024").mkdir()
+    (tmp_path / "2024" / "data.csv").write_text("Timestamp,a\n")
+    (tmp_path / "main.py").write_text("print(1)\n")
+
+    uploads = uploader.watch(str(tmp_path), "lathe/", lambda: False)
+    assert uploads[str(tmp_path / "2024" / "data.csv")]["upload_id"] is None
+
+    assert uploader.complete(uploads) == ["lathe/2024/data.csv"]
+    assert get_object(s3_client, "lathe/2024/data.csv") == b"Timestamp,a\n"
+    assert not (tmp_path / "2024" / "data.csv").exists()
+
+
+def test_abort_removes_started_uploads(s3_client, tmp_path):
+    uploader = create_uploader(s3_client)
+    (tmp_path / "data.csv").write_bytes(b"a" * 6 * MB)
+    uploads = uploader.watch(str(tmp_path), "lathe/", lambda: False)
+    assert s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+    uploader.abort(uploads)
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+from unittest import mock
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from generation_cache import LocalCacheBackend  # noqa: E402
+from runner import ScriptRunner  # noqa: E402
+
+
+class FakeRepairer:
+    def __init__(self, repairs):
+        self.repairs = list(repairs)
+
+    def repair(self, directory, code, error):
+        return self.repairs.pop(0) if self.repairs else None
+
+    def usage(self, directory):
+        return {}
+
+
+class FakeUploader:
+    def watch(self, directory, key_prefix, is_running, uploads=None):
+        while is_running():
+            time.sleep(0.01)
+        return uploads or {}
+
+    def abort(self, uploads):
+        pass
+
+    def complete(self, uploads):
+        return []
+
+
+class FakeValidator:
+    def __init__(self):
+        self.calls = []
+
+    def validate(self, code, **time_axis):
+        self.calls.append((code, time_axis))
+        if "os.system" in code:
+            return {
+                "status": "failed",
+                "error": "Calls not allowed: os.system",
+            }
+        return {"status": "passed", "error": None}
+
+
+class RecordingCache(LocalCacheBackend):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.updates = []
+
+    def put(self, key, code):
+        self.updates.append((key, code))
+        super().put(key, code)
+
+    def delete(self, key):
+        self.updates.append((key, None))
+        super().delete(key)
+
+
+def create_runner(cache, repairer=None, validator=None):
+    return ScriptRunner(
+        uploader=FakeUploader(),
+        repairer=repairer,
+        cache=cache,
+        validator=validator,
+    )
+
+
+def create_machine(tmp_path, code):
+    directory = tmp_path / "lathe"
+    directory.mkdir()
+    (directory / "main.py").write_text(code)
+    return str(directory)
+
+
+def test_run_keeps_summaries_when_a_machine_raises():
+    def run_script(directory, time_axis=None, cache_key=None):
+        if directory == "user/job/broken":
+            raise OSError("disk full")
+        return {"directory": directory, "status": "succeeded", "exit_code": 0}
+
+    runner = ScriptRunner(uploader=None, max_workers=2)
+    with mock.patch.object(runner, "run_script", side_effect=run_script):
+        results = runner.run(
+            ["user/job/lathe", "user/job/broken", "user/job/press"]
+        )
+
+    by_directory = {result["directory"]: result for result in results}
+    assert len(results) == 3
+    assert by_directory["user/job/lathe"]["status"] == "succeeded"
+    assert by_directory["user/job/press"]["status"] == "succeeded"
+    assert by_directory["user/job/broken"] == {
+        "directory": "user/job/broken",
+        "status": "failed",
+        "exit_code": None,
+        "error": "disk full",
+    }
+
+
+def test_repair_replaces_the_cached_script(tmp_path):
+    cache = LocalCacheBackend(str(tmp_path / "cache"))
+    cache.put("key", "raise SystemExit(1)")
+    directory = create_machine(tmp_path, "raise SystemExit(1)")
+    runner = create_runner(cache, FakeRepairer(["print('repaired')"]))
+
+    result = runner.run_script(directory, cache_key="key")
+
+    assert result["status"] == "succeeded"
+    assert result["attempts"] == 2
+    assert cache.get("key") == "print('repaired')"
+
+
+def test_failed_script_is_removed_from_the_cache(tmp_path):
+    cache = RecordingCache(str(tmp_path / "cache"))
+    cache.put("key", "raise SystemExit(1)")
+    cache.updates.clear()
+    directory = create_machine(tmp_path, "raise SystemExit(1)")
+    runner = create_runner(cache, FakeRepairer(["raise SystemExit(2)"]))
+
+    result = runner.run_script(directory, cache_key="key")
+
+    assert result["status"] == "failed"
+    assert result["attempts"] == 2
+    assert cache.get("key") is None
+    # The failed repair was never cached
+    assert cache.updates == [("key", None)]
+
+
+def test_repair_failing_the_validation_is_repaired_again(tmp_path):
+    cache = RecordingCache(str(tmp_path / "cache"))
+    directory = create_machine(tmp_path, "raise SystemExit(1)")
+    validator = FakeValidator()
+    runner = create_runner(
+        cache,
+        FakeRepairer(["import os\nos.system('ls')", "print('repaired')"]),
+        validator,
+    )
+
+    result = runner.run_script(
+        directory,
+        time_axis={"interval_seconds": 60, "span_days": 1},
+        cache_key="key",
+    )
+
+    assert result["status"] == "succeeded"
+    assert result["attempts"] == 2
+    assert [report["status"] for report in result["validation"]] == [
+        "failed",
+        "passed",
+    ]
+    assert validator.calls[0][1] == {"interval_seconds": 60, "span_days": 1}
+    assert cache.updates == [("key", "print('repaired')")]
+
+
+def test_repair_never_passing_the_validation_is_not_run(tmp_path):
+    cache = RecordingCache(str(tmp_path / "cache"))
+    directory = create_machine(tmp_path, "raise SystemExit(1)")
+    runner = create_runner(
+        cache, FakeRepairer(["import os\nos.system('ls')"]), FakeValidator()
+    )
+
+    result = runner.run_script(directory, cache_key="key")
+
+    assert result["status"] == "failed"
+    assert result["attempts"] == 1
+    assert cache.updates == [("key", None)]
+    with open(os.path.join(directory, "main.py")) as f:
+        assert f.read() == "raise SystemExit(1)"
+
+
+def test_memory_limit_applies_to_the_script(tmp_path):
+    directory = create_machine(
+        tmp_path,
+        "import resource\n"
+        "limit = resource.getrlimit(resource.RLIMIT_AS)[0]\n"
+        "open('limit.txt', 'w').write(str(limit))\n",
+    )
+    runner = ScriptRunner(uploader=FakeUploader(), memory_limit=2 * 1024**3)
+
+    result = runner.run_script(directory)
+
+    assert result["status"] == "succeeded"
+    with open(os.path.join(directory, "limit.txt")) as f:
+        assert int(f.read()) == 2 * 1024**3
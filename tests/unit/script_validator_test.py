@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import ast
+import sys
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from script_validator import ScriptValidator  # noqa: E402
+
+SCRIPT = """
+import os
+import csv
+import math
+
+rows = int(float(os.environ.get("SPAN_DAYS", 365)) * 24)
+with open("data.csv", "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["Timestamp", "Temperature_C"])
+    for i in range(rows):
+        writer.writerow([i * 3600, 50 + math.sin(i)])
+"""
+
+
+def test_imports_outside_the_allowlist_are_denied():
+    validator = ScriptValidator()
+    tree = ast.parse(
+        "import os, numpy as np\nimport shutil\nfrom http import client\n"
+    )
+    assert validator.check_imports(tree) == ["shutil", "http"]
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import os\nos.system('ls')",
+        "import os as o\no.popen('ls')",
+        "from os import execv\nexecv('/bin/sh', [])",
+        "import os\nos.spawnl(os.P_WAIT, '/bin/sh')",
+        "import os\ngetattr(os, 'system')('ls')",
+        "eval('1 + 1')",
+        "__import__('subprocess')",
+    ],
+)
+def test_calls_running_commands_or_code_are_denied(code):
+    report = ScriptValidator().validate(code)
+    assert report["status"] == "failed"
+    assert report["error"].startswith("Calls not allowed")
+
+
+def test_valid_script_passes():
+    report = ScriptValidator(max_seconds=60).validate(
+        SCRIPT, interval_seconds=3600, span_days=30
+    )
+    assert report["status"] == "passed", report["error"]
+    assert report["dry_run"]["rows"] == 24
+    assert report["estimated_bytes"] > 0
+
+
+def test_dry_run_is_limited():
+    validator = ScriptValidator(max_file_size=1024 * 1024)
+    report = validator.validate(
+        'open("data.csv", "w").write("x" * 2 * 1024 * 1024)\n'
+    )
+    assert report["status"] == "failed"
+    assert report["dry_run"]["exit_code"] != 0
+
+
+def test_validations_run_concurrently():
+    validator = ScriptValidator(max_seconds=60)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        reports = list(
+            executor.map(
+                lambda _: validator.validate(
+                    SCRIPT, interval_seconds=3600, span_days=30
+                ),
+                range(8),
+            )
+        )
+    assert [report["status"] for report in reports] == ["passed"] * 8
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import pytest
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from shard_coordinator import (  # noqa: E402
+    LocalShardLauncher,
+    ShardCoordinator,
+    ShardLauncher,
+    merge_manifests,
+)
+
+# Stands in for main.py and runner.py, writing the files of the shard in SHARD_INDEX
+SHARD_SCRIPT = """
+import os
+import sys
+import json
+
+index = os.environ["SHARD_INDEX"]
+directory = f"user/job/machine-{index}"
+if os.path.basename(sys.argv[1]) == "main.py":
+    manifest = {
+        "data_bucket": "data",
+        "directories": [directory],
+        "time_axis": {directory: {"interval_seconds": 60, "span_days": 1}},
+        "cache_keys": {directory: f"key-{index}"},
+        "jobs": {
+            "user/job": {
+                "user_id": "user",
+                "job_id": "job",
+                "directories": [directory],
+                "builds": 1,
+            }
+        },
+    }
+    with open("run_manifest.json", "w") as f:
+        json.dump(manifest, f)
+else:
+    with open("run_summary.json", "w") as f:
+        json.dump([{"directory": directory, "status": "succeeded"}], f)
+    with open("build_metrics.jsonl", "w") as f:
+        f.write(json.dumps({"stage": "execution", "shard": index}) + "\\n")
+"""
+
+
+class FakeIntake:
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.builds = []
+        self.finished = []
+
+    def pending_jobs(self):
+        return iter(self.jobs)
+
+    def start_build(self, user_id, job_id):
+        self.builds.append((user_id, job_id))
+        return len(self.builds)
+
+    def finish_build(self, jobs, results, max_builds):
+        self.finished.append((jobs, results, max_builds))
+
+
+class FailingLauncher(ShardLauncher):
+    def __init__(self, launcher, failing):
+        self.launcher = launcher
+        self.failing = failing
+
+    def run_shard(self, index, count):
+        if index == self.failing:
+            raise RuntimeError("build FAILED")
+        return self.launcher.run_shard(index, count)
+
+
+def create_launcher(tmp_path):
+    script = tmp_path / "shard.py"
+    script.write_text(SHARD_SCRIPT)
+    return LocalShardLauncher(
+        argv=["--code-bucket", "code"],
+        directory=str(tmp_path / "shards"),
+        command=[sys.executable, str(script)],
+    )
+
+
+def test_merge_manifests():
+    manifests = [
+        {
+            "data_bucket": "data",
+            "directories": [f"user/job/{machine}"],
+            "time_axis": {f"user/job/{machine}": {"span_days": 1}},
+            "cache_keys": {f"user/job/{machine}": machine},
+            "jobs": {
+                "user/job": {
+                    "user_id": "user",
+                    "job_id": "job",
+                    "directories": [f"user/job/{machine}"],
+                    "builds": builds,
+                }
+            },
+        }
+        for machine, builds in [("lathe", 1), ("press", 2)]
+    ]
+
+    merged = merge_manifests(manifests)
+
+    assert merged["data_bucket"] == "data"
+    assert merged["directories"] == ["user/job/lathe", "user/job/press"]
+    assert sorted(merged["time_axis"]) == merged["directories"]
+    assert merged["cache_keys"] == {
+        "user/job/lathe": "lathe",
+        "user/job/press": "press",
+    }
+    assert merged["jobs"] == {
+        "user/job": {
+            "user_id": "user",
+            "job_id": "job",
+            "directories": ["user/job/lathe", "user/job/press"],
+            "builds": 2,
+        }
+    }
+    # The shard manifests are left as they are
+    assert manifests[0]["jobs"]["user/job"]["directories"] == [
+        "user/job/lathe"
+    ]
+    assert merge_manifests([])["data_bucket"] is None
+
+
+def test_runs_all_shards_and_finishes_the_build(tmp_path):
+    intake = FakeIntake([{"user_id": "user", "job_id": "job"}])
+    coordinator = ShardCoordinator(
+        launcher=create_launcher(tmp_path),
+        shard_count=3,
+        intake=intake,
+        max_builds=2,
+    )
+
+    merged = coordinator.run()
+
+    directories = [f"user/job/machine-{i}" for i in range(3)]
+    assert [shard["status"] for shard in merged["shards"]] == ["succeeded"] * 3
+    assert merged["manifest"]["directories"] == directories
+    assert [result["directory"] for result in merged["results"]] == (
+        directories
+    )
+    assert [event["shard"] for event in merged["events"]] == ["0", "1", "2"]
+    # The build of a job is counted once for all shards
+    assert intake.builds == [("user", "job")]
+    assert len(intake.finished) == 1
+    jobs, results, max_builds = intake.finished[0]
+    assert jobs["user/job"]["directories"] == directories
+    assert results == merged["results"]
+    assert max_builds == 2
+    for i in range(3):
+        with open(tmp_path / "shards" / str(i) / "run_manifest.json") as f:
+            assert json.load(f)["directories"] == [directories[i]]
+
+
+def test_failed_shard_leaves_the_jobs_pending(tmp_path):
+    intake = FakeIntake([{"user_id": "user", "job_id": "job"}])
+    coordinator = ShardCoordinator(
+        launcher=FailingLauncher(create_launcher(tmp_path), failing=1),
+        shard_count=2,
+        intake=intake,
+    )
+
+    merged = coordinator.run()
+
+    assert merged["shards"][0]["status"] == "succeeded"
+    assert merged["shards"][1] == {
+        "index": 1,
+        "status": "failed",
+        "error": "build FAILED",
+        "latency": merged["shards"][1]["latency"],
+    }
+    assert merged["manifest"]["directories"] == ["user/job/machine-0"]
+    assert intake.builds == [("user", "job")]
+    assert intake.finished == []
+
+
+def test_launcher_requires_run_shard():
+    with pytest.raises(TypeError):
+        ShardLauncher()
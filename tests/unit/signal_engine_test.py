@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import numpy as np
+import pytest
+
+IMAGEBUILD = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "..",
+    "..",
+    "assets",
+    "imagebuild",
+)
+sys.path.insert(0, IMAGEBUILD)
+
+from signal_engine import generate_signal, validate_spec  # noqa: E402
+
+
+def drift_over(span_days: int, interval_seconds: int = 3600) -> float:
+    spec = validate_spec(
+        {
+            "interval_seconds": interval_seconds,
+            "periods": span_days * 86400 // interval_seconds,
+            "signals": [
+                {
+                    "name": "Temperature_C",
+                    "mean": 50.0,
+                    "min": 0.0,
+                    "max": 100.0,
+                    "drift": 3.65,
+                }
+            ],
+        }
+    )
+    index = np.arange(spec["periods"])
+    values = generate_signal(
+        spec["signals"][0], index, spec, [], np.random.default_rng(0)
+    )["values"]
+    return values[-1] - values[0]
+
+
+@pytest.mark.parametrize("span_days", [30, 365, 1825])
+def test_drift_is_a_yearly_rate(span_days):
+    # 3.65 per year is 0.01 per day, whatever the span
+    expected = 0.01 * (span_days - 1 / 24)
+    assert drift_over(span_days) == pytest.approx(expected, abs=0.01)
+
+
+def test_validate_spec_rejects_mean_outside_range():
+    with pytest.raises(ValueError):
+        validate_spec(
+            {"signals": [{"name": "a", "mean": 5, "min": 0, "max": 1}]}
+        )
@@ -19,6 +19,15 @@ class Config:
         :IMAGE_TYPE:                    The image build image type
         :COLUMN_NAME:                   The column name for a DynamoDB table
         :MODEL_ID:                      The Bedrock model ID
+        :BATCH_SIZE:                    The maximum number of queued jobs dispatched to one build
+        :BATCH_WINDOW:                  The seconds queued jobs are collected before they are dispatched
+        :HANDLER_MODE:                  The Lambda handler mode ("slim" or "langchain")
+        :GENERATION_MODE:               The data generation mode ("script" or "spec")
+        :OUTPUT_FORMAT:                 The dataset format ("csv" or "parquet")
+        :BATCH_INFERENCE_THRESHOLD:     The number of machines from which a build uses batch inference, 0 disables it
+        :SHARD_COUNT:                   The number of parallel builds a build is split into
+        :MACHINE_SIMILARITY:            The similarity from which two machine names are collapsed into one, 1 disables fuzzy matching
+        :LISTING_TIMEOUT:               The Lambda timeout in seconds of the machine listing, a sixth of the visibility timeout of its queue
     """
 
     def __init__(self, path: str):
@@ -71,6 +80,33 @@ class Config:
         self.MODEL_ID: str = self._read_config_variable(
             config, "model_id", "bedrock-model-id"
         )
+        self.BATCH_SIZE: int = self._read_config_variable(
+            config, "batch_size", 100
+        )
+        self.BATCH_WINDOW: int = self._read_config_variable(
+            config, "batch_window", 60
+        )
+        self.HANDLER_MODE: str = self._read_config_variable(
+            config, "handler_mode", "slim"
+        )
+        self.GENERATION_MODE: str = self._read_config_variable(
+            config, "generation_mode", "script"
+        )
+        self.OUTPUT_FORMAT: str = self._read_config_variable(
+            config, "output_format", "csv"
+        )
+        self.BATCH_INFERENCE_THRESHOLD: int = self._read_config_variable(
+            config, "batch_inference_threshold", 100
+        )
+        self.SHARD_COUNT: int = self._read_config_variable(
+            config, "shard_count", 1
+        )
+        self.MACHINE_SIMILARITY: float = self._read_config_variable(
+            config, "machine_similarity", 0.85
+        )
+        self.LISTING_TIMEOUT: int = self._read_config_variable(
+            config, "listing_timeout", 300
+        )
 
     def _read_config_variable(
         self, config: Dict, variable_name: str, default_value: Any = None